@@ -1,13 +1,29 @@
 from src.grana_model.simulationenv import SimulationEnvironment
 from src.grana_model.simulationwindow import SimulationWindow
+from src.grana_model.simulationworker import SimulationWorker
 from src.grana_model.attractionhandler import AttractionHandler
 from src.grana_model.spawner import Spawner
 from src.grana_model.objectdata import ObjectData
 from src.grana_model.densityhandler import DensityHandler
 from src.grana_model.collisionhandler import CollisionHandler
+from src.grana_model.diskengine import DiskEngine
+from src.grana_model.growthprotocol import GrowthProtocol
+from src.grana_model.densifier import Densifier
+from src.grana_model.spacetuner import SpaceTuner, configure_space
+from src.grana_model.sleeppolicy import SleepPolicy
+from src.grana_model.collisionfilter import CollisionFilters
+from src.grana_model.periodicbox import PeriodicBox
+from src.grana_model.convergencemonitor import ConvergenceMonitor
+from src.grana_model.particleengine import ParticleEngine
+from src.grana_model.msdcorrelator import MultiTauMSD
+from src.grana_model.calibration import CalibrationSolver, CalibrationTable
+from src.grana_model.ensemblerunner import EnsembleRunner
+from src.grana_model.paralleltempering import ParallelTempering
+from src.grana_model.utils import get_disk_radius
 import pymunk
 from src.grana_model.overlapagent import OverlapAgent
 import pyglet
+from functools import partial
 from itertools import product
 
 REPS = 1
@@ -15,18 +31,241 @@ REPS = 1
 # constants for sim window, if gui == True
 OVERLAP_AGENT_STATE = True
 GUI_STATE = False
+GUI_WORKER = True  # step the simulation in a background thread when using the gui
 SIM_WIDTH = 500
 SIM_HEIGHT = 500
 SHAPE_COMBOS = [
     f"lhcii_circle_{r}_{n}" for (r, n) in product([3.75, 4.5], range(94, 100, 20))
 ]
+# native pymunk circle versions of the above, ie "lhcii_disk_3.75" or a trimer of
+# three circles, "lhcii_disks_<r>_3_<ring radius>"
+DISK_COMBOS = [f"lhcii_disk_{r}" for r in [3.75, 4.5]]
 STEP_LIMIT = 500
+NUM_LHCII = 200
+SECTION = (200, 200, 100, 100)  # x, y, width, height of the ensemble area
+# coarse to fine overlap removal with an OverlapPipeline, ie
+# [{"shape_type": "simple", "time_limit": 1000}, {"shape_type": "complex", "time_limit": 100}]
+# None runs a single OverlapAgent on shape_type
+OVERLAP_STAGES = None
+# objects the single OverlapAgent moves per space step, picked so no two can touch, 1 for
+# one at a time. Stages set their own with a "batch_size" key
+OVERLAP_BATCH_SIZE = 1
+# spawn the LHCII at this fraction of their size and grow them into place with a
+# GrowthProtocol, with thermal motion on, None spawns them at full size
+GROWTH_INITIAL_SCALE = None
+# relax the first level, then insert LHCII to reach each following level, ie
+# [69, 100, 150, 250]. None runs a single density of NUM_LHCII
+DENSITY_LEVELS = None
+# benchmark broad phase, solver iterations and collision slop on the model before
+# running, see SpaceTuner
+TUNE_SPACE = False
+# put settled structures to sleep, so long relaxations get cheaper, see SleepPolicy
+USE_SLEEP = False
+# turn stationary PSII supercomplexes into static geometry, see PSIIStructure.freeze.
+# create_spawner spawns LHCII only (spawn_type 3), so this needs a PSII spawn type
+FREEZE_PSII = False
+# shape filter masks by role, ie {"particle": STRUCTURE}, see CollisionFilters.
+# None leaves pymunk's default filters, {} uses the default masks
+COLLISION_MASKS = None
+# keep the LHCII in SECTION with periodic boundaries instead of boundary rectangles,
+# see PeriodicBox
+PERIODIC_BOX = False
+# stop the steps before STEP_LIMIT once the overlap stops improving or a budget is used
+# up, ie {"window": 50, "min_improvement": 0.01, "max_seconds": 3600}, see
+# ConvergenceMonitor. None runs to STEP_LIMIT
+CONVERGENCE = None
+# mobile particles, ie plastoquinone, diffusing through the structures on a numpy
+# ParticleEngine, 0 for none
+NUM_MOBILE_PARTICLES = 0
+# measure the structures' MSD and D online with a MultiTauMSD, reported against the
+# STRUCTURE_DICT targets when the coordinates are exported
+TRACK_MSD = False
+# use the diffusion_scalar and rotation_scalar from this CalibrationTable json, where it
+# has an entry for the structure, instead of the STRUCTURE_DICT constants. None for off
+CALIBRATION_TABLE = None
+# solve the scalars of SHAPE_COMBOS with a CalibrationSolver and save them to
+# CALIBRATION_TABLE, or the default table, before running
+CALIBRATE = False
+# run these replicas of each of SHAPE_COMBOS in one process with an EnsembleRunner,
+# instead of main() once per shape type, ie
+# [{"num_lhcii": n, "seed": s} for n in (70, 150, 250) for s in range(10)]. None for off
+ENSEMBLE = None
+# relax NUM_LHCII of each of SHAPE_COMBOS with OverlapAgents at these temperatures, in
+# overlap distance units, swapping states between them, ie [0.0, 1.0, 2.0, 4.0]. One
+# process per temperature, see ParallelTempering. None for off
+PARALLEL_TEMPERING = None
+ENGINE = "pymunk"  # "disk" runs lhcii_circle_*/lhcii_disk_* shape types on the numpy DiskEngine
 
 
-def configure_space(threaded: bool = False, damping: float = 0.1):
-    space = pymunk.Space(threaded=threaded)
-    space.damping = damping
-    return space
+STRUCTURE_DICT = {
+    "LHCII": {
+        "d": 1.8e-9,  # 1.8e-9 in cm2/s
+        "d_rot": 2e3,  # 2 x 10^3  rad^2 s^(-1)
+        "simulation_limit": 1000,
+        "distance_scalar": "well",
+        "diffusion_scalar": 1.22e3,  # average over 250 steps, gave us this number for keeping step_nm equal to calculated step
+        "distance_threshold": 50.0,
+        "mass": 1.0e3,
+        "mass_scalar": 1.0,
+        "rotation_scalar": 1.785e-3,  # average over 250 steps, gave us this number to use
+        "time_per_step": 2,  # in ns
+        "average_step_over": 250,
+        "calibrate_rot_d": False,
+        "calibrate_diff_d": False,
+        "calibration_table": None
+        if CALIBRATION_TABLE is None
+        else CalibrationTable(CALIBRATION_TABLE),
+    }
+}
+
+
+def create_spawner(
+    space: pymunk.Space,
+    object_data: ObjectData,
+    shape_type: str,
+    num_lhcii: int = NUM_LHCII,
+    initial_scale: float = 1.0,
+    batch=None,
+    use_sprites: bool = True,
+):
+    return Spawner(
+        object_data=object_data,
+        spawn_type=3,
+        # 0: "psii_secondary_noparticles",
+        # 1: spawn_type="psii_only",
+        # 2: spawn_type="full",
+        # 3: LHCII only
+        # shape_type="circle_large",
+        shape_type=shape_type,
+        circle_radius=0.1,
+        initial_scale=initial_scale,
+        space=space,
+        batch=batch,
+        num_particles=0,
+        num_psii=0,
+        num_lhcii=num_lhcii,
+        section=SECTION,  # determines the section of grana that the LHCII will use for the ensemble area
+        structure_dict=STRUCTURE_DICT,
+        use_sprites=use_sprites,
+    )
+
+
+def tune_space(object_data: ObjectData, shape_type: str, num_lhcii: int) -> dict:
+    """benchmarks space configurations on the model, and returns the chosen one"""
+
+    def build(space):
+        create_spawner(space, object_data, shape_type, num_lhcii=num_lhcii).setup_model()
+        return CollisionHandler(space)
+
+    tuner = SpaceTuner(build, threaded=True, damping=0.9)
+    space_config = tuner.run()
+    tuner.export_results(
+        f"lhcii_export_coords/{shape_type}_num_{num_lhcii}_space_tuning".replace(".", "p")
+        + ".csv"
+    )
+
+    return space_config
+
+
+def create_replica(
+    object_data: ObjectData,
+    shape_type: str,
+    num_lhcii: int = NUM_LHCII,
+    step_limit: int = STEP_LIMIT,
+    periodic: bool = PERIODIC_BOX,
+    convergence: dict = CONVERGENCE,
+    notes: str = "",
+) -> SimulationEnvironment:
+    """one headless simulation environment, for an EnsembleRunner"""
+    space = configure_space(threaded=False, damping=0.9)
+    overlap_handler = CollisionHandler(space)
+
+    return SimulationEnvironment(
+        spawner=create_spawner(
+            space, object_data, shape_type, num_lhcii=num_lhcii, use_sprites=False
+        ),
+        space=space,
+        object_data=object_data,
+        attraction_handler=AttractionHandler(
+            thermove_enabled=False, attraction_enabled=False
+        ),
+        densityhandler=DensityHandler(space=space, x=200, y=200, width=100, height=100),
+        overlap_handler=overlap_handler,
+        step_limit=step_limit,
+        periodic_box=PeriodicBox(
+            space, section=SECTION, collision_handler=overlap_handler
+        )
+        if periodic
+        else None,
+        convergence=None if convergence is None else ConvergenceMonitor(**convergence),
+        notes=notes,
+    )
+
+
+def run_ensemble(replicas: list, shape_type: str):
+    """runs all replicas in this process, and exports their results"""
+    object_data = ObjectData(pos_csv_filename="082620_SEM_final_coordinates.csv")
+
+    def build_replica(seed: int, num_lhcii: int = NUM_LHCII, **params):
+        return create_replica(
+            object_data,
+            shape_type,
+            num_lhcii=num_lhcii,
+            notes=f"_num_{num_lhcii}_seed_{seed}",
+            **params,
+        )
+
+    runner = EnsembleRunner(build_replica, replicas)
+    runner.run(debug=True)
+    runner.export_results(
+        f"lhcii_export_coords/{shape_type}_ensemble_{len(replicas)}".replace(".", "p")
+        + ".csv"
+    )
+
+
+def build_tempering_replica(shape_type: str, num_lhcii: int) -> SimulationEnvironment:
+    """a ParallelTempering replica, built in its worker process"""
+    object_data = ObjectData(pos_csv_filename="082620_SEM_final_coordinates.csv")
+
+    return create_replica(
+        object_data, shape_type, num_lhcii=num_lhcii, notes=f"_tempering_num_{num_lhcii}"
+    )
+
+
+def run_tempering(temperatures: list, shape_type: str, num_lhcii: int = NUM_LHCII):
+    """relaxes one configuration with parallel tempering, and exports the coldest
+    replica and the overlap history"""
+    tempering = ParallelTempering(
+        partial(build_tempering_replica, shape_type, num_lhcii), temperatures
+    )
+    tempering.run(debug=True)
+    tempering.export_history(
+        f"lhcii_export_coords/{shape_type}_tempering_num_{num_lhcii}_history".replace(
+            ".", "p"
+        )
+        + ".csv"
+    )
+
+
+def calibrate(shape_types: list, structure_type: str = "LHCII"):
+    """solves diffusion_scalar and rotation_scalar for each shape type, and saves
+    them to the calibration table"""
+    object_data = ObjectData(pos_csv_filename="082620_SEM_final_coordinates.csv")
+    table = (
+        CalibrationTable()
+        if CALIBRATION_TABLE is None
+        else STRUCTURE_DICT[structure_type]["calibration_table"]
+    )
+
+    for shape_type in shape_types:
+        CalibrationSolver(
+            object_data.type_dict[structure_type],
+            STRUCTURE_DICT[structure_type],
+            shape_type=shape_type,
+            damping=0.9,
+        ).calibrate(table)
+
+    table.save()
 
 
 def main(
@@ -34,13 +273,43 @@ def main(
     shape_type: str = "simple",
     step_limit: int = STEP_LIMIT,
     use_overlap_agent: bool = False,
+    use_worker: bool = GUI_WORKER,
+    engine: str = ENGINE,
+    overlap_stages: list = None,
+    overlap_batch_size: int = OVERLAP_BATCH_SIZE,
+    growth_initial_scale: float = None,
+    density_levels: list = None,
+    tune: bool = TUNE_SPACE,
+    use_sleep: bool = USE_SLEEP,
+    freeze_psii: bool = FREEZE_PSII,
+    collision_masks: dict = COLLISION_MASKS,
+    periodic: bool = PERIODIC_BOX,
+    convergence: dict = CONVERGENCE,
+    num_mobile_particles: int = NUM_MOBILE_PARTICLES,
+    track_msd: bool = TRACK_MSD,
 ):
+    if engine == "disk" and get_disk_radius(shape_type) is not None:
+        # circle approximations are plain disk packing, no pymunk space needed
+        disk_engine = DiskEngine.from_shape_type(
+            shape_type, num_disks=NUM_LHCII, section=SECTION
+        )
+        disk_engine.run(max_steps=step_limit, debug=True)
+        disk_engine.export_coordinates(disk_engine.get_export_filename(step_limit))
+        return
+
+    # growth relies on thermal motion to rearrange the structures as they inflate
     attraction_handler = AttractionHandler(
-        thermove_enabled=False, attraction_enabled=False
+        thermove_enabled=growth_initial_scale is not None, attraction_enabled=False
     )
-    space = configure_space(threaded=True, damping=0.9)
     batch = None
     object_data = ObjectData(pos_csv_filename="082620_SEM_final_coordinates.csv")
+    num_lhcii = NUM_LHCII if density_levels is None else density_levels[0]
+
+    # broad phase, iterations and collision slop, pymunk defaults unless tuned
+    space_config = (
+        tune_space(object_data, shape_type, num_lhcii) if tune else {}
+    )
+    space = configure_space(threaded=True, damping=0.9, **space_config)
 
     overlap_handler = CollisionHandler(space)
 
@@ -52,44 +321,13 @@ def main(
         height=100,
     )
 
-    spawner = Spawner(
-        object_data=object_data,
-        spawn_type=3,
-        # 0: "psii_secondary_noparticles",
-        # 1: spawn_type="psii_only",
-        # 2: spawn_type="full",
-        # 3: LHCII only
-        # shape_type="circle_large",
-        shape_type=shape_type,
-        circle_radius=0.1,
-        space=space,
+    spawner = create_spawner(
+        space,
+        object_data,
+        shape_type,
+        num_lhcii=num_lhcii,
+        initial_scale=1.0 if growth_initial_scale is None else growth_initial_scale,
         batch=batch,
-        num_particles=0,
-        num_psii=0,
-        num_lhcii=200,
-        section=(
-            200,
-            200,
-            100,
-            100,
-        ),  # determines the section of grana that the LHCII will use for the ensemble area
-        structure_dict={
-            "LHCII": {
-                "d": 1.8e-9,  # 1.8e-9 in cm2/s
-                "d_rot": 2e3,  # 2 x 10^3  rad^2 s^(-1)
-                "simulation_limit": 1000,
-                "distance_scalar": "well",
-                "diffusion_scalar": 1.22e3,  # average over 250 steps, gave us this number for keeping step_nm equal to calculated step
-                "distance_threshold": 50.0,
-                "mass": 1.0e3,
-                "mass_scalar": 1.0,
-                "rotation_scalar": 1.785e-3,  # average over 250 steps, gave us this number to use
-                "time_per_step": 2,  # in ns
-                "average_step_over": 250,
-                "calibrate_rot_d": False,
-                "calibrate_diff_d": False,
-            }
-        },
     )
 
     env = SimulationEnvironment(
@@ -102,9 +340,45 @@ def main(
         gui=gui,
         step_limit=step_limit,
         use_overlap_agent=use_overlap_agent,
+        overlap_stages=overlap_stages,
+        overlap_batch_size=overlap_batch_size,
+        growth=None
+        if growth_initial_scale is None
+        else GrowthProtocol(initial_scale=growth_initial_scale),
+        sleep_policy=SleepPolicy(space) if use_sleep else None,
+        freeze_psii=freeze_psii,
+        collision_filters=None
+        if collision_masks is None
+        else CollisionFilters(masks=collision_masks),
+        periodic_box=PeriodicBox(
+            space, section=SECTION, collision_handler=overlap_handler
+        )
+        if periodic
+        else None,
+        convergence=None if convergence is None else ConvergenceMonitor(**convergence),
+        particle_engine=ParticleEngine(num_mobile_particles, section=SECTION)
+        if num_mobile_particles > 0
+        else None,
+        msd_correlator=MultiTauMSD(
+            time_per_step=STRUCTURE_DICT["LHCII"]["time_per_step"]
+        )
+        if track_msd
+        else None,
     )
 
+    if density_levels is not None:
+        # a full density series from one relaxed configuration
+        for _ in range(step_limit):
+            env.step()
+
+        Densifier(
+            spawner, space, overlap_handler, env.obstacle_list, levels=density_levels
+        ).run()
+        return
+
     if gui:
+        worker = SimulationWorker(env) if use_worker else None
+
         window = SimulationWindow(
             width=SIM_WIDTH,
             height=SIM_HEIGHT,
@@ -113,12 +387,20 @@ def main(
             timer=None,
             draw_shapes=True,
             env=env,
+            worker=worker,
         )
 
+        if worker is not None:
+            worker.start()
+
         pyglet.clock.schedule_interval(window.update, 1.0 / 60.0)
         print("run app")
         pyglet.app.run()
         print("app done")
+
+        if worker is not None:
+            worker.stop()
+
         window.close()
 
     else:
@@ -128,7 +410,18 @@ def main(
 
 if __name__ == "__main__":
 
-    if GUI_STATE == False:
+    if CALIBRATE:
+        calibrate(SHAPE_COMBOS)
+
+    if ENSEMBLE is not None:
+        for shape_type in SHAPE_COMBOS:
+            run_ensemble(ENSEMBLE, shape_type)
+
+    elif PARALLEL_TEMPERING is not None:
+        for shape_type in SHAPE_COMBOS:
+            run_tempering(PARALLEL_TEMPERING, shape_type)
+
+    elif GUI_STATE == False:
         # no window, just sim environment
         for i in range(REPS):
             for j in SHAPE_COMBOS:
@@ -138,6 +431,10 @@ if __name__ == "__main__":
                     shape_type=j,
                     step_limit=STEP_LIMIT,
                     use_overlap_agent=OVERLAP_AGENT_STATE,
+                    engine=ENGINE,
+                    overlap_stages=OVERLAP_STAGES,
+                    growth_initial_scale=GROWTH_INITIAL_SCALE,
+                    density_levels=DENSITY_LEVELS,
                 )
 
     else:
@@ -1,4 +1,7 @@
-import itertools
+import numpy as np
+from pymunk import Vec2d
+
+from src.grana_model.spatialindex import find_pairs_within, get_positions
 
 
 class AttractionHandler:
@@ -8,14 +11,39 @@ class AttractionHandler:
 
     distance_threshold : determines the maximum distance between two objects before
                         their attraction vectors will no longer possibly affect each other.
+    skin : margin added to distance_threshold for the neighbour list. The list is
+                        reused across steps, and only rebuilt once a structure has moved
+                        more than half the skin since the last build.
     """
 
-    def __init__(self, thermove_enabled: bool = True, attraction_enabled: bool = True, distance_threshold: float = 1000.0):
+    def __init__(
+        self,
+        thermove_enabled: bool = True,
+        attraction_enabled: bool = True,
+        distance_threshold: float = 1000.0,
+        skin: float = 10.0,
+    ):
         self.distance_threshold = distance_threshold
+        self.skin = skin
         self.points_to_draw = []
         self.thermove_enabled = thermove_enabled
         self.attraction_enabled = attraction_enabled
 
+        # verlet neighbour list, index pairs into the object list
+        self.neighbour_pairs = np.zeros((0, 2), dtype=int)
+        self.build_positions = None
+        self.build_ids = []
+        self.rebuild_count = 0
+        self.update_count = 0
+        self.pair_count = 0  # pairs within distance_threshold in the last update
+
+        # attraction point world coordinates, (n, points, 2), valid while the bodies
+        # are at point_poses, (n, 3) x, y and angle, however they were moved
+        self.point_coords = np.zeros((0, 0, 2))
+        self.point_offsets = np.zeros((0, 0, 2))
+        self.point_poses = np.zeros((0, 3))
+        self.point_ids = []
+
     @property
     def active(self):
         return True if self.thermove_enabled or self.attraction_enabled else False
@@ -32,42 +60,135 @@ class AttractionHandler:
     #         self.thermove_enabled = False
     #         self.attraction_enabled = False
 
+    def get_point_coords(self, object_list: list) -> np.ndarray:
+        """returns the (n, points, 2) world coordinates of the attraction points of all
+        objects, computed again only once a body has moved. Each object keeps its row,
+        so AttractionPoint.get_world_coords is served from here as well."""
+        ids = [id(o) for o in object_list]
+        poses = np.array(
+            [(o.body.position.x, o.body.position.y, o.body.angle) for o in object_list],
+            dtype=float,
+        ).reshape(-1, 3)
+
+        if self.point_ids == ids and np.array_equal(self.point_poses, poses):
+            return self.point_coords
+
+        if self.point_ids != ids:
+            offsets = [
+                [p.offset_coords for p in o.get_attraction_points()] for o in object_list
+            ]
+            self.point_offsets = (
+                np.array(offsets, dtype=float).reshape(len(object_list), -1, 2)
+                if object_list
+                else np.zeros((0, 0, 2))
+            )
+
+        positions, angles = poses[:, :2], poses[:, 2]
+        cos, sin = np.cos(angles)[:, None], np.sin(angles)[:, None]
+        x, y = self.point_offsets[..., 0], self.point_offsets[..., 1]
+
+        self.point_coords = np.stack(
+            (
+                positions[:, 0, None] + x * cos - y * sin,
+                positions[:, 1, None] + x * sin + y * cos,
+            ),
+            axis=-1,
+        )
+        self.point_poses = poses
+        self.point_ids = ids
+
+        # plain lists, indexing numpy scalars one point at a time is slow
+        for o, row, pose in zip(object_list, self.point_coords.tolist(), poses.tolist()):
+            o.point_row = row
+            o.point_pose = tuple(pose)
+
+        return self.point_coords
+
     def get_points_to_draw(self, object_list: list):
-        """ go through the object list and calculate the world coordinates for each
-        of the attraction points. return the list of coordinates so they can be drawn
+        """ returns the (n * points, 2) world coordinates of all the attraction points,
+        so they can be drawn
         """
+        return self.get_point_coords(object_list).reshape(-1, 2)
 
-        points_to_draw = []
+    @property
+    def rebuild_frequency(self):
+        """fraction of updates that rebuilt the neighbour list"""
+        return self.rebuild_count / self.update_count if self.update_count else 0.0
 
-        for o in object_list:
-            o_points = o.get_attraction_points()
-    
-            for p in o_points:
-                points_to_draw.append(p.get_world_coords())
+    def needs_rebuild(self, object_list, positions: np.ndarray) -> bool:
+        if self.build_positions is None or self.build_ids != [id(o) for o in object_list]:
+            return True
+
+        displacement = np.sum((positions - self.build_positions) ** 2, axis=1)
 
-        return points_to_draw
+        # two structures moving toward each other close the gap twice as fast
+        return displacement.max(initial=0.0) > (self.skin / 2) ** 2
 
-    def calculate_attraction_forces(self, object_list):
+    def build_neighbour_list(self, object_list, positions: np.ndarray):
+        self.neighbour_pairs = find_pairs_within(
+            positions, self.distance_threshold + self.skin
+        )
+        self.build_positions = positions
+        self.build_ids = [id(o) for o in object_list]
+        self.rebuild_count += 1
+
+    def get_neighbour_pairs(self, object_list) -> np.ndarray:
+        """returns the index pairs of objects within distance_threshold, from the
+        neighbour list, which is rebuilt first if needed"""
+        positions = get_positions(object_list)
+        self.update_count += 1
+
+        if self.needs_rebuild(object_list, positions):
+            self.build_neighbour_list(object_list, positions)
+
+        i, j = self.neighbour_pairs.T
+        d2 = np.sum((positions[i] - positions[j]) ** 2, axis=1)
+        pairs = self.neighbour_pairs[d2 < self.distance_threshold**2]
+        self.pair_count = len(pairs)
+
+        return pairs
+
+    def calculate_attraction_forces(self, object_list, batch_size: int = 20000):
         """
-        get a list of all combinations of objects, and calculate the forces between
-        each of them that are within a certain distance threshold
+        calculate the forces between all pairs of objects that are within a certain
+        distance threshold, found with the neighbour list. The point to point vectors
+        of all pairs are evaluated in batches, per distance magnitude, and each object
+        gets one summed vector in its vector list.
         """
+        coords = self.get_point_coords(object_list)
+        pairs = self.get_neighbour_pairs(object_list)
 
-        # create list of all combinations of objects that can attract each other
-        all_combinations = itertools.combinations(object_list, 2)
-
-        # filter by distance_threshold
-        for o1, o2 in all_combinations:
-            # check to see if they objects are within a certain distance threshold. if
-            # they are outside, we won't bother calculating attraction vectors
-            dist = o1.body.position.get_distance(o2.body.position)
+        # each pair attracts both ways, inactive objects aren't attracted
+        sources = np.concatenate((pairs[:, 0], pairs[:, 1]))
+        targets = np.concatenate((pairs[:, 1], pairs[:, 0]))
+        active = np.array([o.active for o in object_list], dtype=bool)
+        sources, targets = sources[active[sources]], targets[active[sources]]
 
-            if dist < self.distance_threshold:
-                # calculate all the vectors for object 1 toward object 2
-                o1.calculate_attraction_to_object(o2)
+        # structures with the same distance_scalar share a magnitude instance
+        magnitudes, groups = [], {}
 
-                # then calculate all vectors for object 2 toward object
-                o2.calculate_attraction_to_object(o1)
+        for o in object_list:
+            if id(o.distance_magnitude) not in groups:
+                groups[id(o.distance_magnitude)] = len(magnitudes)
+                magnitudes.append(o.distance_magnitude)
+
+        group = np.array([groups[id(o.distance_magnitude)] for o in object_list], dtype=int)
+        forces = np.zeros((len(object_list), 2))
+
+        for g, magnitude in enumerate(magnitudes):
+            rows = np.flatnonzero(group[sources] == g)
+
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start : start + batch_size]
+                np.add.at(
+                    forces,
+                    sources[batch],
+                    magnitude.get_attraction(coords[sources[batch]], coords[targets[batch]]),
+                )
+
+        for i in np.unique(sources):
+            x, y = forces[i]
+            object_list[i].vector_list.append(Vec2d(x, y))
 
     def apply_all_vectors(self, object_list, rotation_scalar: float = 1.0):
         for o in object_list:
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""offline diffusion calibration
+
+This module implements a CalibrationSolver, which finds the diffusion_scalar and
+rotation_scalar that give a structure its target d and d_rot, and a CalibrationTable
+that stores the results on disk, so PSIIStructure can use them at spawn instead of the
+hand tuned constants in STRUCTURE_DICT.
+
+DCalibrator nudges the scalars by 0.1% every average_step_over steps of a production
+run, which takes very long runs to settle for a new mass, shape or time step. The solver
+instead runs short trials of many independent copies of a structure in one space,
+thermal movement only and no collisions between them, and measures d and d_rot of the
+batch with a MultiTauMSD. Displacements scale linearly with the scalars, so d scales
+about with their square; a few trials at multiples of the current scalars are fitted
+with a power law in log-log space, solved for the targets, and checked with one more
+trial at the solution.
+
+Results are keyed by (type, mass, shape_type, dt, damping), the parameters that change
+the dynamics. The targets and time_per_step are stored with each entry, and an entry
+calibrated for other targets is not used.
+
+Example:
+    $ solver = CalibrationSolver(object_data.type_dict["LHCII"], STRUCTURE_DICT["LHCII"])
+    $ table = CalibrationTable()
+    $ solver.calibrate(table)
+    $ table.save()
+
+    and to use it
+
+    $ STRUCTURE_DICT["LHCII"]["calibration_table"] = table
+
+"""
+import json
+import random
+from pathlib import Path
+
+import numpy as np
+import pymunk
+
+from src.grana_model.msdcorrelator import MultiTauMSD
+from src.grana_model.spatialindex import get_positions
+
+# matches the SimulationEnvironment default step
+DEFAULT_DT = 0.01666667
+DEFAULT_TABLE = Path(__file__).parent / "res" / "calibration_table.json"
+
+
+class CalibrationTable:
+    """diffusion_scalar and rotation_scalar per (type, mass, shape_type, dt, damping),
+    kept in a json file.
+
+    Parameters:
+        filename (str or Path): the table file, loaded if it exists
+    """
+
+    def __init__(self, filename=DEFAULT_TABLE):
+        self.filename = Path(filename)
+        self.entries = {}
+
+        if self.filename.exists():
+            with open(self.filename) as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def get_key(
+        structure_type: str, mass: float, shape_type: str, dt: float, damping: float
+    ) -> str:
+        return f"{structure_type}|{mass:g}|{shape_type}|{dt:g}|{damping:g}"
+
+    def add(
+        self,
+        structure_type: str,
+        mass: float,
+        shape_type: str,
+        dt: float,
+        damping: float,
+        entry: dict,
+    ):
+        self.entries[self.get_key(structure_type, mass, shape_type, dt, damping)] = entry
+
+    def lookup(
+        self,
+        structure_type: str,
+        mass: float,
+        shape_type: str,
+        dt: float,
+        damping: float,
+        structure_dict: dict = None,
+    ):
+        """returns the entry for these parameters, or None. With a structure_dict, an
+        entry calibrated for other d, d_rot or time_per_step is skipped as well."""
+        entry = self.entries.get(
+            self.get_key(structure_type, mass, shape_type, dt, damping)
+        )
+
+        if entry is None or structure_dict is None:
+            return entry
+
+        for name in ("d", "d_rot", "time_per_step"):
+            if not np.isclose(entry[name], structure_dict[name], rtol=1e-6, atol=0):
+                return None
+
+        return entry
+
+    def save(self):
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(self.filename, "w") as f:
+            json.dump(self.entries, f, indent=4, sort_keys=True)
+
+        print(f"{self.filename} has been exported.")
+
+
+class CalibrationSolver:
+    """solves for the diffusion_scalar and rotation_scalar of one structure type with
+    batched thermal movement trials.
+
+    Parameters:
+        obj_dict (dict): the structure's ObjectData type_dict entry
+        structure_dict (dict): targets d, d_rot, time_per_step, mass, and the current
+            scalars, which the first trials are based on
+        shape_type (str): shapes of the trial structures
+        num_bodies (int): independent copies of the structure in each trial
+        steps (int): steps per trial, None for the structure_dict simulation_limit, so
+            d is measured over the time scale of a run
+        dt (float): space step time
+        damping (float): space damping
+        trial_factors (tuple): multiples of the current scalars for the fitting trials
+        seed (int): seeds the random thermal movement
+    """
+
+    def __init__(
+        self,
+        obj_dict: dict,
+        structure_dict: dict,
+        shape_type: str = "simple",
+        num_bodies: int = 200,
+        steps: int = None,
+        dt: float = DEFAULT_DT,
+        damping: float = 0.9,
+        trial_factors: tuple = (0.5, 1.0, 2.0),
+        seed: int = None,
+    ):
+        self.obj_dict = obj_dict
+        self.structure_dict = structure_dict
+        self.shape_type = shape_type
+        self.num_bodies = num_bodies
+        self.steps = structure_dict["simulation_limit"] if steps is None else steps
+        self.dt = dt
+        self.damping = damping
+        self.trial_factors = trial_factors
+        self.seed = seed
+        self.trials = []  # (diffusion_scalar, rotation_scalar, d, d_rot) per trial
+
+    def _create_structures(self, space: pymunk.Space) -> list:
+        # imported here, psiistructure imports this module for the table lookup
+        from src.grana_model.psiistructure import PSIIStructure
+
+        # the production scalars don't matter, the trial sets them
+        structure_dict = {
+            **self.structure_dict,
+            "calibrate_diff_d": False,
+            "calibrate_rot_d": False,
+            "calibration_table": None,
+        }
+        # spread out for readability only, a shared group keeps them from colliding
+        columns = int(np.ceil(np.sqrt(self.num_bodies)))
+        structures = []
+
+        for i in range(self.num_bodies):
+            structure = PSIIStructure(
+                space,
+                self.obj_dict,
+                None,
+                self.shape_type,
+                pos=(50.0 * (i % columns), 50.0 * (i // columns)),
+                angle=0.0,
+                structure_dict=structure_dict,
+                use_sprites=False,
+            )
+
+            for shape in structure.shape_list:
+                shape.filter = pymunk.ShapeFilter(group=1)
+
+            structures.append(structure)
+
+        return structures
+
+    def run_trial(self, diffusion_scalar: float, rotation_scalar: float):
+        """measures d, in cm^2/s, and d_rot, in rad^2/s, of a batch of structures
+        moved by thermal movement with these scalars"""
+        space = pymunk.Space()
+        space.damping = self.damping
+        structures = self._create_structures(space)
+        correlator = MultiTauMSD(
+            types=["trial"] * self.num_bodies,
+            time_per_step=self.structure_dict["time_per_step"],
+        )
+
+        for structure in structures:
+            structure.diffusion_scalar = diffusion_scalar
+            structure.rotation_scalar = rotation_scalar
+
+        for _ in range(self.steps):
+            # the thermal part of PSIIStructure.apply_vectors and thermal_rotation
+            for structure in structures:
+                structure.body.apply_impulse_at_local_point(
+                    structure.get_thermal_movement(radius=diffusion_scalar)
+                )
+                structure.thermal_rotation(rotation_scalar=rotation_scalar)
+
+            space.step(self.dt)
+            correlator.update(
+                get_positions(structures), np.array([s.body.angle for s in structures])
+            )
+
+        measured = correlator.get_diffusion_coefficients()["trial"]
+        self.trials.append(
+            (diffusion_scalar, rotation_scalar, measured["d"], measured["d_rot"])
+        )
+
+        return measured["d"], measured["d_rot"]
+
+    @staticmethod
+    def solve_power_law(scalars, values, target: float) -> float:
+        """fits values = a * scalars^b in log-log space, and returns the scalar that
+        gives target"""
+        slope, intercept = np.polyfit(np.log(scalars), np.log(values), 1)
+
+        return float(np.exp((np.log(target) - intercept) / slope))
+
+    def solve(self, debug: bool = False) -> dict:
+        """runs the fitting trials and a check trial at the solution, and returns the
+        table entry"""
+        if self.seed is not None:
+            random.seed(self.seed)
+
+        diffusion_scalar = self.structure_dict["diffusion_scalar"]
+        rotation_scalar = self.structure_dict["rotation_scalar"]
+        diffusion_scalars = [f * diffusion_scalar for f in self.trial_factors]
+        rotation_scalars = [f * rotation_scalar for f in self.trial_factors]
+        ds, d_rots = [], []
+
+        for s, r in zip(diffusion_scalars, rotation_scalars):
+            d, d_rot = self.run_trial(s, r)
+            ds.append(d)
+            d_rots.append(d_rot)
+
+            if debug:
+                print(f"df_s: {s:.4g}, d': {d:.2e}, rot_s: {r:.4g}, d_rot': {d_rot:.2e}")
+
+        entry = {
+            "diffusion_scalar": self.solve_power_law(
+                diffusion_scalars, ds, self.structure_dict["d"]
+            ),
+            "rotation_scalar": self.solve_power_law(
+                rotation_scalars, d_rots, self.structure_dict["d_rot"]
+            ),
+        }
+        d, d_rot = self.run_trial(entry["diffusion_scalar"], entry["rotation_scalar"])
+
+        entry.update(
+            {
+                "d": self.structure_dict["d"],
+                "d_rot": self.structure_dict["d_rot"],
+                "time_per_step": self.structure_dict["time_per_step"],
+                "measured_d": d,
+                "measured_d_rot": d_rot,
+                "num_bodies": self.num_bodies,
+                "steps": self.steps,
+            }
+        )
+
+        if debug:
+            print(
+                f"{self.obj_dict['obj_type']} df_s: {entry['diffusion_scalar']:.4g}, d: {self.structure_dict['d']:.2e}, d': {d:.2e}, rot_s: {entry['rotation_scalar']:.4g}, d_rot: {self.structure_dict['d_rot']:.2e}, d_rot': {d_rot:.2e}"
+            )
+
+        return entry
+
+    def calibrate(self, table: CalibrationTable, debug: bool = True) -> dict:
+        """solves, and adds the entry to table, which still needs to be saved"""
+        entry = self.solve(debug=debug)
+        table.add(
+            self.obj_dict["obj_type"],
+            self.structure_dict["mass"],
+            self.shape_type,
+            self.dt,
+            self.damping,
+            entry,
+        )
+
+        return entry
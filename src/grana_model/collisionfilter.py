@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""collision filtering
+
+This module assigns every shape in a simulation a collision category, and a mask of
+the categories it may collide with, as a pymunk.ShapeFilter. pymunk rejects a pair in
+the broad phase unless each shape's categories are in the other's mask, so pairs that
+no collision handler listens to are never passed to the narrow phase.
+
+The default masks keep everything the simulation uses: structures collide with each
+other and with particles, and touch the boundaries and the ensemble sensor for the
+(1, 3) handler. Particles don't interact with the boundaries or the sensor.
+Static-vs-static pairs, ie sensor-vs-boundary or between frozen PSII, are never tested
+by pymunk at all.
+
+Shapes created after apply(), ie by LODManager or Densifier, keep pymunk's default
+filter, which collides with everything, so they are never wrongly rejected.
+
+Example:
+    $ collision_filters = CollisionFilters(masks={"particle": STRUCTURE})
+    $ env = SimulationEnvironment(..., collision_filters=collision_filters)
+    $ count_candidate_pairs(space), count_candidate_pairs(space, use_filters=False)
+
+"""
+import pymunk
+
+# collision categories, one bit each
+STRUCTURE = 0b0001
+PARTICLE = 0b0010
+BOUNDARY = 0b0100
+SENSOR = 0b1000
+
+DEFAULT_MASKS = {
+    "structure": STRUCTURE | PARTICLE | BOUNDARY | SENSOR,
+    "particle": STRUCTURE | PARTICLE,
+    "boundary": STRUCTURE,
+    "sensor": STRUCTURE,
+}
+
+CATEGORIES = {
+    "structure": STRUCTURE,
+    "particle": PARTICLE,
+    "boundary": BOUNDARY,
+    "sensor": SENSOR,
+}
+
+
+def accepts(filter_a: pymunk.ShapeFilter, filter_b: pymunk.ShapeFilter) -> bool:
+    """True if pymunk would let shapes with these filters collide"""
+    if filter_a.group != 0 and filter_a.group == filter_b.group:
+        return False
+
+    return bool(
+        filter_a.categories & filter_b.mask and filter_b.categories & filter_a.mask
+    )
+
+
+def count_candidate_pairs(space: pymunk.Space, use_filters: bool = True) -> int:
+    """counts the shape pairs with overlapping bounding boxes that pymunk passes on to
+    the narrow phase. Pairs on the same body and pairs of two static shapes are never
+    tested. With use_filters=False the shape filters are ignored, for the count
+    without filtering."""
+    everything = pymunk.ShapeFilter()
+    pairs = 0
+
+    for shape in space.shapes:
+        for other in space.bb_query(shape.bb, everything):
+            if id(other) <= id(shape) or other.body is shape.body:
+                continue
+
+            if (
+                shape.body.body_type == pymunk.Body.STATIC
+                and other.body.body_type == pymunk.Body.STATIC
+            ):
+                continue
+
+            if use_filters and not accepts(shape.filter, other.filter):
+                continue
+
+            pairs += 1
+
+    return pairs
+
+
+class CollisionFilters:
+    """sets the shape filters of a simulation's shapes by their role.
+
+    Parameters:
+        masks (dict): role -> mask of categories, overrides DEFAULT_MASKS for this run.
+            roles are "structure", "particle", "boundary" and "sensor"
+    """
+
+    def __init__(self, masks: dict = None):
+        self.masks = {**DEFAULT_MASKS, **(masks or {})}
+
+    def get_filter(self, role: str) -> pymunk.ShapeFilter:
+        return pymunk.ShapeFilter(categories=CATEGORIES[role], mask=self.masks[role])
+
+    def set_filter(self, shapes, role: str):
+        shape_filter = self.get_filter(role)
+
+        for shape in shapes:
+            shape.filter = shape_filter
+
+    def apply(self, obstacle_list: list, particle_list: list, boundaries: list, sensor):
+        """set the filters of all shapes of a SimulationEnvironment
+
+        Parameters:
+            obstacle_list (list of PSIIStructure): structures
+            particle_list (list of Particle): particles
+            boundaries (list of pymunk.Shape): boundary shapes from spawn_boundaries()
+            sensor (pymunk.Body): ensemble sensor body from create_ensemble_area_sensor(),
+                None if there is none, ie with a PeriodicBox
+        """
+        self.set_filter([s for o in obstacle_list for s in o.body.shapes], "structure")
+        self.set_filter([p.shape for p in particle_list], "particle")
+        self.set_filter(boundaries, "boundary")
+        self.set_filter([] if sensor is None else sensor.shapes, "sensor")
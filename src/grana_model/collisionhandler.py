@@ -1,6 +1,4 @@
-from pyglet.text import Label
 from math import pi
-from pyglet.shapes import Circle
 
 # notes:
 
@@ -12,10 +10,14 @@ from pyglet.shapes import Circle
 
 # collision handler
 class CollisionHandler:
-    def __init__(self, space):
+    def __init__(self, space, track_bodies: bool = False):
         self.collision_count = 0
         self.total_collision_count = 0
         self.overlap_distance = 0.0
+        # with track_bodies, the overlap of each contact is also added to both of its
+        # bodies, so the OverlapAgent can judge several actions from one step
+        self.track_bodies = track_bodies
+        self.body_overlap = {}
         self.space = space
         self.collision_handler = self.space.add_collision_handler(1, 1)
         self.collision_handler.begin = self.__coll_begin
@@ -27,8 +29,17 @@ class CollisionHandler:
         set_ = arbiter.contact_point_set
         overlap_distance = set_.points[0].distance
         self.log_collision(overlap_distance)
+
+        if self.track_bodies and overlap_distance < 0:
+            for shape in arbiter.shapes:
+                self.log_body_overlap(shape.body, -overlap_distance)
+
         return True
 
+    def log_body_overlap(self, body, overlap: float):
+        """add overlap to the total of body, see track_bodies"""
+        self.body_overlap[body] = self.body_overlap.get(body, 0.0) + overlap
+
     def __coll_begin(self, arbiter, space, data):
         # set_ = arbiter.contact_point_set
         return True
@@ -64,8 +75,12 @@ class CollisionHandler:
         self.total_collision_count += self.collision_count
         self.collision_count = 0
         self.overlap_distance = 0
+        # a new dict, so a reference to the last step's stays valid
+        self.body_overlap = {}
 
     def draw_collision_label(self, label_pos):
+        from pyglet.text import Label
+
         collision_text = f"collision count:{self.collision_count} overlap distance:{round(self.overlap_distance, 2)}"
         collision_label = Label(
             collision_text,
@@ -78,6 +93,7 @@ class CollisionHandler:
         collision_label.draw()
 
     def draw_area_label(self, label_pos):
+        from pyglet.text import Label
 
         # draw the area label showing how much overlap there is
         area_text = f"object area/ grana area:{self.get_total_area()} / {round(pi * 200 **2, 2)} = {round(self.get_total_area() / (pi * 200 **2), 2)}"
@@ -91,6 +107,7 @@ class CollisionHandler:
         area_label.draw()
 
     def draw_density_label(self, label_pos, num_objects, area: float = 1):
+        from pyglet.text import Label
 
         # draw the area label showing how much overlap there is
         area_text = f"object area/ grana area:{self.get_total_area()} / {round(pi * 200 **2, 2)} = {round(self.get_total_area() / (pi * 200 **2), 2)}"
@@ -105,6 +122,8 @@ class CollisionHandler:
 
 
     def draw_grana_circle(self, x:int = 200, y:int = 200, r:int = 200, opacity:int = 10, color:tuple = (255, 0, 0)):
+        from pyglet.shapes import Circle
+
         # draw a red circle showing the grana area
         circle = Circle(x, y, r, color=color)
         circle.opacity = opacity  # of 255
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""convergence based termination
+
+This module implements a ConvergenceMonitor, which decides when a simulation or an
+overlap removal loop should stop, instead of a fixed step limit or an unbounded loop.
+
+The monitor is updated once per simulation step, or once per OverlapAgent run, with the
+current overlap distance. It keeps the overlap, and the mean displacement of the
+structures, in a rolling window, and stops the run when:
+
+    * the overlap reaches target_overlap ("converged")
+    * the window is full, and the mean overlap of its newer half improved on the older
+      half by less than min_improvement, relative, while the structures moved less than
+      settle_distance ("stalled")
+    * a step, action or wall clock budget is used up ("max_steps", "max_actions",
+      "max_seconds")
+
+The reason is kept in stop_reason, and exported with the history, so a sweep can tell
+the runs that finished from the ones that stalled or ran out of budget.
+
+Example:
+    $ convergence = ConvergenceMonitor(window=50, min_improvement=0.01,
+        max_seconds=3600)
+    $ env = SimulationEnvironment(..., convergence=convergence)
+    $ env.run()
+    $ convergence.stop_reason
+
+"""
+import csv
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+from src.grana_model.spatialindex import get_positions
+
+
+class ConvergenceMonitor:
+    """tracks overlap and displacement, and decides when a run should stop.
+
+    Parameters:
+        window (int): updates kept in the rolling window, the run can't stall before it
+            is full
+        min_improvement (float): relative improvement of the mean overlap across the
+            window below which the run has stalled
+        settle_distance (float): mean displacement per update, in nm, below which the
+            structures count as settled. None ignores the displacement.
+        target_overlap (float): overlap distance at or below which the run has
+            converged, None to never converge on overlap alone
+        max_steps (int): update budget, None for no limit
+        max_actions (int): action budget, counted from the actions passed to update(),
+            None for no limit
+        max_seconds (float): wall clock budget, None for no limit
+
+    Attributes:
+        stop_reason (str): None while running, else why the run stopped
+        history (list of tuple): (steps, actions, seconds, overlap, displacement) for
+            each update
+    """
+
+    def __init__(
+        self,
+        window: int = 50,
+        min_improvement: float = 0.01,
+        settle_distance: float = None,
+        target_overlap: float = None,
+        max_steps: int = None,
+        max_actions: int = None,
+        max_seconds: float = None,
+    ):
+        self.window = window
+        self.min_improvement = min_improvement
+        self.settle_distance = settle_distance
+        self.target_overlap = target_overlap
+        self.max_steps = max_steps
+        self.max_actions = max_actions
+        self.max_seconds = max_seconds
+        self.start()
+
+    def start(self, object_list: list = None):
+        """reset the monitor, tracking the displacement of object_list if given"""
+        self.object_list = object_list
+        self.last_positions = None if object_list is None else get_positions(object_list)
+        self.overlaps = deque(maxlen=self.window)
+        self.displacements = deque(maxlen=self.window)
+        self.steps = 0
+        self.actions = 0
+        self.start_time = time.perf_counter()
+        self.stop_reason = None
+        self.history = []
+
+    @property
+    def stopped(self):
+        return self.stop_reason is not None
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self.start_time
+
+    def get_displacement(self) -> float:
+        """mean displacement of the structures since the last update"""
+        if self.object_list is None or len(self.object_list) == 0:
+            return 0.0
+
+        positions = get_positions(self.object_list)
+
+        if len(positions) != len(self.last_positions):
+            # structures were added, ie by a Densifier
+            self.last_positions = positions
+            return 0.0
+
+        displacement = float(
+            np.linalg.norm(positions - self.last_positions, axis=1).mean()
+        )
+        self.last_positions = positions
+
+        return displacement
+
+    def get_improvement(self) -> float:
+        """relative improvement of the mean overlap of the newer half of the window
+        over the older half"""
+        overlaps = np.array(self.overlaps)
+        half = len(overlaps) // 2
+        older, newer = overlaps[:half].mean(), overlaps[half:].mean()
+
+        return (older - newer) / older if older > 0 else 0.0
+
+    def get_stop_reason(self, overlap: float) -> str:
+        if self.target_overlap is not None and overlap <= self.target_overlap:
+            return "converged"
+
+        if self.max_steps is not None and self.steps >= self.max_steps:
+            return "max_steps"
+
+        if self.max_actions is not None and self.actions >= self.max_actions:
+            return "max_actions"
+
+        if self.max_seconds is not None and self.seconds >= self.max_seconds:
+            return "max_seconds"
+
+        if len(self.overlaps) < self.window:
+            return None
+
+        settled = (
+            self.settle_distance is None
+            or np.mean(self.displacements) < self.settle_distance
+        )
+
+        if settled and self.get_improvement() < self.min_improvement:
+            return "stalled"
+
+        return None
+
+    def update(self, overlap: float, actions: int = 0) -> bool:
+        """record one step, or one overlap removal round of actions, and return True
+        once the run should stop"""
+        self.steps += 1
+        self.actions += actions
+        displacement = self.get_displacement()
+
+        self.overlaps.append(overlap)
+        self.displacements.append(displacement)
+        self.history.append(
+            (self.steps, self.actions, self.seconds, overlap, displacement)
+        )
+
+        if self.stop_reason is None:
+            self.stop_reason = self.get_stop_reason(overlap)
+
+        return self.stopped
+
+    def export_history(self, filename: str):
+        """writes the history, with the stop reason on the last row"""
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+
+        with open(filename, "w", newline="") as f:
+            write = csv.writer(f)
+            write.writerow(
+                ["steps", "actions", "seconds", "overlap", "displacement", "stop_reason"]
+            )
+
+            for i, row in enumerate(self.history):
+                last = i == len(self.history) - 1
+                write.writerow((*row, self.stop_reason if last else ""))
+
+        print(filename + " has been exported.")
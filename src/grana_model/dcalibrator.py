@@ -31,17 +31,21 @@ class DCalibrator:
     def calc_step_rads(self, d):
         return np.sqrt(2 * d * 2)
 
-    def convert_d_from_nm2_ns_to_cm2_s(self, d: float):
+    @staticmethod
+    def convert_d_from_nm2_ns_to_cm2_s(d: float):
         return d * 1e-14 / 1e-9
 
-    def convert_d_from_cm2_s_to_nm2_ns(self, d: float):
+    @staticmethod
+    def convert_d_from_cm2_s_to_nm2_ns(d: float):
         return d * 1e-9 / 1e-14
 
-    def convert_d_from_rads2_s_to_rads2_ns(self, d: float):
+    @staticmethod
+    def convert_d_from_rads2_s_to_rads2_ns(d: float):
         """converts time scale from s to ns"""
         return d * 1e-9
 
-    def convert_d_from_rads2_ns_to_rads2_s(self, d: float):
+    @staticmethod
+    def convert_d_from_rads2_ns_to_rads2_s(d: float):
         """converts time scale from s to ns"""
         return d / 1e-9
 
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""incremental densification
+
+This module produces a series of LHCII densities from one run. Starting from a relaxed
+configuration, either in memory or loaded from a coordinate export, it inserts
+additional LHCII at the points with the most free space around them, relaxes briefly,
+and exports each density level in turn. Each level starts from the relaxed previous one
+instead of from scratch, so the full series costs little more than the densest run.
+
+The free space is kept in a FreeSpaceIndex, a grid of clearance values over the section,
+the distance from each grid point to the nearest structure shape. It is built with
+pymunk point queries, and lowered incrementally as structures are inserted.
+
+New structures are inserted scaled down to fit their free region, and are grown back
+to full size with a GrowthProtocol during the relaxation.
+
+Example:
+    $ densifier = Densifier(env.spawner, env.space, env.overlap_handler,
+        env.obstacle_list, levels=[69, 100, 150])
+    $ densifier.run()
+
+"""
+import csv
+import time
+from pathlib import Path
+
+import numpy as np
+import pymunk
+
+from src.grana_model.growthprotocol import GrowthProtocol
+from src.grana_model.psiistructure import PSIIStructure
+
+
+class FreeSpaceIndex:
+    """grid of free space clearance over a section.
+
+    Parameters:
+        space (pymunk.Space): the space with the structures
+        section (tuple): x, y, width, height of the area to index
+        resolution (float): grid spacing, in nm
+        max_clearance (float): clearances are capped at this distance, in nm, which
+            keeps the point queries short
+
+    Attributes:
+        points (np.ndarray): (n, 2) grid point coordinates
+        clearance (np.ndarray): (n,) distance from each grid point to the nearest
+            structure or section edge, negative inside a structure
+    """
+
+    def __init__(
+        self,
+        space: pymunk.Space,
+        section: tuple = (200, 200, 100, 100),
+        resolution: float = 2.0,
+        max_clearance: float = 10.0,
+    ):
+        self.space = space
+        self.section = section
+        self.resolution = resolution
+        self.max_clearance = max_clearance
+
+        x, y, width, height = section
+        xs = np.arange(x + resolution / 2, x + width, resolution)
+        ys = np.arange(y + resolution / 2, y + height, resolution)
+        gx, gy = np.meshgrid(xs, ys)
+        self.points = np.column_stack((gx.ravel(), gy.ravel()))
+        self.edge_clearance = np.min(
+            np.column_stack(
+                (
+                    self.points[:, 0] - x,
+                    x + width - self.points[:, 0],
+                    self.points[:, 1] - y,
+                    y + height - self.points[:, 1],
+                )
+            ),
+            axis=1,
+        )
+        self.clearance = None
+        self.refresh()
+
+    def query_clearance(self, point) -> float:
+        """distance from point to the nearest structure shape, capped at max_clearance.
+        Sensors and boundaries are skipped, they are not structures."""
+        hits = [
+            info.distance
+            for info in self.space.point_query(
+                tuple(point), self.max_clearance, pymunk.ShapeFilter()
+            )
+            if info.shape is not None and info.shape.collision_type == 1
+        ]
+
+        return min(hits, default=self.max_clearance)
+
+    def refresh(self):
+        """rebuild the clearance of every grid point from the space"""
+        self.clearance = np.minimum(
+            np.array([self.query_clearance(p) for p in self.points]),
+            self.edge_clearance,
+        )
+
+    def largest_free_point(self):
+        """returns the grid point with the most clearance, and its clearance"""
+        i = int(np.argmax(self.clearance))
+        return tuple(self.points[i]), float(self.clearance[i])
+
+    def insert(self, position: tuple, radius: float):
+        """lower the clearance around a structure inserted at position, approximated
+        by its bounding circle, without querying the space again"""
+        distance = np.linalg.norm(self.points - position, axis=1) - radius
+        np.minimum(self.clearance, distance, out=self.clearance)
+
+
+class Densifier:
+    """inserts LHCII into a relaxed configuration, level by level.
+
+    Parameters:
+        spawner (Spawner): provides object_data, structure_dict, shape_type and section
+        space (pymunk.Space): the space with the structures
+        overlap_handler (CollisionHandler): measures the overlap distance
+        object_list (list of PSIIStructure): the relaxed structures. New structures are
+            appended to it, so a SimulationEnvironment sharing it sees them too.
+        levels (list of int): total number of LHCII of each density level
+        relax_steps (int): maximum space steps of relaxation for each level
+        dt (float): space step time
+        resolution (float): free space grid spacing, in nm
+        min_scale (float): smallest scale a structure is inserted at
+        growth_rate (float): scale added per step while growing inserted structures
+
+    Attributes:
+        report (list of tuple): (level, seconds, overlap, growth status) for each level
+    """
+
+    def __init__(
+        self,
+        spawner,
+        space: pymunk.Space,
+        overlap_handler,
+        object_list: list,
+        levels: list = [69, 100, 150, 250],
+        relax_steps: int = 300,
+        dt: float = 0.01666667,
+        resolution: float = 2.0,
+        min_scale: float = 0.3,
+        growth_rate: float = 0.01,
+    ):
+        self.spawner = spawner
+        self.space = space
+        self.overlap_handler = overlap_handler
+        self.object_list = object_list
+        self.levels = levels
+        self.relax_steps = relax_steps
+        self.dt = dt
+        self.min_scale = min_scale
+        self.growth_rate = growth_rate
+        self.report = []
+        self.free_space = FreeSpaceIndex(
+            space, section=spawner.section, resolution=resolution
+        )
+
+    def get_structure_radius(self) -> float:
+        """bounding radius of an LHCII at full size"""
+        obj_dict = self.spawner.object_data.type_dict["LHCII"]
+        vertices = np.array(
+            [v for shape in obj_dict["shapes_simple"] for v in shape], dtype=float
+        )
+        return float(np.linalg.norm(vertices, axis=1).max())
+
+    def get_num_lhcii(self) -> int:
+        """LHCII in object_list, the levels don't count PSII"""
+        return sum(o.type == "LHCII" for o in self.object_list)
+
+    def insert_lhcii(self, count: int) -> list:
+        """insert count LHCII at the largest free regions, each scaled to fit its
+        region, and return them"""
+        radius = self.get_structure_radius()
+        new_objects = []
+
+        for _ in range(count):
+            pos, clearance = self.free_space.largest_free_point()
+            scale = min(1.0, max(self.min_scale, clearance / radius))
+
+            structure = PSIIStructure(
+                self.space,
+                self.spawner.object_data.type_dict["LHCII"],
+                self.spawner.batch,
+                self.spawner.shape_type,
+                pos=pos,
+                angle=self.spawner.random_angle(),
+                use_sprites=self.spawner.use_sprites,
+                structure_dict=self.spawner.structure_dict["LHCII"],
+                scale=scale,
+            )
+            self.free_space.insert(pos, scale * radius)
+            new_objects.append(structure)
+
+        self.object_list.extend(new_objects)
+
+        return new_objects
+
+    def relax(self, new_objects: list):
+        """step the space until the new structures have grown to full size, or the
+        step budget is used up. returns the growth status"""
+        # all new structures grow together, from the smallest insertion scale
+        growth = GrowthProtocol(
+            initial_scale=min((o.scale for o in new_objects), default=1.0),
+            growth_rate=self.growth_rate,
+            max_stall_steps=self.relax_steps,
+        )
+        growth.start(new_objects)
+
+        for _ in range(self.relax_steps):
+            self.overlap_handler.reset_collision_count()
+            self.space.step(self.dt)
+
+            growth.update(
+                self.overlap_handler.overlap_distance,
+                self.overlap_handler.collision_count,
+            )
+
+            if growth.finished:
+                break
+
+        return growth.status
+
+    def get_overlap_distance(self) -> float:
+        self.overlap_handler.reset_collision_count()
+        self.space.step(self.dt)
+        return self.overlap_handler.overlap_distance
+
+    def get_export_filename(self, level: int):
+        filename = (
+            f"lhcii_export_coords/{self.spawner.shape_type}_densified_num_{level}_coords".replace(
+                ".", "p"
+            )
+            + ".csv"
+        )
+        return filename
+
+    def export_coordinates(self, filename: str):
+        print(filename + " has been exported.")
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+
+        with open(filename, "w", newline="") as f:
+            write = csv.writer(f)
+            write.writerow(["type", "x", "y", "angle", "area"])
+
+            for o in self.object_list:
+                write.writerow(
+                    (o.type, o.body.position[0], o.body.position[1], o.body.angle, o.area)
+                )
+
+    def run(self, export: bool = True):
+        """insert and relax up to each level in turn, exporting each one"""
+        start = time.perf_counter()
+
+        for level in self.levels:
+            count = level - self.get_num_lhcii()
+
+            if count > 0:
+                self.free_space.refresh()
+                new_objects = self.insert_lhcii(count)
+                status = self.relax(new_objects)
+            else:
+                status = "done"
+
+            overlap = self.get_overlap_distance()
+            seconds = time.perf_counter() - start
+            self.report.append((level, seconds, overlap, status))
+
+            print(
+                f"level {level}: {status} after {round(seconds, 2)} s, overlap: {round(overlap, 2)}"
+            )
+
+            if export:
+                self.export_coordinates(self.get_export_filename(level))
+
+        return self.report
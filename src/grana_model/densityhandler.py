@@ -1,6 +1,4 @@
-from pyglet.text import Label
 from math import pi
-from pyglet.shapes import Circle, Rectangle
 import pymunk
 
 # colors for objects in sim window
@@ -36,6 +34,8 @@ class DensityHandler:
         self.out_color = out_color
 
     def draw_density_label(self, label_pos: tuple = (200, 300)):
+        from pyglet.text import Label
+
         area_text = (
             f"ensemble density: {self.internal_area / (self.ensemble_area)}"
         )
@@ -50,6 +50,8 @@ class DensityHandler:
         print(f"ensemble density = {self.internal_area / (self.ensemble_area)}")
 
     def draw_rectangle(self, opacity: int = 75, color: tuple = (255, 0, 0)):
+        from pyglet.shapes import Rectangle
+
         rectangle = Rectangle(self.x, self.y, self.width, self.height, color=color)
         rectangle.opacity = opacity
         rectangle.draw()
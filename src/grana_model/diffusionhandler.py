@@ -1,8 +1,6 @@
 from src.grana_model.particle import Particle
 import itertools
 import numpy as np
-from sklearn.utils.extmath import cartesian
-import pandas as pd
 import time
 
 
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""hard-disk engine
+
+This module implements a specialized engine for the circle approximation shape types
+(lhcii_circle_<r>_<n> and lhcii_disk_<r>). With every LHCII approximated as a circle,
+the model is a disk packing problem, so instead of pymunk polygons and arbiter callbacks the structures are
+kept as arrays of centers and radii. Overlapping pairs are found with a cell list, and
+both the Brownian moves and the overlap resolution are vectorized in numpy.
+
+The coordinates are exported in the same format as SimulationEnvironment, so the
+results can be compared directly with the pymunk runs.
+
+Example:
+    $ engine = DiskEngine.from_shape_type("lhcii_circle_3.75_94", num_disks=200)
+    $ engine.run(max_steps=500)
+    $ engine.export_coordinates(engine.get_export_filename())
+
+"""
+import csv
+from pathlib import Path
+
+import numpy as np
+
+from src.grana_model.spatialindex import find_pairs_within
+from src.grana_model.utils import get_disk_radius
+
+
+class DiskEngine:
+    """Brownian hard-disk packing in a rectangular section.
+
+    Parameters:
+        num_disks (int): number of disks
+        radius (float): disk radius, in nm
+        section (tuple): x, y, width, height of the area the disks are confined to
+        step_nm (float): root mean squared Brownian displacement per step, in nm
+        rotation_step (float): standard deviation of the rotation per step, in radians.
+            Disks don't need an angle, but it is exported for parity with the pymunk runs.
+        resolve_iterations (int): number of overlap resolution passes per step
+        obj_type (str): structure type written to the export
+        shape_type (str): shape type used in the export filename
+        seed (int): random seed, None for a random run
+    """
+
+    def __init__(
+        self,
+        num_disks: int,
+        radius: float,
+        section: tuple = (200, 200, 100, 100),
+        step_nm: float = 0.5,
+        rotation_step: float = 0.1,
+        resolve_iterations: int = 10,
+        obj_type: str = "LHCII",
+        shape_type: str = "disk",
+        seed: int = None,
+    ):
+        self.rng = np.random.default_rng(seed)
+        self.section = section
+        self.step_nm = step_nm
+        self.rotation_step = rotation_step
+        self.resolve_iterations = resolve_iterations
+        self.obj_type = obj_type
+        self.shape_type = shape_type
+        self.steps = 0
+        self.overlap_history = []
+
+        x, y, width, height = section
+        self.radii = np.full(num_disks, radius, dtype=float)
+        self.centers = np.column_stack(
+            (
+                x + width * self.rng.random(num_disks),
+                y + height * self.rng.random(num_disks),
+            )
+        )
+        self.angles = 2 * np.pi * self.rng.random(num_disks)
+
+    @classmethod
+    def from_shape_type(cls, shape_type: str, num_disks: int, **kwargs):
+        """creates an engine for a circle approximation shape type, ie 'lhcii_circle_3.75_94'"""
+        radius = get_disk_radius(shape_type)
+
+        if radius is None:
+            raise ValueError(f"{shape_type} is not a circle approximation shape type")
+
+        return cls(num_disks=num_disks, radius=radius, shape_type=shape_type, **kwargs)
+
+    @property
+    def area(self):
+        return np.pi * self.radii**2
+
+    def overlapping_pairs(self):
+        """returns the index arrays i, j of all overlapping disk pairs, and their
+        overlap depth"""
+        pairs = find_pairs_within(self.centers, 2 * self.radii.max())
+        i, j = pairs[:, 0], pairs[:, 1]
+        distance = np.linalg.norm(self.centers[j] - self.centers[i], axis=1)
+        depth = self.radii[i] + self.radii[j] - distance
+        overlapping = depth > 0
+
+        return i[overlapping], j[overlapping], depth[overlapping]
+
+    def get_overlap_distance(self) -> float:
+        """sum of the overlap depth of all overlapping pairs, the disk equivalent of
+        CollisionHandler.overlap_distance"""
+        _, _, depth = self.overlapping_pairs()
+        return float(depth.sum())
+
+    def confine(self):
+        """keep the disk centers within the section"""
+        x, y, width, height = self.section
+        np.clip(self.centers[:, 0], x, x + width, out=self.centers[:, 0])
+        np.clip(self.centers[:, 1], y, y + height, out=self.centers[:, 1])
+
+    def resolve_overlap(self, iterations: int = None) -> float:
+        """pushes overlapping disks apart along the line between their centers, each
+        by half the overlap depth. returns the remaining overlap distance"""
+        if iterations is None:
+            iterations = self.resolve_iterations
+
+        for _ in range(iterations):
+            i, j, depth = self.overlapping_pairs()
+
+            if len(depth) == 0:
+                return 0.0
+
+            delta = self.centers[j] - self.centers[i]
+            distance = np.linalg.norm(delta, axis=1)
+
+            # coincident centers get a random push direction
+            coincident = distance < 1e-9
+            delta[coincident] = self.rng.normal(size=(coincident.sum(), 2))
+            distance[coincident] = np.linalg.norm(delta[coincident], axis=1)
+
+            push = (0.5 * depth / distance)[:, None] * delta
+            np.add.at(self.centers, i, -push)
+            np.add.at(self.centers, j, push)
+            self.confine()
+
+        return self.get_overlap_distance()
+
+    def brownian_step(self):
+        """moves and rotates all disks by a random gaussian step"""
+        self.centers += self.rng.normal(
+            scale=self.step_nm / np.sqrt(2), size=self.centers.shape
+        )
+        self.angles += self.rng.normal(scale=self.rotation_step, size=self.angles.shape)
+        self.confine()
+
+    def step(self) -> float:
+        self.steps += 1
+        self.brownian_step()
+        overlap = self.resolve_overlap()
+        self.overlap_history.append(overlap)
+
+        return overlap
+
+    def run(self, max_steps: int, tolerance: float = 0.0, debug: bool = False):
+        """step until max_steps is reached, or the overlap distance is at or below
+        tolerance. returns the overlap history"""
+        for _ in range(max_steps):
+            overlap = self.step()
+
+            if debug and self.steps % 20 == 0:
+                print(f"step {self.steps}, overlap: {overlap}")
+
+            if overlap <= tolerance:
+                break
+
+        return self.overlap_history
+
+    def get_export_filename(self, step_limit: int = None):
+        limit = self.steps if step_limit is None else step_limit
+        filename = (
+            f"lhcii_export_coords/{self.shape_type}_disk_limit_{limit}_coords".replace(
+                ".", "p"
+            )
+            + ".csv"
+        )
+        return filename
+
+    def export_coordinates(self, filename="coords.csv"):
+        print(filename + " has been exported.")
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+
+        with open(filename, "w", newline="") as f:
+            write = csv.writer(f)
+            # write the headers
+            write.writerow(["type", "x", "y", "angle", "area"])
+
+            for (x, y), angle, area in zip(self.centers, self.angles, self.area):
+                write.writerow((self.obj_type, x, y, angle, area))
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""ensemble batching
+
+This module implements an EnsembleRunner, which runs many small independent replicas,
+ie density and seed replicates of the 100 x 100 nm patch, in one process.
+
+A replica with 70 to 250 LHCII steps in a few ms, so running each one as its own
+process spends much of its time on imports, loading the ObjectData shape and
+coordinate csv files, and setting up the handlers. The runner builds every replica's
+SimulationEnvironment in one process, from one ObjectData, and steps them round-robin,
+one step each per round, until each has stopped on its own terms: the step limit, a
+ConvergenceMonitor or a GrowthProtocol. Finished replicas drop out of the rounds, and
+their results are recorded:
+
+    * the replica parameters and seed
+    * steps, overlap, and the ConvergenceMonitor stop reason if there is one
+    * the packing density of the ensemble area
+    * build and step wall clock seconds
+
+Each replica has its own pymunk.Space and handlers, collision handlers are bound to
+their space. Geometry is shared: the ObjectData shapes, the circle shape coordinates
+cache of PSIIStructure and the distance magnitudes.
+
+Spawning is seeded per replica. Thermal movement draws from the shared random module
+while the replicas are interleaved, so with thermove enabled only the spawn is
+reproducible.
+
+Example:
+    $ runner = EnsembleRunner(
+        build_replica=lambda num_lhcii, seed: create_replica(
+            object_data, "simple", num_lhcii, notes=f"_num_{num_lhcii}_seed_{seed}"
+        ),
+        replicas=[{"num_lhcii": n, "seed": s} for n in (70, 150, 250) for s in range(10)],
+    )
+    $ runner.run()
+    $ runner.export_results("ensemble_results.csv")
+
+"""
+import csv
+import random
+import time
+from pathlib import Path
+
+import numpy as np
+
+RESULT_COLUMNS = [
+    "replica",
+    "seed",
+    "num_structures",
+    "steps",
+    "overlap",
+    "stop_reason",
+    "density",
+    "build_seconds",
+    "step_seconds",
+]
+
+
+class EnsembleRunner:
+    """steps many independent SimulationEnvironment replicas in one process.
+
+    Parameters:
+        build_replica (callable): takes the parameters of one replica, and its seed,
+            and returns its SimulationEnvironment, with a step_limit or
+            ConvergenceMonitor so it stops
+        replicas (list of dict): parameters of each replica, passed to build_replica.
+            A "seed" entry seeds random and numpy before the replica is built, and
+            defaults to the replica's index
+        max_rounds (int): stop the remaining replicas after this many rounds, None to
+            run until all have stopped
+
+    Attributes:
+        envs (list): the SimulationEnvironment of each replica, after start()
+        results (list of dict): one row of RESULT_COLUMNS, plus the replica parameters,
+            per finished replica
+    """
+
+    def __init__(self, build_replica, replicas: list, max_rounds: int = None):
+        self.build_replica = build_replica
+        self.replicas = replicas
+        self.max_rounds = max_rounds
+        self.envs = []
+        self.results = []
+
+    def start(self):
+        """builds all replicas"""
+        self.envs = []
+        self.results = []
+        self.build_seconds = []
+        self.step_seconds = np.zeros(len(self.replicas))
+        self.rounds = 0
+
+        for i, params in enumerate(self.replicas):
+            seed = params.get("seed", i)
+            random.seed(seed)
+            np.random.seed(seed)
+
+            start = time.perf_counter()
+            self.envs.append(self.build_replica(**{**params, "seed": seed}))
+            self.build_seconds.append(time.perf_counter() - start)
+
+    def step(self, active: list) -> list:
+        """one round, one step of each active replica. Returns the ones still active."""
+        still_active = []
+
+        for i in active:
+            env = self.envs[i]
+            start = time.perf_counter()
+            env.step()
+            self.step_seconds[i] += time.perf_counter() - start
+
+            if env.active:
+                still_active.append(i)
+            else:
+                self.finish(i)
+
+        self.rounds += 1
+
+        return still_active
+
+    def run(self, debug: bool = False) -> list:
+        """builds and steps all replicas until they have stopped, returns the results"""
+        self.start()
+        active = list(range(len(self.envs)))
+
+        while active and (self.max_rounds is None or self.rounds < self.max_rounds):
+            active = self.step(active)
+
+            if debug and self.rounds % 100 == 0:
+                print(f"round {self.rounds}, active replicas: {len(active)}")
+
+        # out of rounds
+        for i in active:
+            self.finish(i, stop_reason="max_rounds")
+
+        self.results.sort(key=lambda row: row["replica"])
+
+        if debug:
+            total = sum(self.build_seconds) + self.step_seconds.sum()
+            print(
+                f"{len(self.results)} replicas in {round(total, 2)} s, "
+                f"{round(len(self.results) / total * 3600)} per core-hour"
+            )
+
+        return self.results
+
+    def finish(self, i: int, stop_reason: str = None):
+        """records the result of replica i"""
+        env = self.envs[i]
+        params = self.replicas[i]
+
+        if stop_reason is None:
+            convergence = getattr(env, "convergence", None)
+            growth = getattr(env, "growth", None)
+
+            if convergence is not None and convergence.stopped:
+                stop_reason = convergence.stop_reason
+            elif growth is not None and growth.finished:
+                stop_reason = f"growth_{growth.status}"
+            else:
+                stop_reason = "step_limit"
+
+        area = env.get_ensemble_area()
+
+        self.results.append(
+            {
+                **params,
+                "replica": i,
+                "seed": params.get("seed", i),
+                "num_structures": len(env.obstacle_list),
+                "steps": env.steps,
+                "overlap": env.overlap_handler.overlap_distance,
+                "stop_reason": stop_reason,
+                "density": area["internal_area"] / area["ensemble_area"],
+                "build_seconds": self.build_seconds[i],
+                "step_seconds": float(self.step_seconds[i]),
+            }
+        )
+
+    def export_results(self, filename: str = "ensemble_results.csv"):
+        """writes one row per replica, the result columns followed by the replica
+        parameters"""
+        params = sorted({k for row in self.results for k in row} - set(RESULT_COLUMNS))
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+
+        with open(filename, "w", newline="") as f:
+            write = csv.DictWriter(f, fieldnames=RESULT_COLUMNS + params)
+            write.writeheader()
+            write.writerows(self.results)
+
+        print(filename + " has been exported.")
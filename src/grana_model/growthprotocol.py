@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""shape growth packing protocol
+
+This module implements a Lubachevsky-Stillinger style growth protocol. All structures
+are spawned scaled down, so they start with little or no overlap at the target number
+per area, and are then inflated a little every step while the simulation moves them.
+Growth is paused whenever the mean overlap per contact exceeds a tolerance, so the
+solver can push the structures apart before they grow further. Dense configurations are
+reached without the long overlap removal that random placement at full size needs.
+The rearrangement comes from thermal motion, so the AttractionHandler should have
+thermove enabled, as main() does; without it only the contact resolution moves the
+structures, and growth jams early.
+
+The mean is used rather than the total overlap distance, because pymunk leaves every
+resting contact overlapped by up to space.collision_slop, so the total grows with the
+number of contacts.
+
+Example:
+    $ growth = GrowthProtocol(initial_scale=0.5, growth_rate=0.005)
+    $ env = SimulationEnvironment(..., growth=growth)
+    $ env.run()  # stops once growth is finished
+
+"""
+
+
+class GrowthProtocol:
+    """inflates all structures from initial_scale to their true size.
+
+    Parameters:
+        initial_scale (float): shape size at the start, relative to the true size
+        growth_rate (float): scale added per step, while the overlap is tolerable
+        overlap_tolerance (float): mean overlap per contact, in nm, above which growth
+            is paused. Should be above space.collision_slop (0.1 by default).
+        relax_steps (int): steps to keep relaxing at full size before finishing
+        max_stall_steps (int): consecutive paused steps after which the configuration
+            is considered jammed, and growth ends below full size
+
+    Attributes:
+        scale (float): current shape scale
+        finished (bool): True once growth has ended, see status
+        status (str): "growing", "relaxing", "done" or "jammed"
+        history (list of tuple): (scale, mean overlap per contact) after each step
+    """
+
+    def __init__(
+        self,
+        initial_scale: float = 0.5,
+        growth_rate: float = 0.005,
+        overlap_tolerance: float = 0.15,
+        relax_steps: int = 20,
+        max_stall_steps: int = 200,
+    ):
+        self.initial_scale = initial_scale
+        self.growth_rate = growth_rate
+        self.overlap_tolerance = overlap_tolerance
+        self.relax_steps = relax_steps
+        self.max_stall_steps = max_stall_steps
+        self.object_list = []
+        self.scale = initial_scale
+        self.status = "growing"
+        self.stall_steps = 0
+        self.relaxed_steps = 0
+        self.history = []
+
+    @property
+    def finished(self):
+        return self.status in ("done", "jammed")
+
+    def start(self, object_list: list):
+        """shrink all structures to the initial scale"""
+        self.object_list = object_list
+        self.scale = self.initial_scale
+        self.status = "growing"
+        self.stall_steps = 0
+        self.relaxed_steps = 0
+        self.history = []
+        self.set_scale(self.scale)
+
+    def set_scale(self, scale: float):
+        for o in self.object_list:
+            o.set_scale(scale)
+
+    def update(self, overlap_distance: float, contacts: int):
+        """called after each space step with the overlap distance and the number of
+        contacts of that step. grows the structures if the overlap is tolerable, and
+        returns the status"""
+        overlap = overlap_distance / contacts if contacts > 0 else 0.0
+        self.history.append((self.scale, overlap))
+
+        if self.finished:
+            return self.status
+
+        if overlap > self.overlap_tolerance:
+            self.stall_steps += 1
+
+            if self.stall_steps >= self.max_stall_steps:
+                self.status = "jammed"
+                print(f"growth jammed at scale {round(self.scale, 3)}")
+
+            return self.status
+
+        self.stall_steps = 0
+
+        if self.scale < 1.0:
+            self.scale = min(1.0, self.scale + self.growth_rate)
+            self.set_scale(self.scale)
+            self.status = "growing" if self.scale < 1.0 else "relaxing"
+        else:
+            self.relaxed_steps += 1
+
+            if self.relaxed_steps >= self.relax_steps:
+                self.status = "done"
+
+        return self.status
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""online mean squared displacement
+
+This module implements a multi-tau correlator for the mean squared displacement of all
+bodies of a simulation, computed while it runs instead of from logged positions.
+
+The correlator keeps a short buffer of the last p positions at each of a series of
+levels. Level 0 holds every step, and each following level every m-th entry of the one
+below, so level l covers lags of up to p * m^l steps. Every new entry is compared to
+all entries of its level's buffer, for lags 1 to p - 1 at level 0 and p/m to p - 1
+(times m^l) above it, which spaces the lags logarithmically. Levels are added as the run
+grows, so memory is logarithmic in the run length, and the cost per step stays about
+2p comparisons per body.
+
+Translational and rotational MSD are kept per body, and averaged per structure type at
+the end of a run. The D estimates use the same conventions as DCalibrator, MSD = 4 D t
+and MSD_rot = 2 D_rot t, converted to cm^2/s and rad^2/s, so they can be compared to
+the structure_dict targets directly.
+
+Example:
+    $ correlator = MultiTauMSD(time_per_step=2)
+    $ env = SimulationEnvironment(..., msd_correlator=correlator)
+
+    or on its own
+
+    $ correlator.start(types=[o.type for o in obstacle_list])
+    $ correlator.update(positions, angles)  # every step
+    $ correlator.compare_to_targets(structure_dict)
+
+"""
+import csv
+from pathlib import Path
+
+import numpy as np
+
+from src.grana_model.dcalibrator import DCalibrator
+
+
+class MultiTauMSD:
+    """multi-tau mean squared displacement correlator for n bodies.
+
+    Parameters:
+        types (list of str): structure type of each body, the MSD is averaged per type.
+            None waits for start().
+        p (int): buffer length of each level, a multiple of m
+        m (int): decimation factor between levels
+        time_per_step (float): simulated time per step, in ns
+        max_levels (int): levels are not added beyond this, which caps the longest lag
+
+    Attributes:
+        steps (int): updates so far
+        lags (np.ndarray): (k,) lag of each correlator channel, in steps
+    """
+
+    def __init__(
+        self,
+        types: list = None,
+        p: int = 16,
+        m: int = 2,
+        time_per_step: float = 2.0,
+        max_levels: int = 30,
+    ):
+        if p % m != 0:
+            raise ValueError(f"p ({p}) must be a multiple of m ({m})")
+
+        self.p = p
+        self.m = m
+        self.time_per_step = time_per_step
+        self.max_levels = max_levels
+        self.start([] if types is None else types)
+
+    def start(self, types: list):
+        """reset the correlator for bodies of these types"""
+        self.types = np.array(types)
+        self.num_bodies = len(types)
+        self.steps = 0
+
+        self.buffers = []  # per level, (p, n, 3) of x, y, angle, circular
+        self.filled = []  # per level, number of entries inserted
+        self.sums = []  # per level, (p, n, 2) summed squared displacement and rotation
+        self.counts = []  # per level, (p,) number of samples for each lag
+        self._add_level()
+
+    def _add_level(self):
+        self.buffers.append(np.zeros((self.p, self.num_bodies, 3)))
+        self.filled.append(0)
+        self.sums.append(np.zeros((self.p, self.num_bodies, 2)))
+        self.counts.append(np.zeros(self.p, dtype=int))
+
+    @property
+    def levels(self):
+        return len(self.buffers)
+
+    def _first_lag(self, level: int) -> int:
+        """the smallest buffer lag of a level that the level below doesn't cover"""
+        return 1 if level == 0 else self.p // self.m
+
+    def _insert(self, level: int, state: np.ndarray):
+        """add a state to a level's buffer, and correlate it with the earlier ones"""
+        buffer = self.buffers[level]
+        filled = self.filled[level]
+        buffer[filled % self.p] = state
+        self.filled[level] = filled + 1
+
+        available = min(filled, self.p - 1)
+        first = self._first_lag(level)
+
+        if available >= first:
+            lags = np.arange(first, available + 1)
+            earlier = buffer[(filled - lags) % self.p]
+            delta = state[None] - earlier
+            self.sums[level][lags, :, 0] += np.sum(delta[..., :2] ** 2, axis=-1)
+            self.sums[level][lags, :, 1] += delta[..., 2] ** 2
+            self.counts[level][lags] += 1
+
+        # every m-th entry also goes one level up
+        if (filled + 1) % self.m == 0:
+            if level + 1 == self.levels:
+                if self.levels >= self.max_levels:
+                    return
+
+                self._add_level()
+
+            self._insert(level + 1, state)
+
+    def update(self, positions: np.ndarray, angles: np.ndarray = None):
+        """record one step of (n, 2) positions, unwrapped if the box is periodic, and
+        (n,) angles in radians"""
+        if angles is None:
+            angles = np.zeros(self.num_bodies)
+
+        self.steps += 1
+        self._insert(0, np.column_stack((positions, angles)))
+
+    def get_channels(self):
+        """returns the lags, in steps, and the (k, n, 2) MSD of every channel with
+        samples"""
+        lags, msd = [], []
+
+        for level in range(self.levels):
+            first = self._first_lag(level)
+
+            for j in range(first, self.p):
+                count = self.counts[level][j]
+
+                if count > 0:
+                    lags.append(j * self.m**level)
+                    msd.append(self.sums[level][j] / count)
+
+        return np.array(lags), np.array(msd).reshape(-1, self.num_bodies, 2)
+
+    @property
+    def lags(self):
+        return self.get_channels()[0]
+
+    def get_msd(self, structure_type: str = None):
+        """returns time, in ns, translational MSD, in nm^2, and rotational MSD, in
+        rad^2, averaged over the bodies of structure_type, or all of them"""
+        lags, msd = self.get_channels()
+        selected = (
+            np.ones(self.num_bodies, dtype=bool)
+            if structure_type is None
+            else self.types == structure_type
+        )
+        mean = msd[:, selected].mean(axis=1)
+
+        return lags * self.time_per_step, mean[:, 0], mean[:, 1]
+
+    def get_diffusion_coefficients(
+        self, min_time: float = 0.0, max_time: float = np.inf
+    ) -> dict:
+        """least squares D and D_rot per structure type, from the MSD between min_time
+        and max_time ns, in cm^2/s and rad^2/s"""
+        result = {}
+
+        for structure_type in np.unique(self.types):
+            t, msd, msd_rot = self.get_msd(structure_type)
+            fit = (t >= min_time) & (t <= max_time)
+            t, msd, msd_rot = t[fit], msd[fit], msd_rot[fit]
+
+            if len(t) == 0:
+                continue
+
+            # fits through the origin, MSD = 4 D t and MSD_rot = 2 D_rot t
+            d_ns = np.sum(msd * t) / (4 * np.sum(t**2))
+            d_rot_ns = np.sum(msd_rot * t) / (2 * np.sum(t**2))
+
+            result[str(structure_type)] = {
+                "d": float(DCalibrator.convert_d_from_nm2_ns_to_cm2_s(d_ns)),
+                "d_rot": float(DCalibrator.convert_d_from_rads2_ns_to_rads2_s(d_rot_ns)),
+            }
+
+        return result
+
+    def compare_to_targets(self, structure_dict: dict, **kwargs) -> dict:
+        """the measured D values next to the structure_dict targets of each type"""
+        measured = self.get_diffusion_coefficients(**kwargs)
+
+        return {
+            structure_type: {
+                **values,
+                "target_d": structure_dict[structure_type]["d"],
+                "target_d_rot": structure_dict[structure_type]["d_rot"],
+            }
+            for structure_type, values in measured.items()
+            if structure_type in structure_dict
+        }
+
+    def export_msd(self, filename: str = "msd.csv"):
+        """writes MSD(t) of each structure type"""
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+
+        with open(filename, "w", newline="") as f:
+            write = csv.writer(f)
+            write.writerow(["type", "time_ns", "msd_nm2", "msd_rot_rad2"])
+
+            for structure_type in np.unique(self.types):
+                for row in zip(*self.get_msd(structure_type)):
+                    write.writerow((structure_type, *row))
+
+        print(filename + " has been exported.")
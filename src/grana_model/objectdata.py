@@ -1,5 +1,4 @@
 from typing import Any, Iterator
-import pandas as pd
 import random
 from math import pi
 import numpy as np
@@ -53,6 +52,8 @@ class ObjectData:
 
     def __import_pos_data(self, file_path):
         """Imports the (x, y) positions from the csv data file provided in filename"""
+        import pandas as pd
+
         imported_csv = pd.read_csv(file_path)
         return pd.DataFrame(imported_csv, columns=["x", "y"]).values.tolist()
 
@@ -158,6 +159,8 @@ class ObjectDataExistingData(ObjectData):
 
     def __import_pos_data(self, file_path):
         """Imports the (x, y) positions from the csv data file provided in filename"""
+        import pandas as pd
+
         imported_csv = pd.read_csv(file_path)
         return pd.DataFrame(
             imported_csv, columns=["type", "x", "y", "angle"]
@@ -213,6 +216,8 @@ class ObjectDataExistingData(ObjectData):
 
 def create_shape_list(filename):
     """ import csv files to create a shape list, then pickle and save it"""
+    import pandas as pd
+
     filelist = glob.glob(f"{filename}*.csv")
 
     new_shape_list = [pd.read_csv(file).values.tolist() for file in filelist]
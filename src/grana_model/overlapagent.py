@@ -12,6 +12,17 @@ Example:
         space=space)
     $ overlap_agent.run()
 
+    or, coarse to fine, relaxing on simple hulls before a short pass on complex shapes
+
+    $ pipeline = OverlapPipeline(space, object_list, collision_handler,
+        stages=[{"shape_type": "simple", "time_limit": 1000},
+                {"shape_type": "complex", "time_limit": 100}])
+    $ pipeline.run()
+
+    or, several non-neighbouring objects per space step
+
+    $ overlap_agent = OverlapAgent(space, object_list, collision_handler, batch_size=16)
+
     or 
 
     $ py3 -m overlap_agent.py
@@ -28,6 +39,7 @@ import argparse
 import csv
 import math
 import random
+import time
 from abc import ABC, abstractmethod
 from datetime import datetime
 from pathlib import Path
@@ -36,6 +48,7 @@ import pymunk
 
 from src.grana_model.collisionhandler import CollisionHandler
 from src.grana_model.psiistructure import PSIIStructure
+from src.grana_model.spatialindex import find_pairs_within, get_positions
 
 # from time import process_time, strftime
 
@@ -213,6 +226,18 @@ class OverlapAgent:
         area_strategy (AreaStrategy): defines how the object in object_list are
         divided into multiple lists, one for each zone
 
+        temperature (float): actions that increase the overlap by d are kept with
+        probability exp(-d / temperature), in overlap distance units. 0 undoes all of
+        them, the greedy agent
+
+        batch_size (int): objects that take an action at once, before one space step.
+        They are chosen at least batch_distance apart, so no two can touch, and each
+        is kept or undone by the change of its own overlap. 1 calls one object at a
+        time. time_limit counts batches.
+
+        batch_distance (float): minimum distance between the objects of a batch, in
+        nm. None for twice the largest hull extent of object_list, plus the moves
+
     Attributes:
         self.time_limit (int): as above
         self.time_left (int): starts equal to self.time_limit, is reduced by one for each action taken
@@ -230,6 +255,12 @@ class OverlapAgent:
         time_limit: int = 1000,
         area_strategy: AreaStrategy = None,
         notes: str = "",
+        lod_manager=None,
+        sleep_policy=None,
+        periodic_box=None,
+        temperature: float = 0.0,
+        batch_size: int = 1,
+        batch_distance: float = None,
     ):
         self.time_limit = time_limit
         self.time_left = time_limit
@@ -237,6 +268,17 @@ class OverlapAgent:
         self.overlap_distance = 0.0
         self.collision_handler = collision_handler
         self.notes = notes
+        self.lod_manager = lod_manager  # optional LODManager, updated before each action
+        self.sleep_policy = sleep_policy  # optional SleepPolicy, woken objects stay awake
+        self.periodic_box = periodic_box  # optional PeriodicBox, updated before each step
+        # metropolis acceptance of actions that increase the overlap, 0 for greedy
+        self.temperature = temperature
+        self.batch_size = batch_size
+        self.batch_distance = batch_distance
+        self.body_overlap = None  # overlap per body after the last update, in batches
+
+        if batch_size > 1:
+            self.collision_handler.track_bodies = True
 
         if area_strategy is not None:
             print(f"using {area_strategy}")
@@ -248,13 +290,30 @@ class OverlapAgent:
                 origin_point=(300, 300),
             )
 
-    def run(self, debug=False):
-        """runs the overlap agent through the zone list"""
+    def run(self, debug=False, export=True, max_seconds: float = None):
+        """runs the overlap agent through the zone list
+
+        Parameters:
+            debug (bool): print the overlap after each zone
+            export (bool): export the coordinates after the last zone
+            max_seconds (float): wall time budget, the remaining actions are skipped
+            once it is used up
+        """
         overlap_values = []
+        self.time_values = []  # seconds since start, one for each overlap value
+        start = time.perf_counter()
+
         for zone_num, zone_list in enumerate(self.area_strategy):
             for i in range(0, self.time_limit):
-                overlap = self._call_object(object=random.choice(zone_list))
+                if (
+                    max_seconds is not None
+                    and time.perf_counter() - start > max_seconds
+                ):
+                    break
+
+                overlap = self._take_action(zone_list)
                 overlap_values.append(overlap)
+                self.time_values.append(time.perf_counter() - start)
 
             mean_overlap = sum(overlap_values[-10:-1]) / 10
 
@@ -263,7 +322,7 @@ class OverlapAgent:
                     f"zone: {zone_num + 1}/5 finished, time_limit: {self.time_limit}, overlap: {round(mean_overlap, 2)}"
                 )
 
-            if zone_num == self.area_strategy.total_zones - 1:
+            if export and zone_num == self.area_strategy.total_zones - 1:
                 self.export_coordinates(zone_num, zone_list, mean_overlap)
 
         self.area_strategy.reset()
@@ -275,20 +334,166 @@ class OverlapAgent:
             print("not a PSIIStructure")
             return
 
+        if self.sleep_policy is not None:
+            self.sleep_policy.wake(object)
+
+        # frozen PSII are static geometry, they need to be kinematic to be moved.
+        # static pairs are never collided, so the overlap with other frozen PSII only
+        # counts while unfrozen, and the overlap is measured again around the action
+        was_frozen = object.unfreeze()
+
+        if self._update_lod() or was_frozen:
+            self.overlap_distance = self._update_space()
+
         object.action(random.randint(1, 6))
 
         new_overlap_distance = self._update_space()
 
-        if self.overlap_distance < new_overlap_distance:
+        if self.overlap_distance < new_overlap_distance and not self.accept_increase(
+            new_overlap_distance - self.overlap_distance
+        ):
             object.undo()
             new_overlap_distance = self._update_space()
 
+        if was_frozen:
+            object.freeze()
+            new_overlap_distance = self._update_space()
+
         self.overlap_distance = new_overlap_distance
         return self.overlap_distance
 
+    def accept_increase(self, increase: float) -> bool:
+        """metropolis criterion for an action that increased the overlap"""
+        if self.temperature <= 0:
+            return False
+
+        return random.random() < math.exp(-increase / self.temperature)
+
+    def take_actions(self, num_actions: int, object_list: list) -> float:
+        """calls random objects, or batches, of object_list num_actions times, without
+        zones, and returns the overlap. Used by ParallelTempering."""
+        for _ in range(num_actions):
+            self._take_action(object_list)
+
+        return self.overlap_distance
+
+    def _take_action(self, object_list: list) -> float:
+        if self.batch_size > 1:
+            return self._call_batch(self.select_batch(object_list))
+
+        return self._call_object(object=random.choice(object_list))
+
+    def get_batch_distance(self, object_list: list) -> float:
+        if self.batch_distance is None:
+            extent = max(
+                (
+                    max(math.hypot(x, y) for x, y in o.get_hull_vertices(o.shape_type))
+                    for o in object_list
+                ),
+                default=0.0,
+            )
+            # move() shifts an object by up to 1 nm
+            self.batch_distance = 2 * (extent + 1.0)
+
+        return self.batch_distance
+
+    def select_batch(self, object_list: list) -> list:
+        """up to batch_size random objects of object_list, none of them within
+        batch_distance of another, across the edges of a periodic box too"""
+        positions = get_positions(object_list)
+        distance = self.get_batch_distance(object_list)
+
+        if self.periodic_box is None:
+            pairs = find_pairs_within(positions, distance)
+        else:
+            pairs = self.periodic_box.find_pairs_within(positions, distance)
+
+        neighbours = [[] for _ in object_list]
+
+        for i, j in pairs.tolist():
+            neighbours[i].append(j)
+            neighbours[j].append(i)
+
+        order = list(range(len(object_list)))
+        random.shuffle(order)
+        blocked = [False] * len(object_list)
+        batch = []
+
+        for i in order:
+            if blocked[i]:
+                continue
+
+            batch.append(object_list[i])
+
+            if len(batch) == self.batch_size:
+                break
+
+            for j in neighbours[i]:
+                blocked[j] = True
+
+        return batch
+
+    def _call_batch(self, batch: list) -> float:
+        """_call_object for a batch of objects that can't touch each other, with one
+        space step for all of their actions. Each one is kept or undone by the overlap
+        of its own body."""
+        if self.sleep_policy is not None:
+            for object in batch:
+                self.sleep_policy.wake(object)
+
+        was_frozen = [object.unfreeze() for object in batch]
+
+        if self._update_lod() or self.body_overlap is None or any(was_frozen):
+            self.overlap_distance = self._update_space()
+
+        old_overlap = self.body_overlap
+
+        for object in batch:
+            object.action(random.randint(1, 6))
+
+        new_overlap_distance = self._update_space()
+        undone = 0
+
+        for object in batch:
+            increase = self.body_overlap.get(object.body, 0.0) - old_overlap.get(
+                object.body, 0.0
+            )
+
+            if increase > 0 and not self.accept_increase(increase):
+                object.undo()
+                undone += 1
+
+        if undone:
+            new_overlap_distance = self._update_space()
+
+        if any(was_frozen):
+            for object, frozen in zip(batch, was_frozen):
+                if frozen:
+                    object.freeze()
+
+            new_overlap_distance = self._update_space()
+
+        self.overlap_distance = new_overlap_distance
+        return self.overlap_distance
+
+    def _update_lod(self) -> bool:
+        """switch shapes before an action, never between the overlap measurements
+        before and after it, so both are on the same shapes. Returns True if any
+        structure changed shapes, and the overlap needs to be measured again"""
+        if self.lod_manager is None:
+            return False
+
+        return self.lod_manager.update() > 0
+
     def _update_space(self):
         self.collision_handler.reset_collision_count()
+
+        if self.periodic_box is not None:
+            self.periodic_box.update()
+
         self.space.step(0.1)
+        self.body_overlap = self.collision_handler.body_overlap
+
         return self.collision_handler.overlap_distance
 
     def initialize_space(self):
@@ -296,6 +501,7 @@ class OverlapAgent:
         self.overlap_distance = self.collision_handler.overlap_distance
 
     def get_current_overlap_distance(self):
+        self._update_lod()
         return self._update_space()
 
     def get_export_filename(self):
@@ -320,3 +526,149 @@ class OverlapAgent:
                         object.area,
                     )
                 )
+
+
+class OverlapPipeline:
+    """runs the OverlapAgent in stages of increasing shape detail.
+
+    Most of the overlap can be removed on cheap shapes, such as the simple hull or a
+    circle approximation. Each stage swaps the shapes of every structure to its
+    shape_type, on the same bodies, and runs an OverlapAgent with its own budget, so
+    only a short pass is needed on the expensive complex shapes at the end.
+
+    Parameters:
+        space (pymunk.Space): the space the structures live in
+        object_list (list of PSIIStructure): the structures to relax
+        collision_handler (CollisionHandler): measures the overlap distance
+        stages (list of dict): one dict per stage, with keys
+            "shape_type" (str): shape type used during the stage
+            "time_limit" (int): actions per zone, as in OverlapAgent
+            "max_seconds" (float, optional): wall time budget of the stage
+            "batch_size" (int, optional): objects per space step, as in OverlapAgent
+        area_strategy (AreaStrategy): zone strategy, shared by all stages
+        notes (str): added to the export and report filenames
+        lod_manager (LODManager): optional, passed to every stage. Its low detail
+            shape type follows the stage, so structures in contact still get the high
+            detail shapes.
+        sleep_policy (SleepPolicy): optional, passed to every stage
+        periodic_box (PeriodicBox): optional, passed to every stage
+        temperature (float): metropolis temperature of every stage, as in OverlapAgent
+        export_dir (str): directory the report is written to
+
+    Attributes:
+        report (list of tuple): (stage, shape_type, seconds, overlap) for every action,
+        seconds counted from the start of the pipeline
+    """
+
+    default_stages = [
+        {"shape_type": "simple", "time_limit": 1000},
+        {"shape_type": "complex", "time_limit": 100},
+    ]
+
+    def __init__(
+        self,
+        space: pymunk.Space,
+        object_list: list,
+        collision_handler: CollisionHandler,
+        stages: list = None,
+        area_strategy: AreaStrategy = None,
+        notes: str = "",
+        lod_manager=None,
+        sleep_policy=None,
+        periodic_box=None,
+        temperature: float = 0.0,
+        export_dir: str = "lhcii_export_coords",
+    ):
+        self.space = space
+        self.object_list = object_list
+        self.collision_handler = collision_handler
+        self.stages = self.default_stages if stages is None else stages
+        self.area_strategy = area_strategy
+        self.notes = notes
+        self.lod_manager = lod_manager
+        self.sleep_policy = sleep_policy
+        self.periodic_box = periodic_box
+        self.temperature = temperature
+        self.export_dir = export_dir
+        self.report = []
+        self.agent = None
+
+    def set_shapes(self, shape_type: str):
+        """swap the shapes of all structures to shape_type"""
+        if self.lod_manager is not None:
+            # the manager demotes to the stage shapes, not back to its own
+            self.lod_manager.low_detail = shape_type
+            self.lod_manager.refresh()
+
+        for o in self.object_list:
+            o.set_shapes(shape_type)
+
+    def run(self, debug=False, export=True):
+        """runs all stages in order, and returns the overlap after the last one"""
+        start = time.perf_counter()
+        overlap = None
+        low_detail = None if self.lod_manager is None else self.lod_manager.low_detail
+
+        for stage_num, stage in enumerate(self.stages):
+            shape_type = stage["shape_type"]
+            self.set_shapes(shape_type)
+
+            self.agent = OverlapAgent(
+                self.space,
+                self.object_list,
+                self.collision_handler,
+                time_limit=stage["time_limit"],
+                area_strategy=self.area_strategy,
+                batch_size=stage.get("batch_size", 1),
+                notes=f"{self.notes}_stage_{stage_num}_{shape_type}",
+                lod_manager=self.lod_manager,
+                sleep_policy=self.sleep_policy,
+                periodic_box=self.periodic_box,
+                temperature=self.temperature,
+            )
+            self.agent.initialize_space()
+
+            stage_start = time.perf_counter() - start
+            last_stage = stage_num == len(self.stages) - 1
+
+            overlap_values = self.agent.run(
+                debug=debug,
+                export=export and last_stage,
+                max_seconds=stage.get("max_seconds"),
+            )
+
+            self.report.extend(
+                (stage_num, shape_type, stage_start + t, v)
+                for t, v in zip(self.agent.time_values, overlap_values)
+            )
+
+            overlap = self.agent.get_current_overlap_distance()
+
+            if debug:
+                print(
+                    f"stage {stage_num + 1}/{len(self.stages)} ({shape_type}) finished "
+                    f"after {round(time.perf_counter() - start, 2)} s, overlap: {round(overlap, 2)}"
+                )
+
+        if low_detail is not None:
+            self.lod_manager.low_detail = low_detail
+            self.lod_manager.refresh()
+
+        if export:
+            self.export_report(self.get_report_filename())
+
+        return overlap
+
+    def get_report_filename(self):
+        now = datetime.now()
+        dt_string = now.strftime("%d%m%Y_%H%M%S")
+
+        return f"{self.export_dir}/{dt_string}_pipeline_report{self.notes}.csv"
+
+    def export_report(self, filename):
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+
+        with open(filename, "w", newline="") as f:
+            write = csv.writer(f)
+            write.writerow(["stage", "shape_type", "seconds", "overlap"])
+            write.writerows(self.report)
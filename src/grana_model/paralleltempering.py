@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+"""parallel tempering
+
+This module implements ParallelTempering, a replica exchange mode for the OverlapAgent,
+for dense patches where the greedy agent jams.
+
+Several replicas of the same configuration, spawned from the same seed, each run an
+OverlapAgent at its own temperature, in its own process. An agent at temperature T
+keeps an action that increases the overlap by d with probability exp(-d / T), so the
+hot replicas can leave jammed states that the cold ones can't, and T = 0 is the
+greedy agent. Every exchange_every actions, all replicas write their positions and
+overlap to a shared memory array, and neighbouring temperatures swap states by the
+Metropolis criterion
+
+    p = min(1, exp((1 / T_i - 1 / T_j) * (E_i - E_j)))
+
+with the overlap distance as E. Pairs alternate between even and odd rounds. A swap
+moves the lower overlap toward the colder replica, and the swapped replicas load their
+new state from the shared array. At the end, the coldest replica's configuration is
+exported.
+
+Example:
+    $ tempering = ParallelTempering(build_replica, temperatures=[0.0, 1.0, 2.0, 4.0])
+    $ tempering.run(debug=True)
+
+    build_replica returns a SimulationEnvironment, and is called in every worker
+    process, so it has to be a top level function, or a functools.partial of one.
+
+"""
+import csv
+import math
+import multiprocessing
+import random
+import time
+import traceback
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+
+import numpy as np
+
+from src.grana_model.overlapagent import OverlapAgent
+
+
+class TemperingReplica:
+    """one SimulationEnvironment and an OverlapAgent at a fixed temperature"""
+
+    def __init__(self, env, temperature: float):
+        self.env = env
+        self.temperature = temperature
+        self.agent = OverlapAgent(
+            env.space,
+            env.obstacle_list,
+            env.overlap_handler,
+            periodic_box=env.periodic_box,
+            temperature=temperature,
+        )
+        self.energy = self.measure()
+
+    @property
+    def num_structures(self):
+        return len(self.env.obstacle_list)
+
+    def measure(self) -> float:
+        self.agent.overlap_distance = self.agent.get_current_overlap_distance()
+        return self.agent.overlap_distance
+
+    def run(self, num_actions: int) -> float:
+        self.energy = self.agent.take_actions(num_actions, self.env.obstacle_list)
+        return self.energy
+
+    def get_state(self) -> np.ndarray:
+        """(n, 3) x, y and angle of all structures"""
+        return np.array(
+            [(*o.body.position, o.body.angle) for o in self.env.obstacle_list],
+            dtype=float,
+        ).reshape(-1, 3)
+
+    def set_state(self, state: np.ndarray) -> float:
+        """move all structures to a state from get_state(), and returns the overlap"""
+        for o, (x, y, angle) in zip(self.env.obstacle_list, state.tolist()):
+            o.body.position = (x, y)
+            o.body.angle = angle
+            o.body.velocity = (0, 0)
+            o.body.angular_velocity = 0
+            self.env.space.reindex_shapes_for_body(o.body)
+
+        self.energy = self.measure()
+        return self.energy
+
+    def export(self, filename: str = None):
+        self.env.export_coordinates(
+            self.env.obstacle_list,
+            filename=self.env.get_export_filename() if filename is None else filename,
+        )
+
+
+class ReplicaWorker:
+    """builds a TemperingReplica, and handles the commands of ParallelTempering on
+    it, with its state and energy in row index of the shared arrays"""
+
+    def __init__(self, build_replica, index: int, temperature: float, seed: int):
+        # the same spawn in every replica
+        random.seed(seed)
+        np.random.seed(seed)
+        self.replica = TemperingReplica(build_replica(), temperature)
+        self.index = index
+
+        # but different actions. The agent draws from the random module, so the state
+        # is swapped in and out, in case the workers share this process
+        random.seed(seed + 1 + index)
+        self.random_state = random.getstate()
+
+    def attach(self, states: np.ndarray, energies: np.ndarray):
+        self.states = states
+        self.energies = energies
+        self.energies[self.index] = self.replica.energy
+        self.states[self.index] = self.replica.get_state()
+
+    def handle(self, command: str, arg=None) -> float:
+        if command == "run":
+            random.setstate(self.random_state)
+            self.replica.run(arg)
+            self.random_state = random.getstate()
+            self.states[self.index] = self.replica.get_state()
+        elif command == "load":
+            self.replica.set_state(self.states[self.index])
+        elif command == "export":
+            self.replica.export(arg)
+
+        self.energies[self.index] = self.replica.energy
+
+        return self.replica.energy
+
+
+def get_shared_views(buffer, num_replicas: int, num_structures: int):
+    """the (replicas, n, 3) states and (replicas,) energies in a shared buffer"""
+    size = num_replicas * num_structures * 3
+    states = np.ndarray((num_replicas, num_structures, 3), dtype=float, buffer=buffer)
+    energies = np.ndarray((num_replicas,), dtype=float, buffer=buffer, offset=size * 8)
+
+    return states, energies
+
+
+def _serve(build_replica, index: int, temperature: float, seed: int, conn):
+    """worker process, the replica lives here for the whole run"""
+    try:
+        worker = ReplicaWorker(build_replica, index, temperature, seed)
+    except Exception:
+        # the parent raises it, with the traceback from here
+        conn.send(("error", traceback.format_exc()))
+        conn.close()
+        return
+
+    conn.send(("built", worker.replica.num_structures))
+
+    name, num_replicas = conn.recv()
+    memory = SharedMemory(name=name)
+    worker.attach(*get_shared_views(memory.buf, num_replicas, worker.replica.num_structures))
+    conn.send(worker.replica.energy)
+
+    while True:
+        command, arg = conn.recv()
+
+        if command == "stop":
+            break
+
+        conn.send(worker.handle(command, arg))
+
+    # the views have to go before the memory can be closed
+    worker.states = worker.energies = None
+    memory.close()
+    conn.close()
+
+
+class ParallelTempering:
+    """replica exchange between OverlapAgents at different temperatures.
+
+    Parameters:
+        build_replica (callable): takes no arguments and returns a
+            SimulationEnvironment, the same configuration for the same random seed
+        temperatures (list of float): one replica each, in overlap distance units, 0
+            for a greedy agent
+        exchange_every (int): agent actions of each replica between exchanges
+        rounds (int): exchange rounds
+        seed (int): seeds the spawn, shared by all replicas
+        processes (bool): run each replica in its own process. False runs them one
+            after another in this process, with the same results for the same seed.
+
+    Attributes:
+        start_energies (np.ndarray): overlap of each replica before the first round
+        history (list of dict): round, seconds and the energy of each temperature
+        attempted, accepted (np.ndarray): swaps between temperature i and i + 1
+    """
+
+    def __init__(
+        self,
+        build_replica,
+        temperatures: list,
+        exchange_every: int = 200,
+        rounds: int = 50,
+        seed: int = 0,
+        processes: bool = True,
+    ):
+        if len(temperatures) < 2:
+            raise ValueError("parallel tempering needs at least two temperatures")
+
+        self.build_replica = build_replica
+        self.temperatures = sorted(temperatures)
+        self.exchange_every = exchange_every
+        self.rounds = rounds
+        self.seed = seed
+        self.processes = processes
+        self.memory = None
+        self.workers = []
+        self.connections = []
+
+    @property
+    def num_replicas(self):
+        return len(self.temperatures)
+
+    @property
+    def acceptance(self) -> np.ndarray:
+        """swap acceptance rate between temperature i and i + 1"""
+        return self.accepted / np.maximum(self.attempted, 1)
+
+    def start(self):
+        """builds the replicas, in worker processes or locally"""
+        self.rng = random.Random(self.seed)
+        self.history = []
+        self.attempted = np.zeros(self.num_replicas - 1, dtype=int)
+        self.accepted = np.zeros(self.num_replicas - 1, dtype=int)
+        self.start_time = time.perf_counter()
+
+        if not self.processes:
+            self.workers = []
+
+            for i, t in enumerate(self.temperatures):
+                try:
+                    worker = ReplicaWorker(self.build_replica, i, t, self.seed)
+                except Exception as e:
+                    raise RuntimeError(self.build_error(i)) from e
+
+                self.workers.append(worker)
+
+            num_structures = self.workers[0].replica.num_structures
+            self.states = np.zeros((self.num_replicas, num_structures, 3))
+            self.energies = np.zeros(self.num_replicas)
+
+            for worker in self.workers:
+                worker.attach(self.states, self.energies)
+
+            self.start_energies = self.energies.copy()
+            return
+
+        # workers attach to the shared memory by name, so they need to share this
+        # process's resource tracker, their own would unlink it when they exit
+        resource_tracker.ensure_running()
+
+        for i, t in enumerate(self.temperatures):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_serve, args=(self.build_replica, i, t, self.seed, child)
+            )
+            process.start()
+            self.workers.append(process)
+            self.connections.append(parent)
+
+        num_structures = [
+            self.receive_build(i, conn) for i, conn in enumerate(self.connections)
+        ][0]
+        self.memory = SharedMemory(
+            create=True, size=(self.num_replicas * (num_structures * 3 + 1)) * 8
+        )
+        self.states, self.energies = get_shared_views(
+            self.memory.buf, self.num_replicas, num_structures
+        )
+
+        for conn in self.connections:
+            conn.send((self.memory.name, self.num_replicas))
+
+        for conn in self.connections:
+            conn.recv()
+
+        self.start_energies = self.energies.copy()
+
+    def build_error(self, index: int) -> str:
+        return (
+            f"replica {index} (temperature {self.temperatures[index]}) failed to build"
+        )
+
+    def receive_build(self, index: int, conn) -> int:
+        """waits for a worker process to build its replica, and returns its number of
+        structures. If any replica failed, all workers are stopped and the error is
+        raised here."""
+        try:
+            status, result = conn.recv()
+        except EOFError:
+            status, result = "error", "the worker process exited"
+
+        if status == "error":
+            for process in self.workers:
+                process.terminate()
+                process.join()
+
+            self.workers = []
+            self.connections = []
+
+            raise RuntimeError(f"{self.build_error(index)}:\n{result}")
+
+        return result
+
+    def command(self, indices: list, command: str, arg=None):
+        """sends a command to the replicas, all at once when they are processes, and
+        waits for them"""
+        if not self.processes:
+            for i in indices:
+                self.workers[i].handle(command, arg)
+
+            return
+
+        for i in indices:
+            self.connections[i].send((command, arg))
+
+        for i in indices:
+            self.connections[i].recv()
+
+    @staticmethod
+    def swap_probability(t_i: float, t_j: float, e_i: float, e_j: float) -> float:
+        """metropolis probability of swapping the states of temperatures t_i and t_j,
+        with energies e_i and e_j"""
+        if t_i == t_j or e_i == e_j:
+            return 1.0
+
+        beta_i = 1 / t_i if t_i > 0 else math.inf
+        beta_j = 1 / t_j if t_j > 0 else math.inf
+        delta = (beta_i - beta_j) * (e_i - e_j)
+
+        return math.exp(min(delta, 0.0))
+
+    def exchange(self, round_num: int) -> list:
+        """attempts swaps between neighbouring temperatures, even pairs in even rounds
+        and odd pairs in odd rounds, and returns the replicas whose state changed"""
+        swapped = []
+
+        for i in range(round_num % 2, self.num_replicas - 1, 2):
+            j = i + 1
+            self.attempted[i] += 1
+            p = self.swap_probability(
+                self.temperatures[i],
+                self.temperatures[j],
+                self.energies[i],
+                self.energies[j],
+            )
+
+            if self.rng.random() < p:
+                self.accepted[i] += 1
+                self.states[[i, j]] = self.states[[j, i]]
+                self.energies[[i, j]] = self.energies[[j, i]]
+                swapped.extend((i, j))
+
+        return swapped
+
+    def run(self, debug: bool = False, export: bool = True) -> list:
+        """runs all rounds, exports the coldest replica, and returns the history"""
+        self.start()
+        everyone = list(range(self.num_replicas))
+
+        try:
+            for round_num in range(self.rounds):
+                self.command(everyone, "run", self.exchange_every)
+                swapped = self.exchange(round_num)
+
+                if swapped:
+                    self.command(swapped, "load")
+
+                self.history.append(
+                    {
+                        "round": round_num,
+                        "seconds": time.perf_counter() - self.start_time,
+                        **{
+                            f"overlap_t_{t}": e
+                            for t, e in zip(self.temperatures, self.energies.tolist())
+                        },
+                    }
+                )
+
+                if debug:
+                    print(
+                        f"round {round_num}, overlap: {[round(e, 2) for e in self.energies.tolist()]}, "
+                        f"swaps: {[round(a, 2) for a in self.acceptance.tolist()]}"
+                    )
+
+            if export:
+                self.command([0], "export")
+
+        finally:
+            self.stop()
+
+        return self.history
+
+    @property
+    def coldest_overlap(self) -> float:
+        return self.history[-1][f"overlap_t_{self.temperatures[0]}"]
+
+    def stop(self):
+        """stops the worker processes and frees the shared memory. Local replicas are
+        kept until the next start()."""
+        if not self.processes:
+            return
+
+        for conn in self.connections:
+            conn.send(("stop", None))
+
+        for process in self.workers:
+            process.join()
+
+        self.states = self.energies = None
+
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+        self.workers = []
+        self.connections = []
+
+    def export_history(self, filename: str = "tempering_history.csv"):
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+
+        with open(filename, "w", newline="") as f:
+            write = csv.DictWriter(f, fieldnames=list(self.history[0]))
+            write.writeheader()
+            write.writerows(self.history)
+
+        print(filename + " has been exported.")
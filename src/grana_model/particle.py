@@ -1,6 +1,4 @@
 import pymunk
-from pyglet import image
-from pyglet import sprite
 from math import degrees
 
 
@@ -15,6 +13,9 @@ class Particle(pymunk.Body):
         space.add(self.body, c1)
         self.diffusion_distance = 10
 
+        # pyglet is imported here, not on module load, so headless runs don't need it
+        from pyglet import image
+
         self.img = image.load(
             "src/grana_model/res/sprites/lhcii_monomer.png"
         )  # TODO: get a better sprite
@@ -43,6 +44,8 @@ class Particle(pymunk.Body):
 
     def _assign_sprite(self, batch):
         """loads the img and assigns it as a sprite to this obejct"""
+        from pyglet import sprite
+
         img = self.img
         color = (255, 0, 0)
         img.anchor_x = img.width // 2
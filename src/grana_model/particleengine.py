@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""mobile particle engine
+
+This module implements a random walk engine for small mobile particles, ie
+plastoquinone, diffusing through the PSII/LHCII obstacle field. The particles don't
+push the structures, so instead of a pymunk body each they are kept as an (n, 2) array
+of positions, and all of them are moved at once.
+
+The obstacle geometry is rasterized into an OccupancyMask, a boolean grid over the
+section with the structure shapes dilated by the particle radius. Each step proposes a
+gaussian move for every particle, and rejects the proposals that land on an occupied
+cell, or outside the section unless it is periodic. The mask is rebuilt from the space
+every refresh_every steps, as the structures move.
+
+The mean squared displacement is tracked from unwrapped positions, so particles that
+cross a periodic edge keep their true displacement.
+
+Example:
+    $ engine = ParticleEngine(num_particles=100000, section=(200, 200, 100, 100))
+    $ engine.refresh(space)
+    $ engine.run(steps=1000)
+    $ engine.get_diffusion_coefficient()
+
+"""
+import csv
+from pathlib import Path
+
+import numpy as np
+import pymunk
+
+
+class OccupancyMask:
+    """boolean grid of the cells covered by obstacles, over a section.
+
+    Parameters:
+        section (tuple): x, y, width, height of the area to rasterize
+        resolution (float): cell size, in nm
+
+    Attributes:
+        occupied (np.ndarray): (ny, nx) bool, True where a cell center lies within an
+            obstacle
+        vertex_cache (dict): local polygon vertices of each shape, reused between
+            rasterizations
+    """
+
+    def __init__(self, section: tuple = (200, 200, 100, 100), resolution: float = 0.25):
+        self.section = section
+        self.resolution = resolution
+
+        x, y, width, height = section
+        self.shape = (int(np.ceil(height / resolution)), int(np.ceil(width / resolution)))
+        self.xs = x + (np.arange(self.shape[1]) + 0.5) * resolution
+        self.ys = y + (np.arange(self.shape[0]) + 0.5) * resolution
+        self.occupied = np.zeros(self.shape, dtype=bool)
+        self.vertex_cache = {}  # shape -> (scale, local vertices)
+
+    @property
+    def free_fraction(self):
+        return 1.0 - self.occupied.mean()
+
+    def clear(self):
+        self.occupied[:] = False
+
+    def _get_cell_ranges(self, lower: np.ndarray, upper: np.ndarray):
+        """index ranges of the cells with centers inside each bounding box, given as
+        (n, 2) lower left and upper right corners"""
+        origin = np.array(self.section[:2], dtype=float)
+        start = np.ceil((lower - origin) / self.resolution - 0.5).astype(int)
+        stop = np.floor((upper - origin) / self.resolution - 0.5).astype(int) + 1
+        limit = np.array([self.shape[1], self.shape[0]])
+
+        return np.clip(start, 0, limit), np.clip(stop, 0, limit)
+
+    def _get_candidate_cells(self, lower: np.ndarray, upper: np.ndarray):
+        """every (item, cell) pair with the cell center inside the item's bounding box,
+        as item index, cell x index and cell y index arrays"""
+        start, stop = self._get_cell_ranges(lower, upper)
+        size = np.maximum(stop - start, 0)
+        counts = size[:, 0] * size[:, 1]
+        item = np.repeat(np.arange(len(counts)), counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        width = np.maximum(size[item, 0], 1)
+
+        return item, start[item, 0] + k % width, start[item, 1] + k // width
+
+    def add_polygons(self, vertices: np.ndarray, radii: np.ndarray, dilation: float = 0.0):
+        """mark the cells covered by convex polygons, given as (n, v, 2) world vertices
+        padded by repeating the last vertex, each grown by its radius plus dilation.
+        Corners are dilated square, which slightly overestimates the covered area."""
+        if len(vertices) == 0:
+            return
+
+        reach = radii + dilation
+        item, cx, cy = self._get_candidate_cells(
+            vertices.min(axis=1) - reach[:, None], vertices.max(axis=1) + reach[:, None]
+        )
+
+        # outward edge normals, whatever the winding of the vertices
+        edges = np.roll(vertices, -1, axis=1) - vertices
+        normals = np.stack((edges[..., 1], -edges[..., 0]), axis=-1)
+        length = np.linalg.norm(normals, axis=-1)
+        degenerate = length < 1e-12  # edges between padding vertices
+        normals /= np.where(degenerate, 1.0, length)[..., None]
+        signed_area = np.sum(
+            vertices[..., 0] * np.roll(vertices[..., 1], -1, axis=1)
+            - vertices[..., 1] * np.roll(vertices[..., 0], -1, axis=1),
+            axis=1,
+        )
+        normals[signed_area < 0] *= -1
+
+        points = np.column_stack((self.xs[cx], self.ys[cy]))
+        distance = np.einsum(
+            "kvd,kvd->kv", points[:, None, :] - vertices[item], normals[item]
+        )
+        distance[degenerate[item]] = -np.inf
+        inside = np.all(distance <= reach[item, None], axis=1)
+
+        self.occupied[cy[inside], cx[inside]] = True
+
+    def add_circles(self, centers: np.ndarray, radii: np.ndarray, dilation: float = 0.0):
+        """mark the cells covered by circles, each grown by dilation"""
+        if len(centers) == 0:
+            return
+
+        reach = radii + dilation
+        item, cx, cy = self._get_candidate_cells(
+            centers - reach[:, None], centers + reach[:, None]
+        )
+        dx = self.xs[cx] - centers[item, 0]
+        dy = self.ys[cy] - centers[item, 1]
+        inside = dx**2 + dy**2 <= reach[item] ** 2
+
+        self.occupied[cy[inside], cx[inside]] = True
+
+    def rasterize(
+        self,
+        space: pymunk.Space,
+        dilation: float = 0.0,
+        collision_types: tuple = (1, 4),
+        batch_size: int = 2000,
+    ):
+        """rebuild the mask from the structure shapes in the space. collision type 4
+        includes the ghosts of a PeriodicBox. Shapes are rasterized batch_size at a
+        time, which bounds the memory of the candidate cells."""
+        self.clear()
+        shapes = [
+            s
+            for s in space.shapes
+            if s.collision_type in collision_types and not s.sensor
+        ]
+        circles = [s for s in shapes if isinstance(s, pymunk.Circle)]
+        polygons = [s for s in shapes if isinstance(s, pymunk.Poly)]
+
+        if circles:
+            self.add_circles(
+                np.array([tuple(s.body.local_to_world(s.offset)) for s in circles]),
+                np.array([s.radius for s in circles]),
+                dilation,
+            )
+
+        # local vertices only change when a PSIIStructure is rescaled
+        self.vertex_cache = {
+            s: self.vertex_cache[s]
+            if s in self.vertex_cache
+            and self.vertex_cache[s][0] == getattr(s, "scale", 1.0)
+            else (
+                getattr(s, "scale", 1.0),
+                np.array([tuple(v) for v in s.get_vertices()]),
+            )
+            for s in polygons
+        }
+
+        for i in range(0, len(polygons), batch_size):
+            batch = polygons[i : i + batch_size]
+            local = [self.vertex_cache[s][1] for s in batch]
+            vmax = max(len(v) for v in local)
+            padded = np.array(
+                [np.vstack((v, np.repeat(v[-1:], vmax - len(v), axis=0))) for v in local]
+            )
+
+            # body transform of each shape, applied to all vertices at once
+            angles = np.array([s.body.angle for s in batch])
+            positions = np.array([tuple(s.body.position) for s in batch])
+            cos, sin = np.cos(angles)[:, None], np.sin(angles)[:, None]
+            world = np.stack(
+                (
+                    positions[:, None, 0] + cos * padded[..., 0] - sin * padded[..., 1],
+                    positions[:, None, 1] + sin * padded[..., 0] + cos * padded[..., 1],
+                ),
+                axis=-1,
+            )
+
+            self.add_polygons(world, np.array([s.radius for s in batch]), dilation)
+
+    def is_occupied(self, points: np.ndarray) -> np.ndarray:
+        """True for each point on an occupied cell. points outside the section are
+        looked up in the nearest edge cell"""
+        x, y, _, _ = self.section
+        ix = np.clip(
+            ((points[:, 0] - x) / self.resolution).astype(int), 0, self.shape[1] - 1
+        )
+        iy = np.clip(
+            ((points[:, 1] - y) / self.resolution).astype(int), 0, self.shape[0] - 1
+        )
+
+        return self.occupied[iy, ix]
+
+    def sample_free(self, count: int, rng: np.random.Generator) -> np.ndarray:
+        """uniform random points on free cells"""
+        free = np.flatnonzero(~self.occupied.ravel())
+
+        if len(free) == 0:
+            raise ValueError("the occupancy mask has no free cells")
+
+        cells = rng.choice(free, size=count)
+        iy, ix = np.unravel_index(cells, self.shape)
+        offsets = (rng.random((count, 2)) - 0.5) * self.resolution
+
+        return np.column_stack((self.xs[ix], self.ys[iy])) + offsets
+
+
+class ParticleEngine:
+    """rejection based Brownian motion of point particles among obstacles.
+
+    Parameters:
+        num_particles (int): number of particles
+        section (tuple): x, y, width, height of the area the particles diffuse in
+        step_nm (float): root mean squared displacement per step, in nm
+        particle_radius (float): obstacles are dilated by this, in nm
+        resolution (float): occupancy mask cell size, in nm
+        periodic (bool): particles leaving the section come back in on the opposite
+            side, otherwise moves out of the section are rejected
+        refresh_every (int): steps between rebuilding the mask in update()
+        seed (int): random seed, None for a random run
+        msd_correlator (MultiTauMSD): optional, fed the unwrapped positions every step
+            for MSD(t) at all lags, not only from the starting positions
+
+    Attributes:
+        positions (np.ndarray): (n, 2) positions inside the section
+        unwrapped (np.ndarray): (n, 2) positions without periodic wrapping, for the MSD
+        msd_history (list of tuple): (step, mean squared displacement, acceptance rate)
+    """
+
+    def __init__(
+        self,
+        num_particles: int,
+        section: tuple = (200, 200, 100, 100),
+        step_nm: float = 0.5,
+        particle_radius: float = 0.5,
+        resolution: float = 0.25,
+        periodic: bool = True,
+        refresh_every: int = 10,
+        seed: int = None,
+        msd_correlator=None,
+    ):
+        self.num_particles = num_particles
+        self.section = section
+        self.step_nm = step_nm
+        self.particle_radius = particle_radius
+        self.periodic = periodic
+        self.refresh_every = refresh_every
+        self.rng = np.random.default_rng(seed)
+        self.msd_correlator = msd_correlator
+        self.mask = OccupancyMask(section, resolution)
+        self.steps = 0
+        self.positions = None
+        self.msd_history = []
+
+    def refresh(self, space: pymunk.Space):
+        """rasterize the obstacles in the space, and place the particles on free cells
+        if they haven't been placed yet"""
+        self.mask.rasterize(space, dilation=self.particle_radius)
+
+        if self.positions is None:
+            self.reset()
+
+    def reset(self):
+        """place all particles at random free points, and restart the MSD"""
+        self.positions = self.mask.sample_free(self.num_particles, self.rng)
+        self.unwrapped = self.positions.copy()
+        self.origins = self.positions.copy()
+        self.steps = 0
+        self.msd_history = []
+
+        if self.msd_correlator is not None:
+            self.msd_correlator.start(["particle"] * self.num_particles)
+
+    def wrap(self, points: np.ndarray) -> np.ndarray:
+        x, y, width, height = self.section
+        return np.column_stack(
+            (x + (points[:, 0] - x) % width, y + (points[:, 1] - y) % height)
+        )
+
+    def in_section(self, points: np.ndarray) -> np.ndarray:
+        x, y, width, height = self.section
+        return (
+            (points[:, 0] >= x)
+            & (points[:, 0] < x + width)
+            & (points[:, 1] >= y)
+            & (points[:, 1] < y + height)
+        )
+
+    def step(self) -> float:
+        """moves all particles one Brownian step, rejecting moves into obstacles.
+        returns the fraction of moves accepted"""
+        if self.positions is None:
+            self.reset()
+
+        delta = self.rng.normal(
+            scale=self.step_nm / np.sqrt(2), size=self.positions.shape
+        )
+        proposed = self.positions + delta
+
+        if self.periodic:
+            proposed = self.wrap(proposed)
+            accepted = ~self.mask.is_occupied(proposed)
+        else:
+            accepted = self.in_section(proposed) & ~self.mask.is_occupied(proposed)
+
+        self.positions[accepted] = proposed[accepted]
+        self.unwrapped[accepted] += delta[accepted]
+        self.steps += 1
+
+        if self.msd_correlator is not None:
+            self.msd_correlator.update(self.unwrapped)
+
+        acceptance = float(accepted.mean())
+        self.msd_history.append((self.steps, self.get_msd(), acceptance))
+
+        return acceptance
+
+    def update(self, space: pymunk.Space) -> float:
+        """one simulation frame: rebuild the mask every refresh_every steps, then step"""
+        if self.positions is None or self.steps % self.refresh_every == 0:
+            self.refresh(space)
+
+        return self.step()
+
+    def run(self, steps: int) -> list:
+        """step the particles through a fixed obstacle field, returns the MSD history"""
+        for _ in range(steps):
+            self.step()
+
+        return self.msd_history
+
+    def get_msd(self) -> float:
+        """mean squared displacement since reset(), in nm^2"""
+        return float(np.mean(np.sum((self.unwrapped - self.origins) ** 2, axis=1)))
+
+    def get_diffusion_coefficient(self, skip: int = 0) -> float:
+        """2D diffusion coefficient, in nm^2 per step, from the slope of the MSD,
+        MSD = 4 D t, ignoring the first skip steps"""
+        history = np.array(self.msd_history[skip:])
+
+        if len(history) < 2:
+            return 0.0
+
+        slope = np.polyfit(history[:, 0], history[:, 1], 1)[0]
+
+        return float(slope / 4)
+
+    def export_msd(self, filename: str = "particle_msd.csv"):
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+
+        with open(filename, "w", newline="") as f:
+            write = csv.writer(f)
+            write.writerow(["step", "msd", "acceptance"])
+            write.writerows(self.msd_history)
+
+        print(filename + " has been exported.")
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""periodic boundary conditions
+
+This module implements a periodic box over the ensemble patch. The structures live
+only inside the patch: a structure that leaves it through one edge comes back in
+through the opposite edge, so the density is exact by construction, and no surrounding
+area, boundary rectangles or ensemble sensor need to be simulated.
+
+Interactions across the edges are handled with ghosts. Every structure within margin
+of an edge gets a kinematic copy of its shapes, shifted by the box size, on the
+opposite side (and at the opposite corner, near a corner). The ghosts follow their
+structure every step, and push the structures near the opposite edge like the real
+structure would. They have collision_type 4, and share a filter group so they never
+collide with each other.
+
+A contact between a structure and a ghost is seen from both sides of the edge, once by
+each structure against the other's ghost, so the (1, 4) handler logs half of its
+overlap distance to the CollisionHandler. When the CollisionHandler tracks bodies, the
+structure and the ghost's owner are each credited with that half, so both end up with
+the whole overlap, as for a contact inside the box.
+
+Example:
+    $ periodic_box = PeriodicBox(space, section=(200, 200, 100, 100),
+        collision_handler=overlap_handler)
+    $ env = SimulationEnvironment(..., periodic_box=periodic_box)
+
+"""
+import numpy as np
+import pymunk
+
+from src.grana_model.spatialindex import find_pairs_within, get_positions
+
+GHOST_COLLISION_TYPE = 4
+GHOST_GROUP = 4  # ghosts never collide with each other
+
+
+def get_local_extent(body: pymunk.Body) -> float:
+    """distance from the body center to the furthest point of its shapes"""
+    extent = 0.0
+
+    for shape in body.shapes:
+        if isinstance(shape, pymunk.Circle):
+            extent = max(extent, shape.offset.length + shape.radius)
+        else:
+            extent = max(
+                extent, max(v.length for v in shape.get_vertices()) + shape.radius
+            )
+
+    return extent
+
+
+class PeriodicBox:
+    """wraps structures into a rectangular patch and keeps their ghosts.
+
+    Parameters:
+        space (pymunk.Space): the space the structures live in
+        section (tuple): x, y, width, height of the patch
+        margin (float): distance from an edge, in nm, within which a structure gets a
+            ghost. None uses twice the largest structure extent, so every ghost that
+            can touch a structure exists.
+        collision_handler (CollisionHandler): receives the overlap of structure-ghost
+            contacts, None to not measure them
+
+    Attributes:
+        offsets (np.ndarray): (n, 2) total shift applied to each structure by wrapping,
+            see get_unwrapped_positions()
+        ghosts (dict): (structure index, shift) -> (ghost body, ghost shapes,
+            signature), kept for reuse after the ghost has left the space
+    """
+
+    def __init__(
+        self,
+        space: pymunk.Space,
+        section: tuple = (200, 200, 100, 100),
+        margin: float = None,
+        collision_handler=None,
+    ):
+        self.space = space
+        self.section = section
+        self.margin = margin
+        self.collision_handler = collision_handler
+        self.object_list = []
+        self.offsets = np.zeros((0, 2))
+        self.ghosts = {}
+        self.active_ghosts = set()
+        self.ghost_owners = {}  # ghost body -> body of the structure it copies
+        self.ghost_filter = pymunk.ShapeFilter(group=GHOST_GROUP)
+
+        h = self.space.add_collision_handler(1, GHOST_COLLISION_TYPE)
+        h.pre_solve = self._ghost_pre_solve
+
+    def _ghost_pre_solve(self, arbiter, space, data):
+        if self.collision_handler is not None:
+            distance = arbiter.contact_point_set.points[0].distance
+            self.collision_handler.log_collision(0.5 * distance)
+
+            if getattr(self.collision_handler, "track_bodies", False) and distance < 0:
+                for shape in arbiter.shapes:
+                    body = self.ghost_owners.get(shape.body, shape.body)
+                    self.collision_handler.log_body_overlap(body, -0.5 * distance)
+
+        return True
+
+    def start(self, object_list: list):
+        """wrap the structures in object_list into the box, and create their ghosts"""
+        for key in self.active_ghosts:
+            body, shapes, _ = self.ghosts[key]
+            self.space.remove(body, *shapes)
+
+        self.object_list = object_list
+        self.offsets = np.zeros((len(object_list), 2))
+        self.ghosts = {}
+        self.active_ghosts = set()
+        self.ghost_owners = {}
+
+        if self.margin is None:
+            self.margin = 2 * max(
+                (get_local_extent(o.body) for o in object_list), default=0.0
+            )
+
+        self.update()
+
+    @property
+    def area(self):
+        _, _, width, height = self.section
+        return width * height
+
+    def wrap(self) -> np.ndarray:
+        """move structures that left the box back in through the opposite edge, and
+        return the positions"""
+        x, y, width, height = self.section
+        positions = get_positions(self.object_list)
+        wrapped = np.column_stack(
+            (x + (positions[:, 0] - x) % width, y + (positions[:, 1] - y) % height)
+        )
+
+        if len(self.offsets) != len(positions):
+            # structures were added, ie by a Densifier
+            self.offsets = np.vstack(
+                (self.offsets, np.zeros((len(positions) - len(self.offsets), 2)))
+            )
+
+        for i in np.flatnonzero(np.any(wrapped != positions, axis=1)):
+            self.object_list[i].body.position = tuple(wrapped[i])
+
+        self.offsets -= wrapped - positions
+
+        return wrapped
+
+    def get_unwrapped_positions(self) -> np.ndarray:
+        """positions as if the structures had never been wrapped, for displacement
+        statistics"""
+        return get_positions(self.object_list) + self.offsets
+
+    def find_pairs_within(self, positions: np.ndarray, distance: float) -> np.ndarray:
+        """find_pairs_within by minimum image distance, for positions inside the box.
+        Positions within distance of an edge are searched again as their images on the
+        other side."""
+        x, y, width, height = self.section
+        n = len(positions)
+        images, owners = [positions], [np.arange(n)]
+
+        for sx in (-width, 0.0, width):
+            for sy in (-height, 0.0, height):
+                if sx == 0.0 and sy == 0.0:
+                    continue
+
+                shifted = positions + (sx, sy)
+                near = np.flatnonzero(
+                    (shifted[:, 0] > x - distance)
+                    & (shifted[:, 0] < x + width + distance)
+                    & (shifted[:, 1] > y - distance)
+                    & (shifted[:, 1] < y + height + distance)
+                )
+                images.append(shifted[near])
+                owners.append(near)
+
+        owner = np.concatenate(owners)
+        pairs = owner[find_pairs_within(np.vstack(images), distance)]
+        pairs = np.sort(pairs[pairs[:, 0] != pairs[:, 1]], axis=1)
+
+        return np.unique(pairs, axis=0).reshape(-1, 2)
+
+    def get_shifts(self, positions: np.ndarray) -> list:
+        """returns the (index, shift) of every ghost needed at these positions"""
+        x, y, width, height = self.section
+        px, py = positions[:, 0], positions[:, 1]
+
+        shift_x = np.where(
+            px - x < self.margin, width, np.where(x + width - px < self.margin, -width, 0)
+        )
+        shift_y = np.where(
+            py - y < self.margin, height, np.where(y + height - py < self.margin, -height, 0)
+        )
+
+        needed = []
+
+        for i in np.flatnonzero((shift_x != 0) | (shift_y != 0)):
+            sx, sy = float(shift_x[i]), float(shift_y[i])
+            shifts = {(sx, 0.0), (0.0, sy), (sx, sy)} - {(0.0, 0.0)}
+            needed.extend((int(i), shift) for shift in shifts)
+
+        return needed
+
+    def _create_ghost(self, structure) -> tuple:
+        """kinematic copy of the structure's current shapes, returns the body and the
+        shapes. body.shapes stays empty until the body is added to the space"""
+        body = pymunk.Body(body_type=pymunk.Body.KINEMATIC)
+        shapes = []
+
+        for shape in structure.body.shapes:
+            if isinstance(shape, pymunk.Circle):
+                ghost_shape = pymunk.Circle(body, shape.radius, shape.offset)
+            else:
+                ghost_shape = pymunk.Poly(
+                    body, shape.get_vertices(), radius=shape.radius
+                )
+
+            ghost_shape.collision_type = GHOST_COLLISION_TYPE
+            ghost_shape.filter = self.ghost_filter
+            ghost_shape.friction = shape.friction
+            ghost_shape.elasticity = shape.elasticity
+
+            if hasattr(shape, "color"):
+                ghost_shape.color = shape.color
+
+            shapes.append(ghost_shape)
+
+        return body, shapes
+
+    def _get_signature(self, structure) -> tuple:
+        """changes when the structure's shapes are swapped or rescaled"""
+        return tuple(id(s) for s in structure.body.shapes) + (
+            getattr(structure, "scale", 1.0),
+        )
+
+    def update(self):
+        """wrap the structures, and move the ghosts to the current images. called
+        before each space step"""
+        if len(self.object_list) == 0:
+            return
+
+        positions = self.wrap()
+        needed = self.get_shifts(positions)
+
+        for key in self.active_ghosts - set(needed):
+            body, shapes, _ = self.ghosts[key]
+            self.space.remove(body, *shapes)
+
+        for key in needed:
+            i, (sx, sy) = key
+            structure = self.object_list[i]
+            signature = self._get_signature(structure)
+            body, shapes, ghost_signature = self.ghosts.get(key, (None, None, None))
+
+            if ghost_signature != signature:
+                if key in self.active_ghosts:
+                    self.space.remove(body, *shapes)
+                    self.active_ghosts.discard(key)
+
+                body, shapes = self._create_ghost(structure)
+                self.ghosts[key] = (body, shapes, signature)
+                self.ghost_owners[body] = structure.body
+
+            body.position = (positions[i, 0] + sx, positions[i, 1] + sy)
+            body.angle = structure.body.angle
+            body.velocity = structure.body.velocity
+            body.angular_velocity = structure.body.angular_velocity
+
+            if key not in self.active_ghosts:
+                self.space.add(body, *shapes)
+
+        self.active_ghosts = set(needed)
+
+    def get_density(self) -> float:
+        """area of all structures over the box area, exact since nothing is outside"""
+        return sum(o.area for o in self.object_list) / self.area
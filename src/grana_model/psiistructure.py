@@ -1,5 +1,4 @@
 from abc import ABC, abstractmethod
-from multiprocessing.sharedctypes import Value
 import pyglet
 from math import degrees, sqrt
 import random
@@ -9,74 +8,148 @@ from pathlib import Path
 from math import cos, sin, pi
 from abc import ABC, abstractmethod
 import numpy as np
-import pandas as pd
 import csv
 import datetime
 
-from pyparsing import col
+from src.grana_model.calibration import DEFAULT_DT
 from src.grana_model.dcalibrator import DCalibrator
 
-from src.grana_model.utils import pos_in_circle, rand_angle
+from src.grana_model.utils import (
+    pos_in_circle,
+    rand_angle,
+    parse_circle_shape_type,
+    circle_descriptor,
+)
 
 MAX_V = 1000
 V_SCALAR = 10.0
+DISPLACEMENT_COLUMNS = [
+    "time",
+    "displacement",
+    "rot_from_origin",
+    "mass",
+    "rotation_scalar",
+    "diffusion_scalar",
+    "x",
+    "y",
+    "theta",
+]
 
 
 class DistanceMagnitude(ABC):
+    """scales attraction vectors by the distance between two attraction points.
+    Subclasses implement kernel(), which is evaluated on whole arrays of distances."""
+
     def __init__(self, threshold: float = 10.0):
         self.threshold = threshold
 
     @abstractmethod
+    def kernel(self, distance: np.ndarray) -> np.ndarray:
+        """takes an array of distances and returns the scalar for each"""
+        return np.zeros_like(distance)
+
     def get_distance_scalar(self, pt1, pt2):
-        """takes a distance and returns a vector scaled according to a particular algorithm"""
-        return 0
+        """takes two points and returns the scalar for their distance"""
+        return float(self.kernel(np.asarray(self.get_distance(pt1, pt2), dtype=float)))
 
     def get_distance(self, pt1, pt2):
         """calulcates euclidean distance between two points and returns it"""
         return np.sqrt((pt2[0] - pt1[0]) ** 2 + (pt2[1] - pt1[1]) ** 2)
 
+    def get_attraction(self, v1: np.ndarray, v2: np.ndarray) -> np.ndarray:
+        """sums the attraction vectors from each of the (m, p, 2) points v1 toward each
+        of the (m, q, 2) points v2, and returns the (m, 2) sums"""
+        vm = v2[:, None, :, :] - v1[:, :, None, :]
+        distance = np.sqrt(np.sum(vm**2, axis=-1))
 
-class WellMagnitude(DistanceMagnitude):
-    def get_distance_scalar(self, pt1, pt2):
-        """if distance is greater than a threshold, it returns 0. otherwise, 1."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scale = np.where(distance > 0, self.kernel(distance) / distance, 0.0)
 
-        distance = self.get_distance(pt1, pt2)
+        return np.sum(vm * scale[..., None], axis=(1, 2)) * V_SCALAR
 
-        if distance > self.threshold:
-            return 0
-        else:
-            return 1
+
+class WellMagnitude(DistanceMagnitude):
+    def kernel(self, distance):
+        """if distance is greater than a threshold, it returns 0. otherwise, 1."""
+        return np.where(distance > self.threshold, 0.0, 1.0)
 
 
 class LinearScaledMagnitude(DistanceMagnitude):
-    def get_distance_scalar(self, pt1, pt2):
+    def kernel(self, distance):
         """return a linearly scaled magnitude, max value at 0 and min at threshold"""
+        return np.where(
+            distance < self.threshold, (self.threshold - distance) / self.threshold, 0.0
+        )
 
-        distance = self.get_distance(pt1, pt2)
 
-        distance_scalar = (self.threshold - distance) / self.threshold
+class InverseSquaredMagnitude(DistanceMagnitude):
+    def kernel(self, distance):
+        """return 1 / distance^2, capped at 1, and 0 beyond the threshold"""
+        with np.errstate(divide="ignore"):
+            distance_scalar = np.minimum(1 / np.square(distance), 1.0)
 
-        if distance < self.threshold:
-            return distance_scalar
-        else:
-            return 0
+        return np.where(distance < self.threshold, distance_scalar, 0.0)
 
 
-class InverseSquaredMagnitude(DistanceMagnitude):
-    def get_distance_scalar(self, pt1, pt2):
-        """return a linearly scaled magnitude, max value at 0 and min at threshold"""
+class TabulatedMagnitude(DistanceMagnitude):
+    """a magnitude law sampled once on a grid of distances between 0 and the
+    threshold, and linearly interpolated after that, so expensive or user defined
+    potentials cost the same as the simple ones. 0 beyond the threshold.
 
-        distance = self.get_distance(pt1, pt2)
+    Parameters:
+        threshold (float): the largest distance with a nonzero magnitude
+        function (callable): takes an array of distances and returns the magnitudes,
+            or a DistanceMagnitude to tabulate
+        num_points (int): grid points of the table
+    """
 
-        distance_scalar = 1 / distance**2
+    def __init__(self, threshold: float = 10.0, function=None, num_points: int = 1024):
+        super().__init__(threshold)
 
-        if distance_scalar >= 1:
-            distance_scalar = 1
+        if isinstance(function, DistanceMagnitude):
+            function = function.kernel
 
-        if distance < self.threshold:
-            return distance_scalar
-        else:
-            return 0
+        self.distances = np.linspace(0.0, threshold, num_points)
+        self.values = np.asarray(function(self.distances), dtype=float)
+
+    def kernel(self, distance):
+        return np.interp(distance, self.distances, self.values, right=0.0)
+
+
+# distance_scalar names of the structure_dict, see register_distance_magnitude
+DISTANCE_MAGNITUDES = {
+    "well": WellMagnitude,
+    "linear": LinearScaledMagnitude,
+    "inversesquared": InverseSquaredMagnitude,
+}
+_magnitude_cache = {}
+# shape csv filename -> circle approximation vertices, see get_circle_coords_from_csv
+_circle_coords_cache = {}
+
+
+def register_distance_magnitude(name: str, factory):
+    """makes a magnitude law available as structure_dict["distance_scalar"] = name.
+    factory takes the threshold and returns a DistanceMagnitude, ie a subclass, or
+    lambda threshold: TabulatedMagnitude(threshold, function=my_potential)"""
+    DISTANCE_MAGNITUDES[name] = factory
+    _magnitude_cache.clear()
+
+
+def get_distance_magnitude(distance_scalar, threshold: float) -> DistanceMagnitude:
+    """returns the magnitude for a structure_dict distance_scalar, a registered name or
+    a DistanceMagnitude. Instances are shared between structures with the same name
+    and threshold, so AttractionHandler can evaluate them in batches. Unknown names
+    fall back to the well."""
+    if isinstance(distance_scalar, DistanceMagnitude):
+        return distance_scalar
+
+    key = (distance_scalar, threshold)
+
+    if key not in _magnitude_cache:
+        factory = DISTANCE_MAGNITUDES.get(distance_scalar, WellMagnitude)
+        _magnitude_cache[key] = factory(threshold)
+
+    return _magnitude_cache[key]
 
 
 class AttractionPoint:
@@ -93,18 +166,29 @@ class AttractionPoint:
         distance_scalar: DistanceMagnitude,
         offset_coords: tuple,
         batch,
+        index: int = 0,
     ):
         self.parent = parent
+        self.index = index  # row in the parent's attraction point coordinates
+        self.magnitude = distance_scalar
         self.distance_scalar = distance_scalar.get_distance_scalar
         self.type = type
         self.offset_coords = offset_coords
         self.batch = batch
 
     def get_world_coords(self):
-        """TODO: verify they are being rotated"""
+        """world coordinates of the point, from the AttractionHandler cache if the
+        body hasn't moved since it was filled"""
+        body = self.parent.body
+        position = body.position
+
+        if self.parent.point_pose == (position.x, position.y, body.angle):
+            x, y = self.parent.point_row[self.index]
+            return Vec2d(x, y)
+
         x, y = self.offset_coords
 
-        return self.parent.body.position + Vec2d(x, y).rotated(self.parent.body.angle)
+        return position + Vec2d(x, y).rotated(body.angle)
 
     def calc_vector(self, v2):
         """calculate attraction vector between these two points, and return the vector"""
@@ -114,11 +198,6 @@ class AttractionPoint:
         vm = v2 - v1
         v_hat = vm / np.linalg.norm(vm)
 
-        # magnitude of that vector
-        v_mag = np.sqrt(np.power(0.01 - vm[0], 2) + np.power(0.01 - vm[1], 2)).astype(
-            np.float
-        )
-
         v3 = v_hat * self.distance_scalar(v1, v2) * V_SCALAR
 
         # print(f'vm: {vm}, vhat: {v_hat}, vmag: {v_mag}, v3: {v3}')
@@ -130,16 +209,18 @@ class PSIIStructure:
         self,
         space: Space,
         obj_dict: dict,
-        batch: pyglet.graphics.Batch,
+        batch: "pyglet.graphics.Batch",
         shape_type: str,
         pos: tuple[float, float],
         angle: float,
         structure_dict: dict,
         use_sprites: bool = True,
         circle_radius: int = 3,  # size of shape circle
+        scale: float = 1.0,  # shape size relative to the true size, see set_scale()
     ):
         self.active = True
         self.circle_radius = circle_radius
+        self.scale = 1.0
         self.id_num = random.randint(1000, 9999)
         self.structure_dict = structure_dict
         self.vector_list = (
@@ -170,7 +251,13 @@ class PSIIStructure:
 
         self.rot_history = []
 
+        # this structure's row of the attraction point coordinates cache, and the body
+        # pose it was computed at, set by AttractionHandler.get_point_coords
+        self.point_pose = None
+        self.point_row = []
+
         self.unpack_structure_dict(structure_dict)
+        self.load_calibration(shape_type)
 
         # self.dparams = {
         #     "d": 0.125,
@@ -180,19 +267,8 @@ class PSIIStructure:
         #     "current_displacement": 0,  # current displacement value per step
         # }
 
-        self.displacement = pd.DataFrame(
-            columns=[
-                "time",
-                "displacement",
-                "rot_from_origin",
-                "mass",
-                "rotation_scalar",
-                "diffusion_scalar",
-                "x",
-                "y",
-                "theta",
-            ]
-        )
+        # one row of DISPLACEMENT_COLUMNS per logged step, see the displacement property
+        self.displacement_rows = []
 
         self.body = self._create_body(mass=self.mass, angle=angle)
         self.last_angle = self.body.angle
@@ -200,61 +276,64 @@ class PSIIStructure:
         eval(shape_str)
 
         self.shape_list = shape_list
+        self.shape_type = shape_type
+        self.shape_cache = {}  # shape_type -> shape list, filled by set_shapes()
+
+        if scale != 1.0:
+            self.set_scale(scale)
 
         if use_sprites:
             self._assign_sprite(batch=batch)
 
+        # shared by all points, and all structures with the same distance_scalar
+        self.distance_magnitude = self.get_distance_scalar(
+            self.distance_scalar, threshold=self.distance_threshold
+        )
         self.attraction_points = {
             "p1": AttractionPoint(
                 parent=self,
-                distance_scalar=self.get_distance_scalar(
-                    self.distance_scalar, threshold=self.distance_threshold
-                ),
+                index=0,
+                distance_scalar=self.distance_magnitude,
                 type="point",
                 offset_coords=(3.92, 1.26),
                 batch=batch,
             ),
             "p2": AttractionPoint(
                 parent=self,
-                distance_scalar=self.get_distance_scalar(
-                    self.distance_scalar, threshold=self.distance_threshold
-                ),
+                index=1,
+                distance_scalar=self.distance_magnitude,
                 type="point",
                 offset_coords=(-3.13, 3.06),
                 batch=batch,
             ),
             "p3": AttractionPoint(
                 parent=self,
-                distance_scalar=self.get_distance_scalar(
-                    self.distance_scalar, threshold=self.distance_threshold
-                ),
+                index=2,
+                distance_scalar=self.distance_magnitude,
                 type="point",
                 offset_coords=(-0.97, -4.24),
                 batch=batch,
             ),
             "s1": AttractionPoint(
                 parent=self,
-                distance_scalar=self.get_distance_scalar(
-                    self.distance_scalar, threshold=self.distance_threshold
-                ),
+                index=3,
+                distance_scalar=self.distance_magnitude,
                 type="side",
                 offset_coords=(0.68, 3.02),
                 batch=batch,
             ),
             "s2": AttractionPoint(
                 parent=self,
-                distance_scalar=self.get_distance_scalar(
-                    self.distance_scalar, threshold=self.distance_threshold
-                ),
+                index=4,
+                distance_scalar=self.distance_magnitude,
                 type="side",
                 offset_coords=(-3.17, -1.08),
                 batch=batch,
             ),
             "s3": AttractionPoint(
                 parent=self,
-                distance_scalar=self.get_distance_scalar(
-                    self.distance_scalar, threshold=self.distance_threshold
-                ),
+                index=5,
+                distance_scalar=self.distance_magnitude,
                 type="side",
                 offset_coords=(2.3, -1.98),
                 batch=batch,
@@ -271,6 +350,38 @@ class PSIIStructure:
         # self.calibrate_diff_d = structure_dict["calibrate_diff_d"]
         # self.calibrate_rot_d = structure_dict["calibrate_rot_d"]
 
+    def load_calibration(self, shape_type: str):
+        """use the diffusion_scalar and rotation_scalar of the structure_dict
+        calibration_table, see CalibrationSolver, if it has an entry for this structure"""
+        table = self.structure_dict.get("calibration_table")
+
+        if table is None:
+            return
+
+        entry = table.lookup(
+            self.type,
+            self.mass,
+            shape_type,
+            self.structure_dict.get("dt", DEFAULT_DT),
+            self.space.damping,
+            structure_dict=self.structure_dict,
+        )
+
+        if entry is None:
+            return
+
+        self.diffusion_scalar = entry["diffusion_scalar"]
+        self.rotation_scalar = entry["rotation_scalar"]
+        self.dcalibrator.diffusion_scalar = self.diffusion_scalar
+        self.dcalibrator.rotation_scalar = self.rotation_scalar
+
+    @property
+    def displacement(self):
+        """the displacement log as a DataFrame, pandas is only imported here"""
+        import pandas as pd
+
+        return pd.DataFrame(self.displacement_rows, columns=DISPLACEMENT_COLUMNS)
+
     def log_displacement(self):
         """Calculate the currend displacement from origin, and log to dataframe"""
         if self.active:
@@ -290,17 +401,19 @@ class PSIIStructure:
 
             rot_from_start = self.body.angle - self.origin_angle
 
-            self.displacement.loc[len(self.displacement.index)] = [
-                time_ns,
-                current_disp,
-                rot_from_start,
-                self.mass,
-                self.rotation_scalar,
-                self.diffusion_scalar,
-                self.body.position.x,
-                self.body.position.y,
-                self.body.angle,
-            ]
+            self.displacement_rows.append(
+                [
+                    time_ns,
+                    current_disp,
+                    rot_from_start,
+                    self.mass,
+                    self.rotation_scalar,
+                    self.diffusion_scalar,
+                    self.body.position.x,
+                    self.body.position.y,
+                    self.body.angle,
+                ]
+            )
 
             # if self.time_step % 100 == 0:
             #     print(f"t: {time_ns}, disp: {current_disp}")
@@ -323,24 +436,22 @@ class PSIIStructure:
         )
 
         # if file exist, append:
-        if not os.path.exists(filename):
-            self.displacement.to_csv(filename, index=False)
-        else:
-            self.displacement.to_csv(filename, mode="a", index=False, header=False)
+        write_header = not os.path.exists(filename)
+
+        with open(filename, "a", newline="") as f:
+            write = csv.writer(f)
+
+            if write_header:
+                write.writerow(DISPLACEMENT_COLUMNS)
+
+            write.writerows(self.displacement_rows)
 
     def get_distance_scalar(self, distance_scalar: str, threshold: float):
-        if distance_scalar == "linear":
-            return LinearScaledMagnitude(threshold)
-        if distance_scalar == "inversesquared":
-            return InverseSquaredMagnitude(threshold)
-        else:
-            return WellMagnitude(threshold)
+        return get_distance_magnitude(distance_scalar, threshold)
 
     def vec_mag(self, v1: Vec2d, v2: Vec2d):
         """take two vectors and calculate the magnitude of the vector between them"""
-        return np.sqrt(np.power(v1[0] - v2[0], 2) + np.power(v1[1] - v2[1], 2)).astype(
-            np.float
-        )
+        return float(np.sqrt(np.power(v1[0] - v2[0], 2) + np.power(v1[1] - v2[1], 2)))
 
     def vec_norm(self, v1: Vec2d, v2: Vec2d):
         """return unit vector between v1 and v2 and magnitude"""
@@ -359,6 +470,10 @@ class PSIIStructure:
         return Vec2d(x * random.random(), y * random.random())
 
     def thermal_rotation(self, rotation_scalar: float):
+        if self.body.is_sleeping:
+            # setting the angle would wake the body
+            return
+
         t = (random.random() - 0.5) * 2 * np.pi * self.rotation_scalar
         self.body.angle += t
 
@@ -375,6 +490,10 @@ class PSIIStructure:
     def apply_vectors(
         self, attraction_enabled: bool = False, thermove_enabled: bool = False
     ) -> None:
+        if self.body.is_sleeping:
+            # see SleepPolicy, an impulse would wake the body
+            return
+
         if self.active:
             # calculate movement in this step and add to step_history
             self.log_step_distance()
@@ -437,54 +556,96 @@ class PSIIStructure:
         this objects vector list"""
 
         if self.active:
-            # get all attraction points for the other object
-            o2_points = other_object.get_attraction_points()
-
-            for o1pt in self.attraction_points.values():
-
-                # now iterate through all the attraction points in obstacle 2
-                for o2pt in o2_points:
+            # all attraction points of both objects, as arrays
+            v1 = np.array([tuple(p.get_world_coords()) for p in self.get_attraction_points()])
+            v2 = np.array(
+                [tuple(p.get_world_coords()) for p in other_object.get_attraction_points()]
+            )
 
-                    # calculate the attraction vector from pt1 toward the other point
-                    v = o1pt.calc_vector(o2pt.get_world_coords())
+            # the sum of the vectors from every point here toward every point there
+            x, y = self.distance_magnitude.get_attraction(v1[None], v2[None])[0]
 
-                    # append the vector to this object's vector list
-                    self.vector_list.append(v)
+            # append the vector to this object's vector list
+            self.vector_list.append(Vec2d(x, y))
 
     def exchange_simple_for_complex(self):
-        """remove the simple body and shapes from the space, and replace them with
-        the complex shapes with the same position and rotation"""
+        """replace the simple shapes with the complex shapes, keeping the same
+        position and rotation"""
+        self.set_shapes("complex")
+
+    def set_shapes(self, shape_type: str):
+        """remove the current shapes from the body and the space, and replace them
+        with the shapes of shape_type. The body is kept, so position, rotation and
+        velocity carry over."""
+        if shape_type == self.shape_type:
+            return
 
-        for s in self.body.shapes:
-            # for s in self.shape_list:
-            self.space.remove(s)
+        self.space.remove(*self.shape_list)
 
-        # old body position and angle
-        position = self.body.position
-        angle = self.body.angle
+        # keep the old shapes around, switching back and forth is common with LOD
+        self.shape_cache[self.shape_type] = self.shape_list
 
-        # remove old body
-        self.space.remove(self.body)
+        if shape_type not in self.shape_cache:
+            self.shape_cache[shape_type] = self.create_shape_list(shape_type)
 
-        # create new body with old parameters
-        self.body = self._create_body(
-            mass=self.structure_dict["mass"], angle=angle, position=position
-        )
+        self.shape_list = self.shape_cache[shape_type]
+        self.shape_type = shape_type
 
-        # get coordinates for complex shapes
-        coord_list = self.obj_dict["shapes_compound"]
+        # cached shapes may have been created or last used at another scale
+        self._scale_shapes(self.shape_list, self.scale)
 
-        # create new shapes
-        self.shape_list = [
-            self._create_shape(shape_coord=shape_coord) for shape_coord in coord_list
-        ]
-
-        # add new shapes and body to the space
-        self.space.add(self.body, *self.shape_list)
+        self.space.add(*self.shape_list)
 
         # reindex shapes for collisions
         self.space.reindex_shapes_for_body(self.body)
 
+    def set_scale(self, scale: float):
+        """resize all shapes to scale times their true size, around the body center.
+        Used to grow structures into place, see GrowthProtocol."""
+        if scale == self.scale:
+            return
+
+        self.scale = scale
+        self._scale_shapes(self.shape_list, scale)
+
+        if self.body.space is not None:
+            self.space.reindex_shapes_for_body(self.body)
+
+    def _scale_shapes(self, shape_list: list, scale: float):
+        """set the geometry of each shape to its template, the geometry at creation,
+        times scale"""
+        for shape in shape_list:
+            if getattr(shape, "scale", 1.0) == scale:
+                continue
+
+            shape.scale = scale
+
+            if isinstance(shape, Circle):
+                radius, (x, y) = shape.template
+                shape.unsafe_set_radius(radius * scale)
+                shape.unsafe_set_offset((x * scale, y * scale))
+            else:
+                shape.unsafe_set_vertices([(x * scale, y * scale) for x, y in shape.template])
+
+    def get_hull_vertices(self, shape_type: str = "simple"):
+        """returns the vertices of all shapes of shape_type in body coordinates,
+        circles as their bounding square"""
+        circles = circle_descriptor(shape_type)
+
+        if circles is not None:
+            return [
+                (x + dx * r, y + dy * r)
+                for r, (x, y) in circles
+                for dx, dy in ((-1, -1), (1, -1), (1, 1), (-1, 1))
+            ]
+
+        if shape_type == "complex":
+            coord_list = self.obj_dict["shapes_compound"]
+        else:
+            coord_list = self.obj_dict["shapes_simple"]
+
+        return [(x, y) for shape in coord_list for x, y in shape]
+
     def _create_body(self, mass: float, angle: float, position=None):
         """create a pymunk.Body object with given mass, position, angle"""
 
@@ -547,19 +708,28 @@ class PSIIStructure:
     def create_shape_list(self, shape_type):
         """creates pymunk shape objects, given a shape type and a shape coordinate. return slist of shapes"""
 
+        circles = circle_descriptor(shape_type)
+
+        if circles is not None:
+            # native pymunk circles, so collisions are circle-circle tests
+            return [
+                self._create_circle_shape(radius=radius, offset=offset)
+                for radius, offset in circles
+            ]
+
         if shape_type == "simple":
             coord_list = self.obj_dict["shapes_simple"]
         elif shape_type == "complex":
             coord_list = self.obj_dict["shapes_compound"]
         else:
-            try:
-                structure, _, r, n = shape_type.split("_")
-                filename = f"{structure}_circle_r_{r}_n_{n}_coords.csv"
-                coord_list = [self.get_circle_coords_from_csv(filename=filename)]
-            except ValueError:
+            if parse_circle_shape_type(shape_type) is None:
                 print("shape type not recognized")
                 raise ValueError
 
+            structure, _, r, n = shape_type.split("_")
+            filename = f"{structure}_circle_r_{r}_n_{n}_coords.csv"
+            coord_list = [self.get_circle_coords_from_csv(filename=filename)]
+
         return [
             self._create_shape(shape_coord=shape_coord) for shape_coord in coord_list
         ]
@@ -567,6 +737,19 @@ class PSIIStructure:
     def _create_shape(self, shape_coord: tuple):
         """creates a shape"""
         my_shape = Poly(self.body, vertices=shape_coord)
+        my_shape.template = [tuple(v) for v in shape_coord]  # true size, for set_scale()
+
+        my_shape.color = self.obj_dict["color"]
+        my_shape.friction = 0.5
+        my_shape.elasticity = 0.0
+        my_shape.collision_type = 1
+
+        return my_shape
+
+    def _create_circle_shape(self, radius: float, offset: tuple = (0, 0)):
+        """creates a circle shape, offset from the body center"""
+        my_shape = Circle(self.body, radius=radius, offset=offset)
+        my_shape.template = (radius, tuple(offset))  # true size, for set_scale()
 
         my_shape.color = self.obj_dict["color"]
         my_shape.friction = 0.5
@@ -589,9 +772,14 @@ class PSIIStructure:
         )
 
     def get_circle_coords_from_csv(self, filename):
-        df = pd.read_csv(f"src/grana_model/res/shapes/{filename}")
+        # read once per process, every structure and replica shares the coordinates
+        if filename not in _circle_coords_cache:
+            import pandas as pd
+
+            df = pd.read_csv(f"src/grana_model/res/shapes/{filename}")
+            _circle_coords_cache[filename] = df.values.tolist()
 
-        return df.values.tolist()
+        return _circle_coords_cache[filename]
 
     def update_sprite(self, sprite_scale_factor, rotation_factor):
         self.sprite.rotation = degrees(-self.body.angle) + rotation_factor
@@ -611,12 +799,47 @@ class PSIIStructure:
             scale = MAX_V / body_velocity_length
             body.velocity = body.velocity * scale
 
+    @property
+    def frozen(self):
+        return self.body.body_type == Body.STATIC
+
+    def freeze(self) -> bool:
+        """turns a stationary kinematic structure into static geometry. Static shapes
+        are kept in pymunk's static index, and are only reindexed on an explicit
+        change instead of every step. returns True if the structure was frozen"""
+        if self.body.body_type != Body.KINEMATIC:
+            return False
+
+        if self.body.velocity.length > 0 or self.body.angular_velocity != 0:
+            return False
+
+        self.body.body_type = Body.STATIC
+
+        return True
+
+    def unfreeze(self) -> bool:
+        """turns a frozen structure back into a kinematic one, so it can be moved.
+        returns True if the structure was frozen"""
+        if not self.frozen:
+            return False
+
+        self.body.body_type = Body.KINEMATIC
+
+        return True
+
+    def _reindex_if_frozen(self):
+        """static shapes don't follow their body until reindexed"""
+        if self.frozen:
+            self.space.reindex_shapes_for_body(self.body)
+
     def undo(self):
         if self.last_action["action"] == "rotate":
             self.body.angle = self.last_action["old_value"]
         if self.last_action["action"] == "move":
             self.body.position = self.last_action["old_value"]
 
+        self._reindex_if_frozen()
+
     def action(self, action_num):
         if action_num == 1:
             self.move()
@@ -638,6 +861,7 @@ class PSIIStructure:
         self.body.angle = current_angle + rand_angle(degree_range=degree_range)
 
         self._save_action("rotate", current_angle, self.body.angle)
+        self._reindex_if_frozen()
 
     def move(self, tether_radius: float = 1.0):
         """handles moving the object to a new location within its tether_radius.
@@ -654,3 +878,4 @@ class PSIIStructure:
         )
 
         self._save_action("move", start_pos, self.body.position)
+        self._reindex_if_frozen()
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""batched shape renderer
+
+This module draws the structures of a simulation through pyglet vertex lists instead
+of pymunk's debug draw. The triangles for every structure type are built once from
+the shape templates; each frame only the per-instance position and angle are applied,
+and colours are only uploaded when a shape changes colour (ie ensemble membership),
+which the environment counts in its color_version.
+
+Anything with a body can be drawn: structures with a shape_list, particles with a
+shape, and plain pymunk shapes such as the boundaries, so env.get_drawn_objects()
+covers everything debug draw showed.
+
+Example:
+    $ renderer = ShapeRenderer()
+    $ renderer.update(env.get_drawn_objects(), color_version=env.color_version)
+    $ renderer.draw()
+
+"""
+import numpy as np
+import pyglet
+from pyglet import gl
+from pymunk import Circle, Poly, Shape
+
+CIRCLE_SEGMENTS = 16
+
+
+def get_shapes(o) -> list:
+    """the shapes of a structure, a particle or a single pymunk shape"""
+    if isinstance(o, Shape):
+        return [o]
+
+    shape_list = getattr(o, "shape_list", None)
+
+    return shape_list if shape_list is not None else [o.shape]
+
+
+def get_shape_key(o):
+    """changes when the object gets new shapes, ie after a shape exchange"""
+    if isinstance(o, Shape):
+        return o
+
+    return getattr(o, "shape_list", None) or o.shape
+
+
+def get_type(o) -> str:
+    if isinstance(o, Shape):
+        return "shape"
+
+    return getattr(o, "type", type(o).__name__)
+
+
+def triangulate_shape(shape) -> np.ndarray:
+    """returns the triangles of a pymunk Poly or Circle shape in body (local)
+    coordinates, as an array of shape (3 * k, 2)"""
+    if isinstance(shape, Circle):
+        theta = np.linspace(0, 2 * np.pi, CIRCLE_SEGMENTS, endpoint=False)
+        ox, oy = shape.offset
+        outline = np.column_stack(
+            (ox + shape.radius * np.cos(theta), oy + shape.radius * np.sin(theta))
+        )
+    elif isinstance(shape, Poly):
+        outline = np.array([tuple(v) for v in shape.get_vertices()], dtype=float)
+    else:
+        return np.zeros((0, 2))
+
+    # pymunk polygons are convex, so a triangle fan covers them
+    fan = [(outline[0], outline[i], outline[i + 1]) for i in range(1, len(outline) - 1)]
+
+    return np.array(fan, dtype=float).reshape(-1, 2)
+
+
+def transform_vertices(
+    local_vertices: np.ndarray, positions: np.ndarray, angles: np.ndarray
+) -> np.ndarray:
+    """rotates and translates the local vertices (v, 2) of a template for each of
+    the n instances given by positions (n, 2) and angles (n,), returns (n, v, 2)"""
+    cos_a = np.cos(angles)[:, None]
+    sin_a = np.sin(angles)[:, None]
+    x = local_vertices[:, 0][None, :]
+    y = local_vertices[:, 1][None, :]
+
+    world_x = x * cos_a - y * sin_a + positions[:, 0:1]
+    world_y = x * sin_a + y * cos_a + positions[:, 1:2]
+
+    return np.stack((world_x, world_y), axis=-1)
+
+
+class _BlendGroup(pyglet.graphics.Group):
+    """enables alpha blending, so the transparent out_color shapes render as such"""
+
+    def set_state(self):
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+
+    def unset_state(self):
+        gl.glDisable(gl.GL_BLEND)
+
+
+class ShapeGroup:
+    """a single vertex list that holds every instance of one shape template.
+
+    Parameters:
+        local_vertices (np.ndarray): triangle vertices of the template, in body coordinates
+        shape_vertex_counts (list of int): number of vertices each shape of the template contributes
+        object_list (list): the instances drawn with this template
+        indices (list of int): index of each instance in the renderer's object list
+    """
+
+    def __init__(
+        self,
+        batch: pyglet.graphics.Batch,
+        group: pyglet.graphics.Group,
+        local_vertices: np.ndarray,
+        shape_vertex_counts: list,
+        object_list: list,
+        indices: list,
+    ):
+        self.local_vertices = local_vertices
+        self.shape_vertex_counts = shape_vertex_counts
+        self.object_list = object_list
+        self.indices = np.array(indices, dtype=int)
+        self.colors = None  # last uploaded list of shape colors
+
+        vertex_count = len(local_vertices) * len(object_list)
+        self.vertex_list = batch.add(
+            vertex_count,
+            gl.GL_TRIANGLES,
+            group,
+            ("v2f/stream", np.zeros(vertex_count * 2).tolist()),
+            ("c4B/dynamic", [0] * vertex_count * 4),
+        )
+
+    def update_vertices(self, positions: np.ndarray, angles: np.ndarray):
+        """upload the transformed template for all instances in one buffer write"""
+        world = transform_vertices(self.local_vertices, positions, angles)
+        np.ctypeslib.as_array(self.vertex_list.vertices)[:] = world.ravel()
+
+    def update_colors(self):
+        """upload the shape colors, if one of them has changed since the last upload"""
+        colors = [
+            tuple(int(c) for c in s.color) for o in self.object_list for s in get_shapes(o)
+        ]
+
+        if colors == self.colors:
+            return
+
+        self.colors = colors
+        per_vertex = np.repeat(
+            np.array(colors, dtype=np.uint8),
+            np.tile(self.shape_vertex_counts, len(self.object_list)),
+            axis=0,
+        )
+        np.ctypeslib.as_array(self.vertex_list.colors)[:] = per_vertex.ravel()
+
+    def delete(self):
+        self.vertex_list.delete()
+
+
+class ShapeRenderer:
+    """draws all structures in an object list as batched, per-template vertex lists.
+
+    The vertex lists are rebuilt only when the structures themselves change, such as
+    after exchange_simple_for_complex() gives a structure a new shape list. Colours are
+    read from the shapes only after a build, or when color_version changes.
+    """
+
+    def __init__(self, batch: pyglet.graphics.Batch = None):
+        self.batch = batch if batch is not None else pyglet.graphics.Batch()
+        self.group = _BlendGroup()
+        self.shape_groups = []
+        self.shape_lists = []  # the shape key of each object when the groups were built
+        self.color_version = None  # color_version of the last color upload
+
+    def needs_rebuild(self, object_list: list) -> bool:
+        if len(object_list) != len(self.shape_lists):
+            return True
+
+        return any(
+            get_shape_key(o) is not shape_list
+            for o, shape_list in zip(object_list, self.shape_lists)
+        )
+
+    def build(self, object_list: list):
+        """sorts the objects by type and shape template, and creates one vertex
+        list for each template"""
+        for shape_group in self.shape_groups:
+            shape_group.delete()
+
+        templates = {}
+
+        for idx, o in enumerate(object_list):
+            triangles = [triangulate_shape(s) for s in get_shapes(o)]
+            local_vertices = np.concatenate(triangles) if triangles else np.zeros((0, 2))
+            key = (get_type(o), local_vertices.tobytes())
+
+            if key not in templates:
+                templates[key] = {
+                    "local_vertices": local_vertices,
+                    "shape_vertex_counts": [len(t) for t in triangles],
+                    "objects": [],
+                    "indices": [],
+                }
+
+            templates[key]["objects"].append(o)
+            templates[key]["indices"].append(idx)
+
+        self.shape_groups = [
+            ShapeGroup(
+                batch=self.batch,
+                group=self.group,
+                local_vertices=template["local_vertices"],
+                shape_vertex_counts=template["shape_vertex_counts"],
+                object_list=template["objects"],
+                indices=template["indices"],
+            )
+            for template in templates.values()
+        ]
+
+        self.shape_lists = [get_shape_key(o) for o in object_list]
+        self.color_version = object()  # no version matches, the new lists need colours
+
+    def update(
+        self,
+        object_list: list,
+        positions: np.ndarray = None,
+        angles: np.ndarray = None,
+        color_version: int = None,
+    ):
+        """update the vertex lists with the current transforms. If positions and
+        angles are not given, they are read from the object bodies. Colours are
+        uploaded after a rebuild, and when color_version differs from the last upload"""
+        if self.needs_rebuild(object_list):
+            self.build(object_list)
+
+        if positions is None or angles is None:
+            positions = np.array(
+                [(o.body.position.x, o.body.position.y) for o in object_list]
+            ).reshape(-1, 2)
+            angles = np.array([o.body.angle for o in object_list])
+
+        update_colors = color_version != self.color_version
+        self.color_version = color_version
+
+        for shape_group in self.shape_groups:
+            shape_group.update_vertices(
+                positions[shape_group.indices], angles[shape_group.indices]
+            )
+
+            if update_colors:
+                shape_group.update_colors()
+
+    def draw(self):
+        self.batch.draw()
@@ -19,12 +19,25 @@ Todo:
    http://google.github.io/styleguide/pyguide.html
 
 """
-from distutils.log import debug
 import pymunk
 import time
 from datetime import datetime
 import csv
-from src.grana_model.overlapagent import OverlapAgent, ExpandingCircle
+from pathlib import Path
+from src.grana_model.overlapagent import (
+    OverlapAgent,
+    OverlapPipeline,
+    ExpandingCircle,
+)
+from src.grana_model.lodmanager import LODManager
+from src.grana_model.growthprotocol import GrowthProtocol
+from src.grana_model.sleeppolicy import SleepPolicy
+from src.grana_model.collisionfilter import CollisionFilters, count_candidate_pairs
+from src.grana_model.periodicbox import PeriodicBox
+from src.grana_model.convergencemonitor import ConvergenceMonitor
+from src.grana_model.particleengine import ParticleEngine
+from src.grana_model.msdcorrelator import MultiTauMSD
+from src.grana_model.spatialindex import get_positions
 
 OA_TIMELIMIT = 1000
 
@@ -45,21 +58,49 @@ class SimulationEnvironment:
         damping: float = 0.9,
         gui: bool = False,
         use_overlap_agent: bool = False,
+        use_lod: bool = False,
+        lod_contact_distance: float = 1.0,
+        overlap_stages: list = None,
+        overlap_batch_size: int = 1,
+        growth: GrowthProtocol = None,
+        freeze_psii: bool = False,
+        sleep_policy: SleepPolicy = None,
+        collision_filters: CollisionFilters = None,
+        periodic_box: PeriodicBox = None,
+        convergence: ConvergenceMonitor = None,
+        agent_convergence: ConvergenceMonitor = None,
+        particle_engine: ParticleEngine = None,
+        msd_correlator: MultiTauMSD = None,
+        notes: str = "",
     ):
         # simulation components
         self.space = space
         self.attraction_handler = attraction_handler
         self.spawner = spawner
-        self.collision_handler = self.create_sensor_collision_handler()
         self.overlap_handler = overlap_handler
         self.densityhandler = densityhandler
         self.object_data = object_data
         self.obstacle_list, self.particle_list, _ = self.spawner.setup_model()
-        self.sensor = self.densityhandler.create_ensemble_area_sensor()
-        self.boundaries = self.densityhandler.spawn_boundaries()
+
+        # optional PeriodicBox, the structures live only in the ensemble area, so the
+        # boundaries, the ensemble sensor and their collision handler aren't needed
+        self.periodic_box = periodic_box
+
+        if self.periodic_box is None:
+            self.collision_handler = self.create_sensor_collision_handler()
+            self.sensor = self.densityhandler.create_ensemble_area_sensor()
+            self.boundaries = self.densityhandler.spawn_boundaries()
+        else:
+            self.collision_handler = None
+            self.sensor = None
+            self.boundaries = []
+            self.periodic_box.start(self.obstacle_list)
+
         self.gui = gui
         self.steps = 0
         self.use_overlap_agent = use_overlap_agent
+        self.overlap_stages = overlap_stages  # OverlapPipeline stages, None for a single agent
+        self.overlap_batch_size = overlap_batch_size  # objects per OverlapAgent space step
 
         # simulation variables
         self.active = True
@@ -67,6 +108,64 @@ class SimulationEnvironment:
         self.space.damping = damping
         self.attraction_point_coords = []
         self.step_limit = step_limit
+        self.notes = notes  # added to the export filename, ie to tell replicas apart
+        # counts shape colour changes, the ShapeRenderer only uploads colours on a change
+        self.color_version = 0
+
+        # keeps structures on simple shapes unless they are close to another one
+        self.lod_manager = (
+            LODManager(self.obstacle_list, contact_distance=lod_contact_distance)
+            if use_lod
+            else None
+        )
+
+        # stationary PSII become static geometry, the OverlapAgent unfreezes them
+        # while it moves them
+        self.freeze_psii = freeze_psii
+
+        if self.freeze_psii:
+            self.freeze_stationary()
+
+        # optional CollisionFilters, drops pairs that no handler listens to
+        self.collision_filters = collision_filters
+        self.apply_collision_filters()
+
+        # optional SleepPolicy, puts settled structures to sleep
+        self.sleep_policy = sleep_policy
+
+        if self.sleep_policy is not None:
+            self.sleep_policy.start(self.obstacle_list)
+
+        # optional GrowthProtocol, inflates the structures to full size as they move
+        self.growth = growth
+
+        if self.growth is not None:
+            self.growth.start(self.obstacle_list)
+
+        # optional ConvergenceMonitor, stops the steps before step_limit once the
+        # overlap stops improving or a budget is used up
+        self.convergence = convergence
+
+        if self.convergence is not None:
+            self.convergence.start(self.obstacle_list)
+
+        # stops the OverlapAgent rounds in run(), by default at an overlap of 5 as
+        # before, or once a round no longer improves it
+        self.agent_convergence = (
+            agent_convergence
+            if agent_convergence is not None
+            else ConvergenceMonitor(window=4, target_overlap=5.0)
+        )
+
+        # optional ParticleEngine, mobile particles diffusing through the structures
+        # as numpy arrays, stepped once per simulation step
+        self.particle_engine = particle_engine
+
+        # optional MultiTauMSD, the structures' MSD and D estimates, computed online
+        self.msd_correlator = msd_correlator
+
+        if self.msd_correlator is not None:
+            self.msd_correlator.start([o.type for o in self.obstacle_list])
 
     def check_for_active(self):
         """Search through all objects, and return FALSE if any have active==False"""
@@ -78,6 +177,25 @@ class SimulationEnvironment:
         else:
             return True
 
+    def apply_collision_filters(self):
+        if self.collision_filters is None:
+            return
+
+        self.collision_filters.apply(
+            self.obstacle_list, self.particle_list, self.boundaries, self.sensor
+        )
+        print(
+            f"candidate pairs: {count_candidate_pairs(self.space, use_filters=False)} "
+            f"before filtering, {count_candidate_pairs(self.space)} after"
+        )
+
+    def freeze_stationary(self) -> int:
+        """freeze all stationary kinematic structures, returns how many were frozen"""
+        frozen = sum(o.freeze() for o in self.obstacle_list)
+        print(f"froze {frozen} stationary structures")
+
+        return frozen
+
     def initialze_simulation(self):
         for o in self.obstacle_list:
             for s in o.shape_list:
@@ -86,33 +204,98 @@ class SimulationEnvironment:
         for b in self.boundaries:
             b.color = (0, 0, 0, 0)
 
+        self.color_version += 1
+
+    def get_drawn_objects(self) -> list:
+        """structures, particles and boundaries, everything the window draws"""
+        return self.obstacle_list + self.particle_list + self.boundaries
+
     def run(self):
         """creates the obstacles and begins running the simulation"""
         self.obstacle_list, self.particle_list, _ = self.spawner.setup_model()
+
+        if self.lod_manager is not None:
+            self.lod_manager.object_list = self.obstacle_list
+            self.lod_manager.refresh()
+
+        if self.growth is not None:
+            self.growth.start(self.obstacle_list)
+
+        if self.freeze_psii:
+            self.freeze_stationary()
+
+        if self.sleep_policy is not None:
+            self.sleep_policy.start(self.obstacle_list)
+
+        if self.periodic_box is not None:
+            self.periodic_box.start(self.obstacle_list)
+
+        if self.convergence is not None:
+            self.convergence.start(self.obstacle_list)
+
+        if self.particle_engine is not None:
+            self.particle_engine.refresh(self.space)
+            self.particle_engine.reset()
+
+        if self.msd_correlator is not None:
+            self.msd_correlator.start([o.type for o in self.obstacle_list])
+
+        self.apply_collision_filters()
+
         print("starting simulation")
         while self.active:
             self.step()
 
-        if self.use_overlap_agent:
-            area_strategy = expanding_circle = ExpandingCircle(
-                origin_point=(300, 300),
-                object_list=self.obstacle_list,
-                zone_distances=[30, 60, 90, 120],
-            )
-            overlapagent = OverlapAgent(
+        if not self.use_overlap_agent:
+            return
+
+        area_strategy = expanding_circle = ExpandingCircle(
+            origin_point=(300, 300),
+            object_list=self.obstacle_list,
+            zone_distances=[30, 60, 90, 120],
+        )
+
+        if self.overlap_stages is not None:
+            # coarse to fine, the stages set the shapes themselves
+            pipeline = OverlapPipeline(
                 self.space,
                 self.obstacle_list,
                 self.overlap_handler,
-                time_limit=OA_TIMELIMIT,
+                stages=self.overlap_stages,
                 area_strategy=area_strategy,
-                notes=f"_{self.spawner.shape_type}_num_{len(self.obstacle_list)}_",
+                notes=f"_pipeline_num_{len(self.obstacle_list)}_",
+                lod_manager=self.lod_manager,
+                sleep_policy=self.sleep_policy,
+                periodic_box=self.periodic_box,
             )
-        overlap = 10000
+            overlap = pipeline.run(debug=True)
+            print(f"overlap: {overlap}")
+            return
+
+        overlapagent = OverlapAgent(
+            self.space,
+            self.obstacle_list,
+            self.overlap_handler,
+            time_limit=OA_TIMELIMIT,
+            area_strategy=area_strategy,
+            notes=f"_{self.spawner.shape_type}_num_{len(self.obstacle_list)}_",
+            lod_manager=self.lod_manager,
+            sleep_policy=self.sleep_policy,
+            periodic_box=self.periodic_box,
+            batch_size=self.overlap_batch_size,
+        )
+        self.agent_convergence.start(self.obstacle_list)
+        stopped = False
 
-        while overlap > 5:
-            overlapagent.run(debug=True)
+        while not stopped:
+            overlap_values = overlapagent.run(debug=True)
             overlap = overlapagent.get_current_overlap_distance()
             print(f"overlap: {overlap}")
+            stopped = self.agent_convergence.update(
+                overlap, actions=len(overlap_values)
+            )
+
+        print(f"overlap agent stopped: {self.agent_convergence.stop_reason}")
 
     def step(self):
         self.overlap_handler.reset_collision_count()
@@ -129,14 +312,67 @@ class SimulationEnvironment:
             # apply all vectors to each LHCII particle
             self.attraction_handler.apply_all_vectors(self.obstacle_list)
 
+        if self.lod_manager is not None:
+            self.lod_manager.update()
+
+        if self.periodic_box is not None:
+            # wrap the structures back into the box, and move the ghosts along
+            self.periodic_box.update()
+
         # update simulation one step
         self.space.step(self.dt)
 
         self.active = self.check_for_active()
 
+        if self.particle_engine is not None:
+            self.particle_engine.update(self.space)
+
+        if self.msd_correlator is not None:
+            self.update_msd()
+
+        if self.sleep_policy is not None:
+            self.sleep_policy.update()
+
+        if self.growth is not None:
+            self.growth.update(
+                self.overlap_handler.overlap_distance,
+                self.overlap_handler.collision_count,
+            )
+
+            if self.growth.finished:
+                print(
+                    f"growth {self.growth.status} after {self.steps} steps, scale: {round(self.growth.scale, 3)}"
+                )
+                self.finish_run()
+                return
+
+        if self.convergence is not None and self.convergence.update(
+            self.overlap_handler.overlap_distance
+        ):
+            print(
+                f"stopped after {self.steps} steps: {self.convergence.stop_reason}, overlap: {self.overlap_handler.overlap_distance}"
+            )
+            self.finish_run()
+            return
+
         if self.steps % 20 == 0:
+            sleeping = (
+                ""
+                if self.sleep_policy is None
+                else f", sleeping: {round(self.sleep_policy.sleeping_fraction, 2)}"
+            )
+            msd = (
+                ""
+                if self.particle_engine is None
+                else f", particle msd: {round(self.particle_engine.get_msd(), 2)}"
+            )
+            neighbours = (
+                f", pairs: {self.attraction_handler.pair_count}, rebuilds: {round(self.attraction_handler.rebuild_frequency, 2)}"
+                if self.attraction_handler.attraction_enabled
+                else ""
+            )
             print(
-                f"step {self.steps}, overlap: {self.overlap_handler.overlap_distance}"
+                f"step {self.steps}, overlap: {self.overlap_handler.overlap_distance}{sleeping}{msd}{neighbours}"
             )
 
         if self.gui:
@@ -145,15 +381,52 @@ class SimulationEnvironment:
                 self.obstacle_list
             )
         if self.steps > self.step_limit:
-
-            self.export_coordinates(
-                self.obstacle_list, filename=self.get_export_filename()
+            self.finish_run()
+
+    def finish_run(self):
+        """export the coordinates, and the diffusion report once, at the end of the
+        run"""
+        filename = self.get_export_filename()
+        self.export_coordinates(self.obstacle_list, filename=filename)
+
+        if self.msd_correlator is not None:
+            self.report_diffusion(filename)
+
+        self.active = False
+
+    def update_msd(self):
+        """feed the structure positions to the MSD correlator, unwrapped in a periodic
+        box"""
+        positions = (
+            get_positions(self.obstacle_list)
+            if self.periodic_box is None
+            else self.periodic_box.get_unwrapped_positions()
+        )
+        angles = [o.body.angle for o in self.obstacle_list]
+        self.msd_correlator.update(positions, angles)
+
+    def report_diffusion(self, filename: str):
+        """print the measured D values against the structure_dict targets, and export
+        MSD(t) next to the coordinates"""
+        for structure_type, d in self.msd_correlator.compare_to_targets(
+            self.spawner.structure_dict
+        ).items():
+            print(
+                f"{structure_type} d: {d['d']:.2e} (target {d['target_d']:.2e}), "
+                f"d_rot: {d['d_rot']:.2e} (target {d['target_d_rot']:.2e})"
             )
-            self.active = False
+
+        self.msd_correlator.export_msd(filename.replace("_coords.csv", "_msd.csv"))
 
     def get_export_filename(self):
+        growth = "" if self.growth is None else f"_growth_{self.growth.status}"
+        stop = (
+            ""
+            if self.convergence is None or not self.convergence.stopped
+            else f"_stop_{self.convergence.stop_reason}"
+        )
         filename = (
-            f"lhcii_export_coords/{self.spawner.shape_type}_limit_{self.step_limit}_coords".replace(
+            f"lhcii_export_coords/{self.spawner.shape_type}{self.notes}{growth}{stop}_limit_{self.step_limit}_coords".replace(
                 ".", "p"
             )
             + ".csv"
@@ -164,6 +437,16 @@ class SimulationEnvironment:
         return "we fight now"
 
     def get_ensemble_area(self):
+        if self.periodic_box is not None:
+            # everything is inside the box, the density is exact
+            total_area = sum(o.area for o in self.obstacle_list)
+
+            return {
+                "internal_area": total_area,
+                "total_area": total_area,
+                "ensemble_area": self.periodic_box.area,
+            }
+
         # calculate the area within the ensemble boundaries
         internal_area, total_area = self.densityhandler.update_area_calculations(
             self.obstacle_list
@@ -185,12 +468,14 @@ class SimulationEnvironment:
 
     def bound_coll_begin(self, arbiter, space, data):
         arbiter.shapes[0].color = self.densityhandler.out_color
+        self.color_version += 1
         return True
 
     def bound_coll_separate(self, arbiter, space, data):
         # if the shape separates from the boundary, and it is within the ensemble area,
         # add its area back to the internal_area calculation
         arbiter.shapes[0].color = self.densityhandler.in_color
+        self.color_version += 1
 
         # s = arbiter.shapes[0]
         # x, y = s.center_of_gravity
@@ -202,6 +487,7 @@ class SimulationEnvironment:
         now = datetime.now()
         dt_string = now.strftime("%d%m%Y_%H%M")
         print(filename + " has been exported.")
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
 
         with open(filename, "w", newline="") as f:
             write = csv.writer(f)
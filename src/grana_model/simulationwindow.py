@@ -7,6 +7,8 @@ from math import sqrt
 from math import pi
 import pymunk
 import pymunk.pyglet_util
+from src.grana_model.shaperenderer import ShapeRenderer
+from src.grana_model.spatialindex import SpatialQuery
 
 
 class SimulationWindow(pyglet.window.Window):
@@ -17,11 +19,19 @@ class SimulationWindow(pyglet.window.Window):
         draw_shapes,
         env,
         *args,
+        batched_draw: bool = True,
+        worker=None,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
         self.env = env
+        self.worker = worker  # SimulationWorker stepping env in the background, or None
         self.draw_shapes = draw_shapes
+        # False falls back to pymunk debug_draw, which reads the space, so only without
+        # a worker
+        self.batched_draw = batched_draw or worker is not None
+        self.area_dict = None  # last ensemble area, measured by the worker if there is one
+        self.area_pending = False
         self.timer = timer
         self.sensor = None
         self.batch = pyglet.graphics.Batch()
@@ -46,6 +56,8 @@ class SimulationWindow(pyglet.window.Window):
         self.selection_area = 1.0  # hodls the current selection area in square nm
 
         self.configure_draw_options()
+        self.shape_renderer = ShapeRenderer()
+        self.spatial_query = SpatialQuery(self.env.obstacle_list, self.env.space)
 
         self.cursor_xy = (
             100.0,
@@ -107,10 +119,10 @@ class SimulationWindow(pyglet.window.Window):
 
     def on_key_press(self, symbol, modifiers):
         if symbol == key.A:
-            self.env.get_ensemble_area()
+            self.run_on_simulation(self.print_ensemble_area)
         if symbol == key.B:
             # activate shape exchange
-            self.shape_exchange()
+            self.run_on_simulation(self.shape_exchange)
         if symbol == key.C:
             # center the grana in the screen and scale it up a bit
             self.set_size(self.window_width * 2, self.window_height * 2)
@@ -121,7 +133,9 @@ class SimulationWindow(pyglet.window.Window):
             self.diffusion_handler.toggle_diffusion_state()
         if symbol == key.E:
             # export the coordinates for all objects in the obstacle list
-            self.export_coordinates(ob_list=self.env.obstacle_list)
+            self.run_on_simulation(
+                self.export_coordinates, ob_list=self.env.obstacle_list
+            )
         if symbol == key.I:
             self.window_move(axis=1, dist=-20)
             # glTranslatef(0, -20, 0)
@@ -134,6 +148,15 @@ class SimulationWindow(pyglet.window.Window):
         if symbol == key.J:
             self.window_move(axis=0, dist=20)
             # glTranslatef(20, 0, 0)
+        if symbol == key.P and self.worker is not None:
+            self.worker.toggle_pause()
+        if symbol == key.PERIOD and self.worker is not None:
+            self.worker.change_speed(2.0)
+        if symbol == key.COMMA and self.worker is not None:
+            self.worker.change_speed(0.5)
+        if symbol == key.SLASH and self.worker is not None:
+            # remove the step rate limit
+            self.worker.set_speed(None)
         if symbol == key.Q:
             # export coordinates for only selected shapes
             self.export_subset()
@@ -170,6 +193,13 @@ class SimulationWindow(pyglet.window.Window):
 
         # self.densityhandler.print_shapes_in_section(objects_list)
 
+    def run_on_simulation(self, fn, *args, **kwargs):
+        """call fn directly, or queue it for the worker so it runs between two steps"""
+        if self.worker is None:
+            fn(*args, **kwargs)
+        else:
+            self.worker.submit(fn, *args, **kwargs)
+
     def window_move(self, axis: int, dist: int):
         if axis == 0:
             # move on x axis
@@ -201,7 +231,7 @@ class SimulationWindow(pyglet.window.Window):
         )
 
         if len(obj_subset) > 0:
-            self.export_coordinates(obj_subset)
+            self.run_on_simulation(self.export_coordinates, obj_subset)
 
     def on_mouse_press(self, x, y, button, modifiers):
         if button == pyglet.window.mouse.LEFT:
@@ -225,21 +255,28 @@ class SimulationWindow(pyglet.window.Window):
             )
             print(f"we selected {len(self.selected_objects)} objects.")
 
-    def find_objects_in_zone(self, origin, radius):
-        x, y = origin
-        sel_obj = []
-        for obstacle in self.env.obstacle_list:
-            x1, y1 = obstacle.body.position
+    def refresh_spatial_query(self):
+        """rebuild the spatial index from the latest positions, taking them from the
+        worker snapshot if there is one"""
+        positions = None
 
-            # calculate distance from given point
-            euc_dist = sqrt((x1 - x) ** 2 + (y1 - y) ** 2)
+        if self.worker is not None:
+            positions, _, _ = self.worker.snapshot.read()
 
-            # if the distance is less than the radius
-            # add it to the selected obj list
-            if euc_dist <= radius:
-                sel_obj.append(obstacle)
+            # the structures come first in the snapshot. Without all of them, keep the
+            # last index, reading the bodies isn't safe while the worker steps
+            if len(positions) < len(self.env.obstacle_list):
+                return
+
+            positions = positions[: len(self.env.obstacle_list)]
+
+        self.spatial_query.object_list = self.env.obstacle_list
+        self.spatial_query.refresh(positions)
+
+    def find_objects_in_zone(self, origin, radius):
+        self.refresh_spatial_query()
 
-        return sel_obj
+        return self.spatial_query.objects_in_radius(origin=origin, radius=radius)
 
     def get_arb_shapes(self, arb):
         return arb.shapes
@@ -252,17 +289,10 @@ class SimulationWindow(pyglet.window.Window):
         glTranslatef(self.window_width * -0.3, self.window_height * -0.3, 0)
 
     def get_shapes_in_rectangle(self, x, y, width, height):
-        num_objects = 0
-        objects_list = []
+        self.refresh_spatial_query()
+        objects_list = self.spatial_query.objects_in_rectangle(x, y, width, height)
 
-        for o in self.env.obstacle_list:
-            x1, y1 = o.body.position
-
-            if x < x1 < x + width and y < y1 < y + height:
-                num_objects += 1
-                objects_list.append(o)
-
-        return num_objects, objects_list
+        return len(objects_list), objects_list
 
     # def set_shape_color(self, obstacle):
 
@@ -298,11 +328,64 @@ class SimulationWindow(pyglet.window.Window):
     #         else:
     #             s.color = in_color
 
+    def draw_structures(self):
+        """draw the structures, particles and boundaries through the batched renderer,
+        or through pymunk's debug_draw if batched_draw is disabled"""
+        if self.batched_draw:
+            drawn_objects = self.env.get_drawn_objects()
+            positions, angles = None, None
+
+            if self.worker is not None:
+                # render the latest snapshot published by the worker
+                positions, angles, _ = self.worker.snapshot.read()
+
+                if len(positions) != len(drawn_objects):
+                    # objects were added since the last snapshot, keep the last frame
+                    # until the worker publishes them
+                    self.shape_renderer.draw()
+                    return
+
+            self.shape_renderer.update(
+                drawn_objects, positions, angles, color_version=self.env.color_version
+            )
+            self.shape_renderer.draw()
+        else:
+            self.env.space.debug_draw(self.draw_options)
+
     def update(self, dt):
-        # # update simulation one step
-        self.env.step()
+        # # update simulation one step, unless the worker is stepping it
+        if self.worker is None:
+            self.env.step()
 
-        
+    def get_attraction_points(self):
+        """the attraction points to draw, from the worker snapshot if there is one"""
+        if self.worker is not None:
+            return self.worker.snapshot.read_points()
+
+        return self.env.attraction_point_coords
+
+    def measure_ensemble_area(self):
+        """runs on the simulation, see request_ensemble_area()"""
+        self.area_dict = self.env.get_ensemble_area()
+        self.area_pending = False
+
+    def request_ensemble_area(self):
+        """measure the ensemble area, on the worker between two steps if there is one.
+        Only one request is queued at a time, frames don't pile them up"""
+        if self.area_pending:
+            return
+
+        self.area_pending = True
+        self.run_on_simulation(self.measure_ensemble_area)
+
+    def print_ensemble_area(self):
+        self.measure_ensemble_area()
+        self.print_area(self.area_dict)
+
+    def print_area(self, area_dict: dict):
+        print(
+            f'ensemble density = {round(area_dict["internal_area"] / (area_dict["ensemble_area"]), 2)}, interior_shape_area: {area_dict["internal_area"]}, total_shape_area: {area_dict["total_area"]}, ensemble_area: {area_dict["ensemble_area"]}'
+        )
 
     def on_draw(self):
         self.clear()
@@ -310,20 +393,21 @@ class SimulationWindow(pyglet.window.Window):
         self.fps_display.draw()
 
         if self.draw_shapes:
-            self.env.space.debug_draw(self.draw_options)
+            self.draw_structures()
 
             # list comprehension to draw all the attraction points
             yay_dots = [
                 pyglet.shapes.Circle(
                     dot[0], dot[1], radius=0.25, color=(250, 250, 230), batch=self.batch
                 )
-                for dot in self.env.attraction_point_coords
+                for dot in self.get_attraction_points()
             ]
 
             self.batch.draw()
-        
-        # calculate the ensemble area
-        area_dict = self.env.get_ensemble_area()
-        print(
-            f'ensemble density = {round(area_dict["internal_area"] / (area_dict["ensemble_area"]), 2)}, interior_shape_area: {area_dict["internal_area"]}, total_shape_area: {area_dict["total_area"]}, ensemble_area: {area_dict["ensemble_area"]}'
-        )
+
+        # calculate the ensemble area, the last measurement while the worker is on it
+        self.request_ensemble_area()
+        area_dict = self.area_dict
+
+        if area_dict is not None:
+            self.print_area(area_dict)
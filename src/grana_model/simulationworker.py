@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""simulation worker
+
+This module runs a SimulationEnvironment in a background thread, so the simulation is
+stepped as fast as it can go instead of once per frame of the SimulationWindow. After
+each step the worker publishes the body positions and angles, and the attraction
+points, into a double buffered SnapshotBuffer, which the window reads and renders at
+its own rate.
+
+pymunk spaces aren't thread safe, so while the worker runs, the window only draws from
+the snapshot. Anything else that reads or changes the space, such as exporting
+coordinates, exchanging shapes or measuring the ensemble area, is queued with submit()
+and run by the worker in between two steps.
+
+Example:
+    $ worker = SimulationWorker(env)
+    $ worker.start()
+    $ positions, angles, step = worker.snapshot.read()
+    $ worker.request_export()
+    $ worker.stop()
+
+"""
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class SnapshotBuffer:
+    """two (n, 3) arrays of x, y, angle. The writer fills the back buffer and swaps it
+    to the front, the reader copies the front buffer, so neither waits on the other
+    for longer than one array copy."""
+
+    def __init__(self, size: int = 0):
+        self.lock = threading.Lock()
+        self.buffers = [np.zeros((size, 3)), np.zeros((size, 3))]
+        self.point_buffers = [np.zeros((0, 2)), np.zeros((0, 2))]
+        self.front = 0
+        self.step = 0
+
+    def publish(self, object_list: list, step: int, points=None):
+        """write the current body states, and the (k, 2) attraction points, into the
+        back buffer and swap it to the front"""
+        back = 1 - self.front
+        self.point_buffers[back] = np.array(
+            [] if points is None else points, dtype=float
+        ).reshape(-1, 2)
+
+        if len(self.buffers[back]) != len(object_list):
+            self.buffers[back] = np.zeros((len(object_list), 3))
+
+        self.buffers[back][:] = [
+            (o.body.position.x, o.body.position.y, o.body.angle) for o in object_list
+        ]
+
+        with self.lock:
+            self.front = back
+            self.step = step
+
+    def read(self):
+        """returns a copy of the latest positions (n, 2), angles (n,) and the step
+        they were published at"""
+        with self.lock:
+            state = self.buffers[self.front].copy()
+            step = self.step
+
+        return state[:, :2], state[:, 2], step
+
+    def read_points(self) -> np.ndarray:
+        """returns the attraction points published with the latest state"""
+        with self.lock:
+            return self.point_buffers[self.front]
+
+
+class SimulationWorker(threading.Thread):
+    """steps a SimulationEnvironment in a background thread.
+
+    Parameters:
+        env (SimulationEnvironment): the environment to step
+        steps_per_second (float): upper limit of the step rate, None steps as fast as possible
+        publish_every (int): publish a snapshot every n steps
+
+    Attributes:
+        snapshot (SnapshotBuffer): the latest published body states, of the structures
+            followed by the particles and boundaries
+        paused (bool): the worker does not step while paused, but still runs commands
+    """
+
+    def __init__(
+        self, env, steps_per_second: float = None, publish_every: int = 1,
+    ):
+        super().__init__(daemon=True)
+        self.env = env
+        self.steps_per_second = steps_per_second
+        self.publish_every = publish_every
+        self.snapshot = SnapshotBuffer(len(env.get_drawn_objects()))
+        self.commands = queue.Queue()
+        self.paused = False
+        self._stop_event = threading.Event()
+
+        self.publish()
+
+    def publish(self):
+        """publish the states of everything the window draws, env.get_drawn_objects()"""
+        self.snapshot.publish(
+            self.env.get_drawn_objects(),
+            self.env.steps,
+            points=self.env.attraction_point_coords,
+        )
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.run_commands()
+
+            if self.paused or not self.env.active:
+                # nothing to step, wait for the next command instead of spinning
+                self.wait_for_command(timeout=0.05)
+                continue
+
+            t0 = time.perf_counter()
+
+            self.env.step()
+
+            if self.env.steps % self.publish_every == 0 or not self.env.active:
+                self.publish()
+
+            if self.steps_per_second is not None:
+                delay = 1.0 / self.steps_per_second - (time.perf_counter() - t0)
+                if delay > 0:
+                    self._stop_event.wait(delay)
+
+    def run_commands(self):
+        """run all queued commands, publishing afterwards if any changed the space"""
+        ran_command = False
+
+        while True:
+            try:
+                fn, args, kwargs = self.commands.get_nowait()
+            except queue.Empty:
+                break
+
+            fn(*args, **kwargs)
+            ran_command = True
+
+        if ran_command:
+            self.publish()
+
+    def wait_for_command(self, timeout: float):
+        try:
+            command = self.commands.get(timeout=timeout)
+        except queue.Empty:
+            return
+
+        fn, args, kwargs = command
+        fn(*args, **kwargs)
+        self.publish()
+
+    def submit(self, fn, *args, **kwargs):
+        """queue fn(*args, **kwargs) to be called by the worker between two steps"""
+        self.commands.put((fn, args, kwargs))
+
+    def request_export(self, filename: str = None):
+        """queue an export of the obstacle coordinates"""
+        if filename is None:
+            filename = self.env.get_export_filename()
+
+        self.submit(
+            self.env.export_coordinates, self.env.obstacle_list, filename=filename
+        )
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+        print(f"simulation paused: {self.paused}")
+
+    def set_speed(self, steps_per_second: float = None):
+        """limit the step rate, None removes the limit"""
+        self.steps_per_second = steps_per_second
+        print(f"steps per second limit: {self.steps_per_second}")
+
+    def change_speed(self, factor: float):
+        """multiply the step rate limit by factor. Starts from 60 steps per second
+        if there is no limit yet"""
+        if self.steps_per_second is None:
+            self.set_speed(60.0 * factor)
+        else:
+            self.set_speed(max(1.0, self.steps_per_second * factor))
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout=timeout)
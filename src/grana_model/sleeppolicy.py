@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""sleeping for settled structures
+
+This module implements an opt-in policy that puts quiescent structures to sleep. pymunk
+neither integrates nor collides sleeping bodies, so long relaxation runs get cheaper as
+more of the structures settle.
+
+The policy tracks the displacement of every structure between steps, and puts a
+structure to sleep once it has moved less than idle_distance for idle_steps steps in a
+row. pymunk wakes a sleeping body when an awake body touches it, or when its position
+or angle is set, ie by the OverlapAgent.
+
+Contacts between two sleeping bodies are not solved again, so they no longer add to
+the overlap distance measured by the CollisionHandler. Their overlap can't change
+while they sleep.
+
+Example:
+    $ sleep_policy = SleepPolicy(space, idle_distance=0.01, idle_steps=30)
+    $ env = SimulationEnvironment(..., sleep_policy=sleep_policy)
+
+"""
+import numpy as np
+import pymunk
+
+from src.grana_model.spatialindex import get_positions
+
+
+class SleepPolicy:
+    """puts structures to sleep once they have stopped moving.
+
+    Parameters:
+        space (pymunk.Space): the space the structures live in. Sleeping is enabled on
+            it, pymunk needs a finite sleep_time_threshold for bodies to sleep.
+        idle_distance (float): displacement per step, in nm, below which a structure
+            counts as idle
+        idle_rotation (float): rotation per step, in radians, below which a structure
+            counts as idle
+        idle_steps (int): idle steps in a row before a structure is put to sleep
+        sleep_time_threshold (float): passed on to the space, pymunk also sleeps groups
+            of touching bodies that stay idle this long by itself
+        idle_speed_threshold (float): passed on to the space, the speed below which
+            pymunk considers a body idle, 0 lets pymunk estimate it from gravity
+
+    Attributes:
+        history (list of float): fraction of the structures asleep after each update
+    """
+
+    def __init__(
+        self,
+        space: pymunk.Space,
+        idle_distance: float = 0.01,
+        idle_rotation: float = 0.001,
+        idle_steps: int = 30,
+        sleep_time_threshold: float = 0.5,
+        idle_speed_threshold: float = 0.0,
+    ):
+        self.space = space
+        self.idle_distance = idle_distance
+        self.idle_rotation = idle_rotation
+        self.idle_steps = idle_steps
+        self.object_list = []
+        self.last_positions = None
+        self.last_angles = None
+        self.idle_counts = None
+        self.history = []
+
+        self.space.sleep_time_threshold = sleep_time_threshold
+        self.space.idle_speed_threshold = idle_speed_threshold
+
+    def start(self, object_list: list):
+        """track the structures in object_list, all of them awake"""
+        self.object_list = object_list
+        self.last_positions = get_positions(object_list)
+        self.last_angles = np.array([o.body.angle for o in object_list], dtype=float)
+        self.idle_counts = np.zeros(len(object_list), dtype=int)
+        self.history = []
+
+    @property
+    def sleeping_fraction(self):
+        return self.history[-1] if self.history else 0.0
+
+    def update(self) -> float:
+        """called between space steps. counts idle steps, puts structures to sleep,
+        and returns the fraction of structures asleep"""
+        if self.idle_counts is None or len(self.idle_counts) != len(self.object_list):
+            self.start(self.object_list)
+
+        if len(self.object_list) == 0:
+            return 0.0
+
+        positions = get_positions(self.object_list)
+        angles = np.array([o.body.angle for o in self.object_list], dtype=float)
+
+        moved = np.linalg.norm(positions - self.last_positions, axis=1)
+        turned = np.abs(angles - self.last_angles)
+        idle = (moved < self.idle_distance) & (turned < self.idle_rotation)
+
+        self.idle_counts = np.where(idle, self.idle_counts + 1, 0)
+        self.last_positions = positions
+        self.last_angles = angles
+
+        sleeping = 0
+
+        for o, count in zip(self.object_list, self.idle_counts):
+            body = o.body
+
+            if body.body_type != pymunk.Body.DYNAMIC:
+                continue
+
+            if not body.is_sleeping and count >= self.idle_steps:
+                body.sleep()
+
+            sleeping += body.is_sleeping
+
+        self.history.append(sleeping / len(self.object_list))
+
+        return self.history[-1]
+
+    def wake(self, structure):
+        """wake a structure, ie before the OverlapAgent moves it"""
+        if structure.body.is_sleeping:
+            structure.body.activate()
+
+        if structure in self.object_list:
+            self.idle_counts[self.object_list.index(structure)] = 0
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""space tuning
+
+This module benchmarks pymunk space configurations on a spawned model, and picks the
+fastest one that keeps the overlap within tolerance of the default configuration.
+
+The candidates vary the broad phase (the default bounding box tree, or a spatial hash
+with a cell size derived from the shape sizes), the solver iterations and the collision
+slop. Switching a space to a spatial hash can't be undone, so every candidate is run on
+a fresh space, with the model spawned by the same build function and random seed.
+
+Example:
+    $ tuner = SpaceTuner(build=build_model, steps=30)
+    $ best = tuner.run()
+    $ space = configure_space(**best)
+
+"""
+import csv
+import random
+import time
+from pathlib import Path
+
+import numpy as np
+import pymunk
+
+
+def configure_space(
+    threaded: bool = False,
+    damping: float = 0.1,
+    spatial_hash_dim: float = None,
+    spatial_hash_count: int = 10000,
+    iterations: int = 10,
+    collision_slop: float = 0.1,
+) -> pymunk.Space:
+    """creates a space, using a spatial hash broad phase if spatial_hash_dim is given"""
+    space = pymunk.Space(threaded=threaded)
+    space.damping = damping
+    space.iterations = iterations
+    space.collision_slop = collision_slop
+
+    if spatial_hash_dim is not None:
+        space.use_spatial_hash(spatial_hash_dim, spatial_hash_count)
+
+    return space
+
+
+def get_shape_sizes(space: pymunk.Space, collision_type: int = 1) -> np.ndarray:
+    """returns the larger bounding box side of each structure shape in the space"""
+    return np.array(
+        [
+            max(s.bb.right - s.bb.left, s.bb.top - s.bb.bottom)
+            for s in space.shapes
+            if s.collision_type == collision_type
+        ]
+    )
+
+
+class SpaceTuner:
+    """benchmarks space configurations and picks the fastest acceptable one.
+
+    Parameters:
+        build (callable): build(space) spawns the model into the space and returns
+            its CollisionHandler
+        steps (int): space steps timed for each candidate
+        dt (float): space step time
+        overlap_tolerance (float): relative increase in overlap distance over the
+            default configuration that is still acceptable
+        threaded (bool): passed on to configure_space
+        damping (float): passed on to configure_space
+        seed (int): random seed, set before every build so all candidates get the
+            same model
+
+    Attributes:
+        results (list of dict): the configuration, seconds and overlap of every candidate
+        best (dict): the chosen configuration, keyword arguments for configure_space
+    """
+
+    def __init__(
+        self,
+        build,
+        steps: int = 30,
+        dt: float = 0.01666667,
+        overlap_tolerance: float = 0.1,
+        threaded: bool = False,
+        damping: float = 0.9,
+        seed: int = 0,
+    ):
+        self.build = build
+        self.steps = steps
+        self.dt = dt
+        self.overlap_tolerance = overlap_tolerance
+        self.threaded = threaded
+        self.damping = damping
+        self.seed = seed
+        self.results = []
+        self.best = None
+
+    def create_space(self, config: dict):
+        """configures a new space, spawns the model into it, and returns both"""
+        space = configure_space(threaded=self.threaded, damping=self.damping, **config)
+        random.seed(self.seed)
+        np.random.seed(self.seed)
+        overlap_handler = self.build(space)
+
+        return space, overlap_handler
+
+    def get_candidates(self, shape_sizes: np.ndarray) -> list:
+        """configurations to try: the default tree and spatial hashes with cell sizes
+        around the median shape size, each with a few solver iterations and slops.
+        pymunk suggests a hash count of about 10 times the number of shapes."""
+        median_size = float(np.median(shape_sizes)) if len(shape_sizes) else 1.0
+        hash_count = max(1000, 10 * len(shape_sizes))
+
+        broad_phases = [{}] + [
+            {"spatial_hash_dim": factor * median_size, "spatial_hash_count": hash_count}
+            for factor in (1.0, 2.0, 4.0)
+        ]
+
+        return [
+            {**broad_phase, "iterations": iterations, "collision_slop": slop}
+            for broad_phase in broad_phases
+            for iterations in (5, 10, 20)
+            for slop in (0.1, 0.2)
+        ]
+
+    @staticmethod
+    def get_config(result: dict) -> dict:
+        """the configuration part of a result row"""
+        return {k: v for k, v in result.items() if k not in ("seconds", "overlap")}
+
+    def benchmark(self, config: dict) -> dict:
+        """times steps on a fresh space with config, and returns the result row"""
+        return self.time_steps(config, *self.create_space(config))
+
+    def time_steps(self, config: dict, space: pymunk.Space, overlap_handler) -> dict:
+        """times steps on space, configured with config, and returns the result row"""
+        start = time.perf_counter()
+
+        for _ in range(self.steps):
+            overlap_handler.reset_collision_count()
+            space.step(self.dt)
+
+        seconds = time.perf_counter() - start
+
+        return {**config, "seconds": seconds, "overlap": overlap_handler.overlap_distance}
+
+    def run(self, debug: bool = False) -> dict:
+        """benchmarks the default and all candidates, and returns the fastest
+        configuration with overlap within tolerance of the default"""
+        default = {"iterations": 10, "collision_slop": 0.1}
+
+        # the default's space gives the shape sizes, and is then benchmarked itself
+        space, overlap_handler = self.create_space(default)
+        candidates = self.get_candidates(get_shape_sizes(space))
+
+        self.results = [
+            self.time_steps(config, space, overlap_handler)
+            if config == default
+            else self.benchmark(config)
+            for config in candidates
+        ]
+
+        baseline = next(r for r in self.results if self.get_config(r) == default)
+        max_overlap = baseline["overlap"] * (1 + self.overlap_tolerance)
+
+        acceptable = [r for r in self.results if r["overlap"] <= max_overlap]
+        fastest = min(acceptable, key=lambda r: r["seconds"])
+        self.best = self.get_config(fastest)
+
+        if debug:
+            for r in self.results:
+                print(r)
+
+        print(
+            f"space tuning: {self.best}, {round(fastest['seconds'], 3)} s vs "
+            f"{round(baseline['seconds'], 3)} s for the default"
+        )
+
+        return self.best
+
+    def export_results(self, filename: str = "space_tuning.csv"):
+        """writes all candidate results, marking the chosen configuration"""
+        fieldnames = [
+            "spatial_hash_dim",
+            "spatial_hash_count",
+            "iterations",
+            "collision_slop",
+            "seconds",
+            "overlap",
+            "chosen",
+        ]
+
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+
+        with open(filename, "w", newline="") as f:
+            write = csv.DictWriter(f, fieldnames=fieldnames)
+            write.writeheader()
+
+            for r in self.results:
+                write.writerow({**r, "chosen": self.get_config(r) == self.best})
+
+        print(filename + " has been exported.")
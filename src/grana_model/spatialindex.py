@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""spatial index and queries
+
+This module implements a uniform grid index over object positions, with radius,
+rectangle, polygon and nearest neighbour queries that return object indices, and a
+SpatialQuery layer that keeps such an index for the objects of a SimulationEnvironment.
+It is used by the SimulationWindow for selections, and can be used by analysis scripts
+on exported coordinate files.
+
+Example:
+    $ query = SpatialQuery(env.obstacle_list, env.space)
+    $ selected = query.objects_in_radius(origin=(250, 250), radius=20)
+
+    or
+
+    $ index = SpatialIndex.from_csv("lhcii_export_coords/coords.csv")
+    $ idx = index.query_rectangle(200, 200, 100, 100)
+
+"""
+import csv
+
+import numpy as np
+import pymunk
+
+
+def get_positions(object_list: list) -> np.ndarray:
+    """returns the body positions of all objects as an (n, 2) array"""
+    return np.array(
+        [(o.body.position.x, o.body.position.y) for o in object_list], dtype=float
+    ).reshape(-1, 2)
+
+
+def find_pairs_within(positions: np.ndarray, distance: float) -> np.ndarray:
+    """cell list search for all index pairs (i, j), i < j, of positions closer than
+    distance. Fully vectorized, so it is cheap enough to call every step.
+
+    The positions are binned into cells of edge length distance, so only the
+    3 x 3 block of cells around each position can hold a partner.
+    """
+    positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+    n = len(positions)
+
+    if n < 2 or distance <= 0:
+        return np.zeros((0, 2), dtype=int)
+
+    cell_xy = np.floor((positions - positions.min(axis=0)) / distance).astype(np.int64)
+    rows = cell_xy[:, 1].max() + 3
+
+    # pad by one cell on each side, so the neighbour keys below can't wrap around
+    keys = (cell_xy[:, 0] + 1) * rows + (cell_xy[:, 1] + 1)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    offsets = np.array([dx * rows + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+    neighbour_keys = (keys[:, None] + offsets[None, :]).ravel()
+    starts = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+    counts = np.searchsorted(sorted_keys, neighbour_keys, side="right") - starts
+
+    # expand every (position, neighbour cell) run into candidate pairs
+    total = counts.sum()
+    i = np.repeat(np.repeat(np.arange(n), len(offsets)), counts)
+    run_start = np.repeat(np.cumsum(counts) - counts, counts)
+    j = order[np.repeat(starts, counts) + np.arange(total) - run_start]
+
+    keep = i < j
+    i, j = i[keep], j[keep]
+    d2 = np.sum((positions[i] - positions[j]) ** 2, axis=1)
+    close = d2 < distance**2
+
+    return np.column_stack((i[close], j[close]))
+
+
+class SpatialIndex:
+    """uniform grid of cells over a set of (x, y) positions.
+
+    Parameters:
+        positions (np.ndarray): (n, 2) array of positions
+        cell_size (float): edge length of the grid cells, in nm. Queries are fastest
+        when this is close to the typical query radius.
+    """
+
+    def __init__(self, positions: np.ndarray, cell_size: float = 10.0):
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        self.cell_size = cell_size
+        self.cells = {}  # (cx, cy) -> array of indices
+
+        if len(self.positions) == 0:
+            return
+
+        cell_xy = np.floor(self.positions / cell_size).astype(np.int64)
+        order = np.lexsort((cell_xy[:, 1], cell_xy[:, 0]))
+        sorted_cells = cell_xy[order]
+
+        # boundaries between runs of identical cells in the sorted order
+        breaks = np.flatnonzero(np.any(np.diff(sorted_cells, axis=0) != 0, axis=1)) + 1
+        starts = np.concatenate(([0], breaks))
+        ends = np.concatenate((breaks, [len(order)]))
+
+        for start, end in zip(starts, ends):
+            cx, cy = sorted_cells[start]
+            self.cells[(int(cx), int(cy))] = order[start:end]
+
+    @classmethod
+    def from_objects(cls, object_list: list, cell_size: float = 10.0):
+        return cls(get_positions(object_list), cell_size=cell_size)
+
+    @classmethod
+    def from_csv(cls, filename: str, cell_size: float = 10.0):
+        """creates an index from an exported coordinate file with x and y columns"""
+        with open(filename, newline="") as f:
+            rows = [(float(row["x"]), float(row["y"])) for row in csv.DictReader(f)]
+
+        return cls(np.array(rows), cell_size=cell_size)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _candidates(self, x0: float, y0: float, x1: float, y1: float) -> np.ndarray:
+        """returns the indices of all positions in cells that overlap the box"""
+        cx0, cy0 = int(np.floor(x0 / self.cell_size)), int(np.floor(y0 / self.cell_size))
+        cx1, cy1 = int(np.floor(x1 / self.cell_size)), int(np.floor(y1 / self.cell_size))
+
+        # a box covering more cells than are occupied is cheaper to check brute force
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+            return np.arange(len(self.positions))
+
+        found = [
+            self.cells[(cx, cy)]
+            for cx in range(cx0, cx1 + 1)
+            for cy in range(cy0, cy1 + 1)
+            if (cx, cy) in self.cells
+        ]
+
+        return np.concatenate(found) if found else np.zeros(0, dtype=int)
+
+    def query_radius(self, origin: tuple, radius: float) -> np.ndarray:
+        """returns the indices of all positions within radius of origin"""
+        x, y = origin
+        idx = self._candidates(x - radius, y - radius, x + radius, y + radius)
+        d2 = np.sum((self.positions[idx] - (x, y)) ** 2, axis=1)
+
+        return np.sort(idx[d2 <= radius**2])
+
+    def query_rectangle(
+        self, x: float, y: float, width: float, height: float
+    ) -> np.ndarray:
+        """returns the indices of all positions strictly inside the rectangle"""
+        idx = self._candidates(x, y, x + width, y + height)
+        p = self.positions[idx]
+        inside = (
+            (x < p[:, 0]) & (p[:, 0] < x + width) & (y < p[:, 1]) & (p[:, 1] < y + height)
+        )
+
+        return np.sort(idx[inside])
+
+    def query_polygon(self, vertices: list) -> np.ndarray:
+        """returns the indices of all positions inside the polygon, by ray casting"""
+        poly = np.asarray(vertices, dtype=float)
+        x0, y0 = poly.min(axis=0)
+        x1, y1 = poly.max(axis=0)
+        idx = self._candidates(x0, y0, x1, y1)
+        px, py = self.positions[idx, 0], self.positions[idx, 1]
+
+        inside = np.zeros(len(idx), dtype=bool)
+
+        for (ax, ay), (bx, by) in zip(poly, np.roll(poly, -1, axis=0)):
+            crosses = (ay > py) != (by > py)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x_cross = ax + (py - ay) * (bx - ax) / (by - ay)
+            inside ^= crosses & (px < x_cross)
+
+        return np.sort(idx[inside])
+
+    def nearest(self, point: tuple, max_distance: float = np.inf):
+        """returns the index of the position closest to point, or None if there is
+        none within max_distance"""
+        if len(self.positions) == 0:
+            return None
+
+        radius = self.cell_size
+
+        while True:
+            idx = self.query_radius(point, min(radius, max_distance))
+
+            if len(idx) > 0:
+                d2 = np.sum((self.positions[idx] - point) ** 2, axis=1)
+                return int(idx[np.argmin(d2)])
+
+            if radius >= max_distance or radius > 1e6:
+                return None
+
+            radius *= 2
+
+    def pairs_within(self, distance: float) -> np.ndarray:
+        """returns all index pairs (i, j), i < j, closer than distance, as a (k, 2) array"""
+        return find_pairs_within(self.positions, distance)
+
+
+class SpatialQuery:
+    """spatial query layer over the objects of a simulation.
+
+    Position queries are answered from a SpatialIndex of the body positions, which is
+    rebuilt by refresh(). Shape queries go through the pymunk space's own
+    bounding box tree, and map the shapes found back to object indices.
+
+    Parameters:
+        object_list (list of PSIIStructure): the objects to query
+        space (pymunk.Space): the space the objects live in, for shape queries
+        cell_size (float): cell size of the position index
+    """
+
+    def __init__(self, object_list: list, space: pymunk.Space = None, cell_size: float = 10.0):
+        self.object_list = object_list
+        self.space = space
+        self.cell_size = cell_size
+        self.index = None
+        self.refresh()
+
+    def refresh(self, positions: np.ndarray = None):
+        """rebuild the position index from the bodies, or from given positions such
+        as a SimulationWorker snapshot"""
+        if positions is None:
+            positions = get_positions(self.object_list)
+
+        self.index = SpatialIndex(positions, cell_size=self.cell_size)
+
+        # body -> object index, for mapping pymunk shape queries back to objects
+        self.body_index = {o.body: i for i, o in enumerate(self.object_list)}
+
+    def indices_in_radius(self, origin: tuple, radius: float) -> np.ndarray:
+        return self.index.query_radius(origin, radius)
+
+    def indices_in_rectangle(self, x: float, y: float, width: float, height: float):
+        return self.index.query_rectangle(x, y, width, height)
+
+    def indices_in_polygon(self, vertices: list) -> np.ndarray:
+        return self.index.query_polygon(vertices)
+
+    def objects_in_radius(self, origin: tuple, radius: float) -> list:
+        return [self.object_list[i] for i in self.indices_in_radius(origin, radius)]
+
+    def objects_in_rectangle(self, x: float, y: float, width: float, height: float):
+        return [
+            self.object_list[i] for i in self.indices_in_rectangle(x, y, width, height)
+        ]
+
+    def objects_in_polygon(self, vertices: list) -> list:
+        return [self.object_list[i] for i in self.indices_in_polygon(vertices)]
+
+    def indices_touching_rectangle(
+        self, x: float, y: float, width: float, height: float
+    ) -> np.ndarray:
+        """returns the indices of all objects with a shape whose bounding box
+        overlaps the rectangle, rather than only those with their center in it"""
+        hits = self.space.bb_query(
+            pymunk.BB(x, y, x + width, y + height), pymunk.ShapeFilter()
+        )
+        idx = {self.body_index[s.body] for s in hits if s.body in self.body_index}
+
+        return np.array(sorted(idx), dtype=int)
+
+    def nearest_index(self, point: tuple, max_distance: float = 10.0):
+        """returns the index of the object with the shape closest to point, or None
+        if no object is within max_distance. Uses the body positions if there is no
+        space to query."""
+        if self.space is None:
+            return self.index.nearest(point, max_distance=max_distance)
+
+        # sensors and boundaries are in the space too, so filter to our bodies
+        hits = [
+            info
+            for info in self.space.point_query(point, max_distance, pymunk.ShapeFilter())
+            if info.shape is not None and info.shape.body in self.body_index
+        ]
+
+        if not hits:
+            return None
+
+        closest = min(hits, key=lambda info: info.distance)
+
+        return self.body_index[closest.shape.body]
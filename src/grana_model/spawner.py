@@ -1,9 +1,9 @@
-from pyglet.graphics import Batch
 from pymunk.space import Space
 from .psiistructure import PSIIStructure
 from .particle import Particle
 from .objectdata import ObjectData
 from random import random
+import csv
 from math import cos, sin, pi
 
 
@@ -16,7 +16,7 @@ class Spawner:
         object_data: ObjectData,
         shape_type: str,
         space: Space,
-        batch: Batch,
+        batch: "pyglet.graphics.Batch",
         structure_dict: dict,
         spawn_type: int = 0,
         num_particles: int = 1000,
@@ -24,12 +24,13 @@ class Spawner:
         num_lhcii: int = 0,
         use_sprites: bool = True,
         section: tuple = (100, 100, 100, 100),  # x, y, width, height
-        circle_radius: int = 1 # if using shape_type = "circle", this is the circle radius
-    
+        circle_radius: int = 1, # if using shape_type = "circle", this is the circle radius
+        initial_scale: float = 1.0,  # spawn shapes scaled down, for a GrowthProtocol
     ):
      
         self.structure_dict = structure_dict
         self.circle_radius = circle_radius
+        self.initial_scale = initial_scale
         self.object_data = object_data
         self.num_psii = num_psii
         self.num_particles = num_particles
@@ -162,7 +163,8 @@ class Spawner:
                     angle=self.random_angle(),
                     use_sprites=self.use_sprites,
                     structure_dict = self.structure_dict["LHCII"],
-                    circle_radius  = self.circle_radius
+                    circle_radius  = self.circle_radius,
+                    scale=self.initial_scale,
                 )
                 for _ in range(0, int(self.ratio_free_LHC * self.num_psii))
             ]
@@ -177,12 +179,35 @@ class Spawner:
                     pos=self.random_pos_in_section(),
                     angle=self.random_angle(),
                     use_sprites=self.use_sprites,
-                    structure_dict = self.structure_dict["LHCII"]
+                    structure_dict = self.structure_dict["LHCII"],
+                    scale=self.initial_scale,
                 )
                 for _ in range(0, self.num_lhcii)
             ]
             return lhcii_list
 
+    def spawn_lhcii_from_csv(self, filename: str):
+        """spawns LHCII objects at the positions and angles of a coordinate export,
+        ie to continue from a relaxed configuration"""
+        with open(filename, newline="") as f:
+            rows = [row for row in csv.DictReader(f) if row["type"] == "LHCII"]
+
+        lhcii_list = [
+            PSIIStructure(
+                self.space,
+                self.object_data.type_dict["LHCII"],
+                self.batch,
+                self.shape_type,
+                pos=(float(row["x"]), float(row["y"])),
+                angle=float(row["angle"]),
+                use_sprites=self.use_sprites,
+                structure_dict = self.structure_dict["LHCII"],
+                scale=self.initial_scale,
+            )
+            for row in rows
+        ]
+        return lhcii_list
+
     def spawn_cytb6f(self):
         """spawns cytb6f objects into the simulation space"""
         cytb6f_list = [
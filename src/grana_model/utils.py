@@ -3,6 +3,7 @@ functions to help out that don't really have any particular class they should be
 """
 
 from random import random
+from math import cos, sin, pi
 
 
 def pos_in_circle(origin: tuple, radius: float):
@@ -20,4 +21,62 @@ def rand_angle(degree_range: float) -> float:
     """ takes a max degree shift, and returns a random angle within the range +/- half
          the provided degree_range, converted to radians. 
     """
-    return (random() * 2 - 1) * (0.5 * degree_range) * 0.0174533
\ No newline at end of file
+    return (random() * 2 - 1) * (0.5 * degree_range) * 0.0174533
+
+def parse_circle_shape_type(shape_type: str):
+    """ splits a circle approximation shape type such as 'lhcii_circle_3.75_94' into
+        its structure, radius and number of points. returns None for other shape types.
+    """
+    parts = shape_type.split("_")
+
+    if len(parts) != 4 or parts[1] != "circle":
+        return None
+
+    structure, _, r, n = parts
+
+    try:
+        return structure, float(r), int(n)
+    except ValueError:
+        return None
+
+
+def circle_descriptor(shape_type: str):
+    """ parses a native circle shape type into a list of (radius, (x, y)) circles in
+        body coordinates. returns None for other shape types. Formats:
+        '<structure>_disk_<r>': a single circle of radius r on the body center
+        '<structure>_disks_<r>_<k>_<d>': k circles of radius r, evenly spaced on a ring
+            of radius d around the body center (k=3 for the LHCII trimer)
+    """
+    parts = shape_type.split("_")
+
+    try:
+        if len(parts) == 3 and parts[1] == "disk":
+            return [(float(parts[2]), (0.0, 0.0))]
+
+        if len(parts) == 5 and parts[1] == "disks":
+            r, k, d = float(parts[2]), int(parts[3]), float(parts[4])
+            return [
+                (r, (d * cos(2 * pi * i / k), d * sin(2 * pi * i / k)))
+                for i in range(k)
+            ]
+    except ValueError:
+        return None
+
+    return None
+
+
+def get_disk_radius(shape_type: str):
+    """ returns the radius if the shape type is a single disk, either a polygonized
+        circle ('lhcii_circle_3.75_94') or a native one ('lhcii_disk_3.75'), else None
+    """
+    parsed = parse_circle_shape_type(shape_type)
+
+    if parsed is not None:
+        return parsed[1]
+
+    circles = circle_descriptor(shape_type)
+
+    if circles is not None and len(circles) == 1 and circles[0][1] == (0.0, 0.0):
+        return circles[0][0]
+
+    return None
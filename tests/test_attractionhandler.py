@@ -0,0 +1,197 @@
+import itertools
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+import pymunk
+from pymunk import Vec2d
+
+from grana_model.attractionhandler import AttractionHandler
+from grana_model.objectdata import ObjectData
+from grana_model.psiistructure import (
+    V_SCALAR,
+    LinearScaledMagnitude,
+    PSIIStructure,
+    WellMagnitude,
+)
+
+STRUCTURE_DICT = {
+    "d": 1.8e-9,
+    "d_rot": 2e3,
+    "simulation_limit": 1000,
+    "distance_scalar": "well",
+    "diffusion_scalar": 1.22e3,
+    "distance_threshold": 50.0,
+    "mass": 1.0e3,
+    "mass_scalar": 1.0,
+    "rotation_scalar": 1.785e-3,
+    "time_per_step": 2,
+    "average_step_over": 250,
+    "calibrate_rot_d": False,
+    "calibrate_diff_d": False,
+}
+
+
+class Structure:
+    """stand in for PSIIStructure, with one attraction point"""
+
+    def __init__(self, position, distance_magnitude=WellMagnitude(100.0)):
+        self.body = pymunk.Body()
+        self.body.position = tuple(position)
+        self.active = True
+        self.vector_list = []
+        self.distance_magnitude = distance_magnitude
+        self.attraction_points = {"p1": SimpleNamespace(offset_coords=(1.0, 0.0))}
+
+    def get_attraction_points(self):
+        return list(self.attraction_points.values())
+
+
+def brute_force_pairs(object_list, distance):
+    return {
+        (i, j)
+        for (i, o1), (j, o2) in itertools.combinations(enumerate(object_list), 2)
+        if o1.body.position.get_distance(o2.body.position) < distance
+    }
+
+
+class TestAttractionHandler(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(1)
+        self.object_list = [
+            Structure(p) for p in self.rng.uniform(0, 200, size=(150, 2))
+        ]
+        self.handler = AttractionHandler(distance_threshold=20.0, skin=4.0)
+
+    def get_pairs(self):
+        return {tuple(p) for p in self.handler.get_neighbour_pairs(self.object_list)}
+
+    def test_matches_brute_force_while_moving(self):
+        for _ in range(50):
+            for o in self.object_list:
+                o.body.position += tuple(self.rng.normal(0, 0.5, size=2))
+
+            self.assertEqual(
+                self.get_pairs(), brute_force_pairs(self.object_list, 20.0)
+            )
+
+        self.assertEqual(self.handler.update_count, 50)
+        self.assertLess(self.handler.rebuild_count, 50)
+        self.assertGreater(self.handler.rebuild_count, 1)
+
+    def test_rebuilds_only_past_half_skin(self):
+        self.get_pairs()
+        self.object_list[0].body.position += (1.9, 0)
+        self.get_pairs()
+        self.assertEqual(self.handler.rebuild_count, 1)
+
+        self.object_list[0].body.position += (0.2, 0)
+        self.get_pairs()
+        self.assertEqual(self.handler.rebuild_count, 2)
+        self.assertAlmostEqual(self.handler.rebuild_frequency, 2 / 3)
+
+    def test_rebuilds_when_objects_change(self):
+        self.get_pairs()
+        self.object_list.pop()
+        self.get_pairs()
+        self.assertEqual(self.handler.rebuild_count, 2)
+
+    def test_attraction_both_ways(self):
+        object_list = [Structure((0, 0)), Structure((10, 0)), Structure((50, 0))]
+        object_list[2].distance_magnitude = LinearScaledMagnitude(100.0)
+        self.handler.calculate_attraction_forces(object_list)
+
+        self.assertEqual(object_list[0].vector_list, [Vec2d(V_SCALAR, 0)])
+        self.assertEqual(object_list[1].vector_list, [Vec2d(-V_SCALAR, 0)])
+        self.assertEqual(object_list[2].vector_list, [])
+        self.assertEqual(self.handler.pair_count, 1)
+
+    def test_inactive_objects_not_attracted(self):
+        object_list = [Structure((0, 0)), Structure((10, 0))]
+        object_list[0].active = False
+        self.handler.calculate_attraction_forces(object_list)
+
+        self.assertEqual(object_list[0].vector_list, [])
+        self.assertEqual(len(object_list[1].vector_list), 1)
+
+
+class TestAttractionPointCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.object_data = ObjectData(pos_csv_filename="082620_SEM_final_coordinates.csv")
+
+    def setUp(self):
+        space = pymunk.Space()
+        self.object_list = [
+            PSIIStructure(
+                space,
+                self.object_data.type_dict["LHCII"],
+                None,
+                "simple",
+                pos=(200 + 20 * i, 250),
+                angle=0.7 * i,
+                structure_dict=STRUCTURE_DICT,
+                use_sprites=False,
+            )
+            for i in range(4)
+        ]
+        self.handler = AttractionHandler()
+
+    def test_matches_rotated_offsets(self):
+        coords = self.handler.get_point_coords(self.object_list)
+        self.assertEqual(coords.shape, (4, 6, 2))
+
+        for o, rows in zip(self.object_list, coords):
+            for p, (x, y) in zip(o.get_attraction_points(), rows):
+                expected = o.body.position + Vec2d(*p.offset_coords).rotated(o.body.angle)
+                self.assertAlmostEqual(x, expected.x)
+                self.assertAlmostEqual(y, expected.y)
+
+    def test_computed_once_while_bodies_stand_still(self):
+        coords = self.handler.get_point_coords(self.object_list)
+        point = self.object_list[1].attraction_points["s2"]
+        cached = point.get_world_coords()
+
+        self.assertIs(self.handler.get_point_coords(self.object_list), coords)
+        self.assertEqual(point.get_world_coords(), cached)
+        self.assertEqual(self.handler.get_points_to_draw(self.object_list).shape, (24, 2))
+
+    def test_follows_moved_bodies(self):
+        coords = self.handler.get_point_coords(self.object_list).copy()
+        point = self.object_list[1].attraction_points["s2"]
+        cached = point.get_world_coords()
+
+        # ie an OverlapAgent action or a periodic wrap, within the same step
+        self.object_list[1].body.position += (5, 0)
+
+        # computed directly while the row is stale, and served again once rebuilt
+        self.assertAlmostEqual(point.get_world_coords().x, cached.x + 5)
+        moved = self.handler.get_point_coords(self.object_list)
+        np.testing.assert_allclose(moved[1, :, 0], coords[1, :, 0] + 5)
+        np.testing.assert_allclose(moved[[0, 2, 3]], coords[[0, 2, 3]])
+        self.assertAlmostEqual(point.get_world_coords().x, cached.x + 5)
+
+        self.object_list[2].body.angle += 0.5
+        rotated = self.handler.get_point_coords(self.object_list)
+        self.assertFalse(np.allclose(rotated[2], coords[2]))
+
+    def test_batched_forces_match_point_pairs(self):
+        self.handler.calculate_attraction_forces(self.object_list)
+
+        for o1 in self.object_list:
+            # the original loop, every point toward every point of every other object
+            expected = Vec2d(0, 0)
+
+            for o2 in self.object_list:
+                if o2 is not o1:
+                    for p1 in o1.get_attraction_points():
+                        for p2 in o2.get_attraction_points():
+                            expected += p1.calc_vector(p2.get_world_coords())
+
+            (vector,) = o1.vector_list
+            self.assertAlmostEqual(vector.x, expected.x)
+            self.assertAlmostEqual(vector.y, expected.y)
+
+
+if __name__ == "__main__":
+    unittest.main()
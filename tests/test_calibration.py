@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+
+import pymunk
+
+from grana_model.calibration import CalibrationSolver, CalibrationTable
+from grana_model.objectdata import ObjectData
+from grana_model.psiistructure import PSIIStructure
+
+STRUCTURE_DICT = {
+    "d": 1.8e-9,
+    "d_rot": 2e3,
+    "simulation_limit": 1000,
+    "distance_scalar": "well",
+    "diffusion_scalar": 1.22e3,
+    "distance_threshold": 50.0,
+    "mass": 1.0e3,
+    "mass_scalar": 1.0,
+    "rotation_scalar": 1.785e-3,
+    "time_per_step": 2,
+    "average_step_over": 250,
+    "calibrate_rot_d": False,
+    "calibrate_diff_d": False,
+}
+
+ENTRY = {
+    "diffusion_scalar": 11.0,
+    "rotation_scalar": 1.5e-3,
+    "d": 1.8e-9,
+    "d_rot": 2e3,
+    "time_per_step": 2,
+}
+
+
+class TestCalibrationTable(unittest.TestCase):
+    def test_save_and_lookup(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "table.json")
+            table = CalibrationTable(filename)
+            table.add("LHCII", 1.0e3, "simple", 0.01666667, 0.9, ENTRY)
+            table.save()
+
+            table = CalibrationTable(filename)
+            self.assertEqual(
+                table.lookup("LHCII", 1000, "simple", 0.01666667, 0.9), ENTRY
+            )
+            self.assertIsNone(table.lookup("LHCII", 1000, "complex", 0.01666667, 0.9))
+
+    def test_stale_targets_are_skipped(self):
+        table = CalibrationTable(os.path.join(tempfile.gettempdir(), "missing.json"))
+        table.add("LHCII", 1.0e3, "simple", 0.01666667, 0.9, ENTRY)
+
+        args = ("LHCII", 1.0e3, "simple", 0.01666667, 0.9)
+        self.assertEqual(table.lookup(*args, structure_dict=STRUCTURE_DICT), ENTRY)
+        self.assertIsNone(
+            table.lookup(*args, structure_dict={**STRUCTURE_DICT, "d": 1e-9})
+        )
+
+
+class TestCalibrationSolver(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.object_data = ObjectData(pos_csv_filename="082620_SEM_final_coordinates.csv")
+
+    def test_solve_power_law(self):
+        scalar = CalibrationSolver.solve_power_law([1.0, 2.0, 4.0], [3.0, 12.0, 48.0], 27.0)
+        self.assertAlmostEqual(scalar, 3.0)
+
+    def test_solution_reaches_targets(self):
+        solver = CalibrationSolver(
+            self.object_data.type_dict["LHCII"],
+            STRUCTURE_DICT,
+            num_bodies=60,
+            steps=300,
+            seed=1,
+        )
+        entry = solver.solve()
+
+        self.assertEqual(len(solver.trials), 4)
+        self.assertAlmostEqual(entry["measured_d"] / STRUCTURE_DICT["d"], 1.0, delta=0.3)
+        self.assertAlmostEqual(
+            entry["measured_d_rot"] / STRUCTURE_DICT["d_rot"], 1.0, delta=0.3
+        )
+
+    def test_structure_loads_table_at_spawn(self):
+        space = pymunk.Space()
+        space.damping = 0.9
+        table = CalibrationTable(os.path.join(tempfile.gettempdir(), "missing.json"))
+        table.add("LHCII", 1.0e3, "simple", 0.01666667, 0.9, ENTRY)
+
+        structure = PSIIStructure(
+            space,
+            self.object_data.type_dict["LHCII"],
+            None,
+            "simple",
+            pos=(250, 250),
+            angle=0.0,
+            structure_dict={**STRUCTURE_DICT, "calibration_table": table},
+            use_sprites=False,
+        )
+
+        self.assertEqual(structure.diffusion_scalar, 11.0)
+        self.assertEqual(structure.dcalibrator.rotation_scalar, 1.5e-3)
+
+
+if __name__ == "__main__":
+    unittest.main()
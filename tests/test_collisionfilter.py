@@ -0,0 +1,60 @@
+import unittest
+
+import pymunk
+
+from grana_model.collisionfilter import (
+    PARTICLE,
+    STRUCTURE,
+    CollisionFilters,
+    count_candidate_pairs,
+)
+
+
+class Structure:
+    def __init__(self, space, position):
+        self.body = pymunk.Body(mass=1.0, moment=1.0)
+        self.body.position = position
+        space.add(self.body, pymunk.Circle(self.body, radius=2.0))
+
+
+class Particle:
+    def __init__(self, space, position):
+        body = pymunk.Body(mass=1.0, moment=1.0)
+        body.position = position
+        self.shape = pymunk.Circle(body, radius=1.0)
+        space.add(body, self.shape)
+
+
+class TestCollisionFilters(unittest.TestCase):
+    def setUp(self) -> None:
+        self.space = pymunk.Space()
+        self.structures = [Structure(self.space, (0, 0)), Structure(self.space, (3, 0))]
+        self.particles = [Particle(self.space, (0, 2.5)), Particle(self.space, (30, 0))]
+
+        boundary_body = pymunk.Body(body_type=pymunk.Body.STATIC)
+        self.boundary = pymunk.Poly.create_box(boundary_body, (100, 100))
+        self.boundary.sensor = True
+        sensor_body = pymunk.Body(body_type=pymunk.Body.STATIC)
+        sensor = pymunk.Poly.create_box(sensor_body, (100, 100))
+        sensor.sensor = True
+        self.space.add(boundary_body, self.boundary, sensor_body, sensor)
+        self.sensor_body = sensor_body
+
+    def apply(self, filters: CollisionFilters):
+        filters.apply(self.structures, self.particles, [self.boundary], self.sensor_body)
+
+    def test_default_masks_drop_particle_boundary_pairs(self):
+        # 2 structures x (boundary, sensor), 2 particles x (boundary, sensor),
+        # structure-structure and the first particle with both structures
+        self.assertEqual(count_candidate_pairs(self.space), 11)
+        self.apply(CollisionFilters())
+        self.assertEqual(count_candidate_pairs(self.space, use_filters=False), 11)
+        self.assertEqual(count_candidate_pairs(self.space), 7)
+
+    def test_configurable_masks(self):
+        self.apply(CollisionFilters(masks={"structure": STRUCTURE, "particle": PARTICLE}))
+        self.assertEqual(count_candidate_pairs(self.space), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import csv
+import os
+import tempfile
+import unittest
+
+import pymunk
+
+from grana_model.convergencemonitor import ConvergenceMonitor
+
+
+class Structure:
+    def __init__(self, position):
+        self.body = pymunk.Body(mass=1.0, moment=1.0)
+        self.body.position = position
+
+
+class TestConvergenceMonitor(unittest.TestCase):
+    def test_converged(self):
+        monitor = ConvergenceMonitor(target_overlap=5.0)
+        self.assertFalse(monitor.update(10.0))
+        self.assertTrue(monitor.update(4.0))
+        self.assertEqual(monitor.stop_reason, "converged")
+
+    def test_stalled(self):
+        monitor = ConvergenceMonitor(window=4, min_improvement=0.01)
+
+        for overlap in [100.0, 50.0, 25.0]:
+            self.assertFalse(monitor.update(overlap))
+
+        # still improving across the window
+        self.assertFalse(monitor.update(12.0))
+
+        for _ in range(3):
+            monitor.update(12.0)
+
+        self.assertEqual(monitor.stop_reason, "stalled")
+        self.assertEqual(monitor.steps, 7)
+
+    def test_moving_structures_do_not_stall(self):
+        structure = Structure((0, 0))
+        monitor = ConvergenceMonitor(window=2, settle_distance=0.5)
+        monitor.start([structure])
+
+        for x in range(1, 5):
+            structure.body.position = (x, 0)
+            self.assertFalse(monitor.update(10.0))
+
+        for _ in range(2):
+            monitor.update(10.0)
+
+        self.assertEqual(monitor.stop_reason, "stalled")
+
+    def test_budgets(self):
+        monitor = ConvergenceMonitor(max_steps=3)
+        self.assertFalse(monitor.update(10.0))
+        self.assertFalse(monitor.update(9.0))
+        self.assertTrue(monitor.update(8.0))
+        self.assertEqual(monitor.stop_reason, "max_steps")
+
+        monitor = ConvergenceMonitor(max_actions=1500)
+        self.assertFalse(monitor.update(10.0, actions=1000))
+        self.assertTrue(monitor.update(9.0, actions=1000))
+        self.assertEqual(monitor.stop_reason, "max_actions")
+
+        monitor = ConvergenceMonitor(max_seconds=0.0)
+        self.assertTrue(monitor.update(10.0))
+        self.assertEqual(monitor.stop_reason, "max_seconds")
+
+    def test_export_history(self):
+        monitor = ConvergenceMonitor(target_overlap=5.0)
+        monitor.update(10.0)
+        monitor.update(4.0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "history.csv")
+            monitor.export_history(filename)
+
+            with open(filename) as f:
+                rows = list(csv.DictReader(f))
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["stop_reason"], "")
+        self.assertEqual(rows[1]["stop_reason"], "converged")
+
+    def test_export_creates_the_directory(self):
+        monitor = ConvergenceMonitor(target_overlap=5.0)
+        monitor.update(4.0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "lhcii_export_coords", "history.csv")
+            monitor.export_history(filename)
+
+            self.assertTrue(os.path.exists(filename))
+
+
+if __name__ == "__main__":
+    unittest.main()
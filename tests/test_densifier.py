@@ -0,0 +1,149 @@
+import os
+import random
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+import pymunk
+
+from grana_model.collisionhandler import CollisionHandler
+from grana_model.densifier import Densifier, FreeSpaceIndex
+from grana_model.objectdata import ObjectData
+from grana_model.psiistructure import PSIIStructure
+
+STRUCTURE_DICT = {
+    "d": 1.8e-9,
+    "d_rot": 2e3,
+    "simulation_limit": 1000,
+    "distance_scalar": "well",
+    "diffusion_scalar": 1.22e3,
+    "distance_threshold": 50.0,
+    "mass": 1.0e3,
+    "mass_scalar": 1.0,
+    "rotation_scalar": 1.785e-3,
+    "time_per_step": 2,
+    "average_step_over": 250,
+    "calibrate_rot_d": False,
+    "calibrate_diff_d": False,
+}
+
+
+class TestFreeSpaceIndex(unittest.TestCase):
+    def create_index(self) -> FreeSpaceIndex:
+        space = pymunk.Space()
+        body = pymunk.Body(body_type=pymunk.Body.STATIC)
+        body.position = (220, 220)
+        circle = pymunk.Circle(body, radius=5)
+        circle.collision_type = 1
+        space.add(body, circle)
+
+        return FreeSpaceIndex(
+            space, section=(200, 200, 40, 40), resolution=2.0, max_clearance=50.0
+        )
+
+    def test_clearance_around_structure(self):
+        index = self.create_index()
+        d = np.linalg.norm(index.points - (220, 220), axis=1) - 5
+        expected = np.minimum(d, index.edge_clearance)
+        np.testing.assert_allclose(index.clearance, expected, atol=1e-6)
+
+    def test_largest_free_point_avoids_structure(self):
+        index = self.create_index()
+        point, clearance = index.largest_free_point()
+        self.assertGreater(np.linalg.norm(np.subtract(point, (220, 220))), 5 + clearance - 1e-6)
+
+    def test_insert_lowers_clearance(self):
+        index = self.create_index()
+        point, clearance = index.largest_free_point()
+        index.insert(point, radius=clearance)
+        i = int(np.argmin(np.linalg.norm(index.points - point, axis=1)))
+        self.assertLessEqual(index.clearance[i], -clearance + 1e-6)
+
+
+class TestDensifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.object_data = ObjectData(pos_csv_filename="082620_SEM_final_coordinates.csv")
+
+    def setUp(self):
+        random.seed(2)
+        self.space = pymunk.Space()
+        self.overlap_handler = CollisionHandler(self.space)
+        self.spawner = SimpleNamespace(
+            object_data=self.object_data,
+            batch=None,
+            shape_type="simple",
+            use_sprites=False,
+            structure_dict={"LHCII": STRUCTURE_DICT},
+            section=(200, 200, 60, 60),
+            random_angle=lambda: 2 * np.pi * random.random(),
+        )
+        # two PSII and three LHCII, apart from each other
+        self.object_list = [
+            self.create_structure(obj_type, pos)
+            for obj_type, pos in [
+                ("C2S2", (215, 215)),
+                ("C2S2", (245, 245)),
+                ("LHCII", (215, 245)),
+                ("LHCII", (245, 215)),
+                ("LHCII", (230, 230)),
+            ]
+        ]
+
+    def create_structure(self, obj_type: str, pos: tuple) -> PSIIStructure:
+        return PSIIStructure(
+            self.space,
+            self.object_data.type_dict[obj_type],
+            None,
+            "simple",
+            pos=pos,
+            angle=0.0,
+            structure_dict=STRUCTURE_DICT,
+            use_sprites=False,
+        )
+
+    def create_densifier(self, levels: list) -> Densifier:
+        return Densifier(
+            self.spawner,
+            self.space,
+            self.overlap_handler,
+            self.object_list,
+            levels=levels,
+            relax_steps=50,
+        )
+
+    def test_inserted_structure_has_no_overlap(self):
+        densifier = self.create_densifier(levels=[4])
+        (structure,) = densifier.insert_lhcii(1)
+
+        for shape in structure.shape_list:
+            for info in self.space.shape_query(shape):
+                if info.shape.body is structure.body:
+                    continue
+
+                for point in info.contact_point_set.points:
+                    self.assertGreaterEqual(point.distance, -1e-6)
+
+    def test_levels_count_lhcii_only(self):
+        densifier = self.create_densifier(levels=[3, 6])
+
+        with tempfile.TemporaryDirectory() as directory:
+            cwd = os.getcwd()
+            os.chdir(directory)
+
+            try:
+                report = densifier.run(export=True)
+                exported = os.path.exists(densifier.get_export_filename(6))
+            finally:
+                os.chdir(cwd)
+
+        self.assertTrue(exported)
+        self.assertEqual(densifier.get_num_lhcii(), 6)
+        self.assertEqual(len(self.object_list), 8)
+        self.assertEqual([row[0] for row in report], [3, 6])
+        self.assertEqual(report[0][3], "done")
+
+
+if __name__ == "__main__":
+    unittest.main()
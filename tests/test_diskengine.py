@@ -0,0 +1,93 @@
+import csv
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from grana_model.diskengine import DiskEngine
+from grana_model.utils import (
+    circle_descriptor,
+    get_disk_radius,
+    parse_circle_shape_type,
+)
+
+
+class TestDiskEngine(unittest.TestCase):
+    def create_engine(self, num_disks=100) -> DiskEngine:
+        return DiskEngine.from_shape_type(
+            "lhcii_circle_3.75_94", num_disks=num_disks, seed=3
+        )
+
+    def test_parse_circle_shape_type(self):
+        self.assertEqual(
+            parse_circle_shape_type("lhcii_circle_4.5_64"), ("lhcii", 4.5, 64)
+        )
+        self.assertIsNone(parse_circle_shape_type("simple"))
+
+    def test_circle_descriptor(self):
+        self.assertEqual(circle_descriptor("lhcii_disk_4.5"), [(4.5, (0.0, 0.0))])
+        trimer = circle_descriptor("lhcii_disks_2.2_3_2.0")
+        self.assertEqual(len(trimer), 3)
+        for radius, (x, y) in trimer:
+            self.assertEqual(radius, 2.2)
+            self.assertAlmostEqual(np.hypot(x, y), 2.0)
+        self.assertIsNone(circle_descriptor("lhcii_circle_3.75_94"))
+
+    def test_disk_radius(self):
+        self.assertEqual(get_disk_radius("lhcii_disk_4.5"), 4.5)
+        self.assertEqual(get_disk_radius("lhcii_circle_3.75_94"), 3.75)
+        self.assertIsNone(get_disk_radius("lhcii_disks_2.2_3_2.0"))
+
+    def test_radius_from_shape_type(self):
+        engine = self.create_engine()
+        self.assertTrue(np.all(engine.radii == 3.75))
+
+    def test_non_circle_shape_type(self):
+        with self.assertRaises(ValueError):
+            DiskEngine.from_shape_type("complex", num_disks=10)
+
+    def test_overlap_pairs_match_brute_force(self):
+        engine = self.create_engine()
+        i, j, depth = engine.overlapping_pairs()
+        diff = engine.centers[:, None, :] - engine.centers[None, :, :]
+        overlap = np.triu(np.linalg.norm(diff, axis=2) < 7.5, k=1)
+        self.assertEqual(len(depth), int(overlap.sum()))
+
+    def test_overlap_reduction(self):
+        engine = self.create_engine()
+        overlap_begin = engine.get_overlap_distance()
+        engine.run(max_steps=200)
+        self.assertLess(engine.overlap_history[-1], 0.01 * overlap_begin)
+
+    def test_disks_stay_in_section(self):
+        engine = self.create_engine()
+        engine.run(max_steps=50)
+        x, y, width, height = engine.section
+        self.assertTrue(np.all(engine.centers[:, 0] >= x))
+        self.assertTrue(np.all(engine.centers[:, 0] <= x + width))
+        self.assertTrue(np.all(engine.centers[:, 1] >= y))
+        self.assertTrue(np.all(engine.centers[:, 1] <= y + height))
+
+    def test_export_format(self):
+        engine = self.create_engine(num_disks=10)
+        filename = os.path.join(tempfile.mkdtemp(), "coords.csv")
+        engine.export_coordinates(filename)
+
+        with open(filename, newline="") as f:
+            rows = list(csv.reader(f))
+
+        self.assertEqual(rows[0], ["type", "x", "y", "angle", "area"])
+        self.assertEqual(len(rows), 11)
+        self.assertAlmostEqual(float(rows[1][4]), np.pi * 3.75**2)
+
+    def test_export_creates_the_directory(self):
+        engine = self.create_engine(num_disks=10)
+        filename = os.path.join(tempfile.mkdtemp(), "lhcii_export_coords", "coords.csv")
+        engine.export_coordinates(filename)
+
+        self.assertTrue(os.path.exists(filename))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import csv
+import os
+import random
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from grana_model.ensemblerunner import RESULT_COLUMNS, EnsembleRunner
+
+
+class Replica:
+    """stand in for SimulationEnvironment, stops after step_limit steps"""
+
+    def __init__(self, num_lhcii, step_limit, seed):
+        self.obstacle_list = [random.random() for _ in range(num_lhcii)]
+        self.step_limit = step_limit
+        self.steps = 0
+        self.active = True
+        self.overlap_handler = SimpleNamespace(overlap_distance=100.0)
+        self.convergence = None
+
+    def step(self):
+        self.steps += 1
+        self.overlap_handler.overlap_distance /= 2
+        self.active = self.steps < self.step_limit
+
+    def get_ensemble_area(self):
+        return {"internal_area": len(self.obstacle_list), "ensemble_area": 100.0}
+
+
+class TestEnsembleRunner(unittest.TestCase):
+    def setUp(self):
+        self.replicas = [
+            {"num_lhcii": 70, "step_limit": 5, "seed": 1},
+            {"num_lhcii": 150, "step_limit": 3, "seed": 2},
+            {"num_lhcii": 70, "step_limit": 5, "seed": 1},
+        ]
+        self.runner = EnsembleRunner(Replica, self.replicas)
+
+    def test_replicas_run_to_their_own_limits(self):
+        results = self.runner.run()
+
+        self.assertEqual([row["replica"] for row in results], [0, 1, 2])
+        self.assertEqual([row["steps"] for row in results], [5, 3, 5])
+        self.assertEqual(self.runner.rounds, 5)
+        self.assertEqual(results[1]["num_structures"], 150)
+        self.assertAlmostEqual(results[1]["density"], 1.5)
+        self.assertAlmostEqual(results[0]["overlap"], 100.0 / 2**5)
+        self.assertEqual(results[0]["stop_reason"], "step_limit")
+
+    def test_spawn_is_seeded(self):
+        self.runner.run()
+        envs = self.runner.envs
+
+        self.assertEqual(envs[0].obstacle_list, envs[2].obstacle_list)
+        self.assertNotEqual(envs[0].obstacle_list[:70], envs[1].obstacle_list[:70])
+
+    def test_max_rounds(self):
+        runner = EnsembleRunner(Replica, self.replicas, max_rounds=2)
+        results = runner.run()
+
+        self.assertEqual([row["steps"] for row in results], [2, 2, 2])
+        self.assertEqual({row["stop_reason"] for row in results}, {"max_rounds"})
+
+    def test_export(self):
+        self.runner.run()
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "results.csv")
+            self.runner.export_results(filename)
+
+            with open(filename, newline="") as f:
+                reader = csv.DictReader(f)
+                rows = list(reader)
+
+        self.assertEqual(reader.fieldnames, RESULT_COLUMNS + ["num_lhcii", "step_limit"])
+        self.assertEqual(len(rows), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+
+import pymunk
+
+from grana_model.growthprotocol import GrowthProtocol
+from grana_model.objectdata import ObjectData
+from grana_model.psiistructure import PSIIStructure
+
+STRUCTURE_DICT = {
+    "d": 1.8e-9,
+    "d_rot": 2e3,
+    "simulation_limit": 1000,
+    "distance_scalar": "well",
+    "diffusion_scalar": 1.22e3,
+    "distance_threshold": 50.0,
+    "mass": 1.0e3,
+    "mass_scalar": 1.0,
+    "rotation_scalar": 1.785e-3,
+    "time_per_step": 2,
+    "average_step_over": 250,
+    "calibrate_rot_d": False,
+    "calibrate_diff_d": False,
+}
+
+
+class ScaledObject:
+    def __init__(self):
+        self.scale = 1.0
+
+    def set_scale(self, scale):
+        self.scale = scale
+
+
+class TestGrowthProtocol(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.object_data = ObjectData(pos_csv_filename="082620_SEM_final_coordinates.csv")
+
+    def create_structure(self, shape_type="simple", scale=1.0) -> PSIIStructure:
+        return PSIIStructure(
+            pymunk.Space(),
+            self.object_data.type_dict["LHCII"],
+            None,
+            shape_type,
+            pos=(250, 250),
+            angle=0.0,
+            structure_dict=STRUCTURE_DICT,
+            use_sprites=False,
+            scale=scale,
+        )
+
+    def test_set_scale_area(self):
+        structure = self.create_structure()
+        full_area = structure.area
+        structure.set_scale(0.5)
+        self.assertAlmostEqual(structure.area, 0.25 * full_area)
+        structure.set_scale(1.0)
+        self.assertAlmostEqual(structure.area, full_area)
+
+    def test_scale_kept_when_swapping_shapes(self):
+        structure = self.create_structure(scale=0.5)
+        structure.set_shapes("lhcii_disk_4.0")
+        self.assertAlmostEqual(structure.shape_list[0].radius, 2.0)
+
+    def test_grows_to_full_size(self):
+        objects = [ScaledObject() for _ in range(3)]
+        growth = GrowthProtocol(initial_scale=0.5, growth_rate=0.1, relax_steps=2)
+        growth.start(objects)
+        self.assertEqual(objects[0].scale, 0.5)
+
+        while not growth.finished:
+            growth.update(overlap_distance=0.0, contacts=0)
+
+        self.assertEqual(growth.status, "done")
+        self.assertTrue(all(o.scale == 1.0 for o in objects))
+
+    def test_pauses_and_jams_on_overlap(self):
+        objects = [ScaledObject()]
+        growth = GrowthProtocol(initial_scale=0.5, max_stall_steps=3)
+        growth.start(objects)
+
+        for _ in range(3):
+            growth.update(overlap_distance=10.0, contacts=10)
+
+        self.assertEqual(growth.status, "jammed")
+        self.assertEqual(objects[0].scale, 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
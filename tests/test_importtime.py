@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# seconds the core engine may take to import in a fresh interpreter
+IMPORT_BUDGET = 0.5
+
+CORE_MODULES = [
+    "grana_model.simulationenv",
+    "grana_model.spawner",
+    "grana_model.objectdata",
+    "grana_model.psiistructure",
+    "grana_model.attractionhandler",
+    "grana_model.collisionhandler",
+    "grana_model.densityhandler",
+]
+
+# only loaded on the code paths that need them, ie CSV import or the gui
+HEAVY_MODULES = ["pandas", "sklearn", "pyparsing", "distutils", "pyglet.gl"]
+
+SCRIPT = f"""
+import importlib, json, sys, time
+start = time.perf_counter()
+for name in {CORE_MODULES!r}:
+    importlib.import_module(name)
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": seconds,
+    "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+class TestImportTime(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        # a fresh interpreter, so nothing is imported already
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run(
+            [sys.executable, "-c", SCRIPT],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        cls.result = json.loads(output.strip().splitlines()[-1])
+
+    def test_no_heavy_modules(self):
+        self.assertEqual(self.result["loaded"], [])
+
+    def test_import_budget(self):
+        self.assertLess(self.result["seconds"], IMPORT_BUDGET)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import random
+import unittest
+
+import numpy as np
+import pymunk
+
+from grana_model.collisionhandler import CollisionHandler
+from grana_model.lodmanager import LODManager
+from grana_model.objectdata import ObjectData
+
+# the class the OverlapAgent checks its objects against
+from grana_model.overlapagent import OverlapAgent, PSIIStructure
+
+STRUCTURE_DICT = {
+    "d": 1.8e-9,
+    "d_rot": 2e3,
+    "simulation_limit": 1000,
+    "distance_scalar": "well",
+    "diffusion_scalar": 1.22e3,
+    "distance_threshold": 50.0,
+    "mass": 1.0e3,
+    "mass_scalar": 1.0,
+    "rotation_scalar": 1.785e-3,
+    "time_per_step": 2,
+    "average_step_over": 250,
+    "calibrate_rot_d": False,
+    "calibrate_diff_d": False,
+}
+
+OBJECT_DATA = ObjectData(pos_csv_filename="082620_SEM_final_coordinates.csv")
+
+
+class TestLODManager(unittest.TestCase):
+    def setUp(self):
+        random.seed(4)
+        self.space = pymunk.Space()
+
+    def create_structure(self, pos: tuple, angle: float = 0.0) -> PSIIStructure:
+        return PSIIStructure(
+            self.space,
+            OBJECT_DATA.type_dict["LHCII"],
+            None,
+            "simple",
+            pos=pos,
+            angle=angle,
+            structure_dict=STRUCTURE_DICT,
+            use_sprites=False,
+        )
+
+    def place_at_gap(self, lod_manager: LODManager, a, b, gap: float):
+        """moves b to the right of a, with gap between their boxes"""
+        object_list = lod_manager.object_list
+        lower, upper = lod_manager.get_bounding_boxes(
+            np.zeros((len(object_list), 2)),
+            np.array([o.body.angle for o in object_list]),
+        )
+        i, j = object_list.index(a), object_list.index(b)
+        x = a.body.position.x + upper[i, 0] - lower[j, 0] + gap
+        b.body.position = (x, a.body.position.y)
+
+    def test_promote_and_demote_across_contact_distance(self):
+        a = self.create_structure((100, 100))
+        b = self.create_structure((150, 100))
+        lod_manager = LODManager([a, b], contact_distance=1.0)
+
+        self.place_at_gap(lod_manager, a, b, 0.5)
+        self.assertEqual(lod_manager.update(), 2)
+        self.assertEqual([a.shape_type, b.shape_type], ["complex", "complex"])
+
+        # between contact_distance and demote_distance, nothing changes
+        self.place_at_gap(lod_manager, a, b, 1.5)
+        self.assertEqual(lod_manager.update(), 0)
+        self.assertEqual([a.shape_type, b.shape_type], ["complex", "complex"])
+
+        self.place_at_gap(lod_manager, a, b, 2.5)
+        self.assertEqual(lod_manager.update(), 2)
+        self.assertEqual([a.shape_type, b.shape_type], ["simple", "simple"])
+
+        self.place_at_gap(lod_manager, a, b, 1.5)
+        self.assertEqual(lod_manager.update(), 0)
+        self.assertEqual((lod_manager.promotions, lod_manager.demotions), (2, 2))
+
+    def test_boxes_cover_the_complex_shapes(self):
+        structures = [
+            self.create_structure((100 + 20 * i, 100), angle=random.uniform(0, 6.28))
+            for i in range(20)
+        ]
+        lod_manager = LODManager(structures)
+        positions = np.array([tuple(o.body.position) for o in structures])
+        angles = np.array([o.body.angle for o in structures])
+        lower, upper = lod_manager.get_bounding_boxes(positions, angles)
+
+        for o, low, high in zip(structures, lower, upper):
+            for v in o.get_hull_vertices("complex"):
+                x, y = o.body.local_to_world(v)
+                self.assertTrue(low[0] - 1e-9 <= x <= high[0] + 1e-9)
+                self.assertTrue(low[1] - 1e-9 <= y <= high[1] + 1e-9)
+
+    def test_agent_measures_before_and_after_on_the_same_shapes(self):
+        structures = []
+        lod_manager = LODManager(structures, contact_distance=1.0)
+
+        for i in range(6):
+            structures.append(self.create_structure((100, 100)))
+
+            if i > 0:
+                lod_manager.refresh()
+                self.place_at_gap(lod_manager, structures[i - 1], structures[i], 1.0)
+
+        lod_manager.refresh()
+        agent = OverlapAgent(
+            self.space,
+            structures,
+            CollisionHandler(self.space),
+            lod_manager=lod_manager,
+        )
+
+        update_space = agent._update_space
+        events = []  # shape types of each overlap measurement, and the actions
+
+        def recording_update_space():
+            overlap = update_space()
+            events.append(tuple(o.shape_type for o in structures))
+            return overlap
+
+        def recording_action(action):
+            def wrapper(action_num):
+                events.append("action")
+                action(action_num)
+
+            return wrapper
+
+        agent._update_space = recording_update_space
+        for o in structures:
+            o.action = recording_action(o.action)
+
+        agent.overlap_distance = agent.get_current_overlap_distance()
+
+        for _ in range(100):
+            agent._call_object(random.choice(structures))
+
+        # the overlap before an action is compared with the one after it
+        actions = [i for i, event in enumerate(events) if event == "action"]
+        self.assertEqual(len(actions), 100)
+
+        for i in actions:
+            self.assertEqual(events[i - 1], events[i + 1])
+
+        self.assertGreater(lod_manager.promotions + lod_manager.demotions, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
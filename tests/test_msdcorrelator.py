@@ -0,0 +1,122 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+
+import numpy as np
+
+from grana_model.msdcorrelator import MultiTauMSD
+from grana_model.simulationenv import SimulationEnvironment
+
+
+class TestMultiTauMSD(unittest.TestCase):
+    def test_ballistic_motion_is_exact(self):
+        # constant velocity, so MSD(lag) = (v lag)^2 at every channel
+        correlator = MultiTauMSD(types=["LHCII", "LHCII"], time_per_step=1.0)
+        velocity = np.array([[0.5, 0.0], [0.0, -0.25]])
+
+        for step in range(1000):
+            correlator.update(velocity * step, np.full(2, 0.1 * step))
+
+        lags, msd = correlator.get_channels()
+        speed_squared = np.sum(velocity**2, axis=1)
+
+        np.testing.assert_allclose(msd[:, :, 0], np.outer(lags**2, speed_squared))
+        np.testing.assert_allclose(msd[:, :, 1], np.outer(lags**2, [0.01, 0.01]))
+
+    def test_logarithmic_lags(self):
+        correlator = MultiTauMSD(types=["LHCII"], p=16, m=2)
+
+        for step in range(4096):
+            correlator.update(np.array([[float(step), 0.0]]))
+
+        lags = correlator.lags
+        self.assertTrue(np.all(np.diff(lags) > 0))
+        self.assertEqual(lags[0], 1)
+        self.assertGreaterEqual(lags[-1], 2048)
+        # memory grows with the number of levels, log2 of the run length
+        self.assertLessEqual(correlator.levels, np.log2(4096) + 1)
+
+    def test_brownian_diffusion_coefficient(self):
+        # steps of sd sigma per axis, D = sigma^2 / 2 per step in 2D
+        rng = np.random.default_rng(0)
+        sigma = 0.5
+        correlator = MultiTauMSD(types=["LHCII"] * 200 + ["PSII"] * 10, time_per_step=2.0)
+        positions = np.zeros((210, 2))
+
+        for _ in range(500):
+            positions += rng.normal(scale=sigma, size=positions.shape)
+            correlator.update(positions)
+
+        d_nm2_ns = sigma**2 / 2 / 2.0
+        d = correlator.get_diffusion_coefficients(max_time=100)
+
+        self.assertEqual(set(d), {"LHCII", "PSII"})
+        self.assertAlmostEqual(d["LHCII"]["d"], d_nm2_ns * 1e-5, delta=0.1 * d_nm2_ns * 1e-5)
+        self.assertEqual(d["LHCII"]["d_rot"], 0.0)
+
+        targets = correlator.compare_to_targets(
+            {"LHCII": {"d": 1.8e-9, "d_rot": 2e3}}, max_time=100
+        )
+        self.assertEqual(set(targets), {"LHCII"})
+        self.assertEqual(targets["LHCII"]["target_d"], 1.8e-9)
+
+    def test_export_msd(self):
+        correlator = MultiTauMSD(types=["LHCII"])
+
+        for step in range(20):
+            correlator.update(np.array([[float(step), 0.0]]))
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "msd.csv")
+            correlator.export_msd(filename)
+
+            with open(filename) as f:
+                rows = list(csv.DictReader(f))
+
+        self.assertEqual(len(rows), len(correlator.lags))
+        self.assertEqual(float(rows[0]["msd_nm2"]), 1.0)
+
+    def test_export_msd_creates_the_directory(self):
+        correlator = MultiTauMSD(types=["LHCII"])
+        correlator.update(np.zeros((1, 2)))
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "lhcii_export_coords", "lhcii_msd.csv")
+            correlator.export_msd(filename)
+
+            self.assertTrue(os.path.exists(filename))
+
+
+class TestDiffusionReport(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, "lhcii_coords.csv")
+
+        # only the parts of the environment the exports use
+        self.env = SimulationEnvironment.__new__(SimulationEnvironment)
+        self.env.obstacle_list = []
+        self.env.msd_correlator = MultiTauMSD(types=[])
+        self.env.get_export_filename = lambda: self.filename
+        self.env.active = True
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_only_the_end_of_the_run_reports(self):
+        with mock.patch.object(SimulationEnvironment, "report_diffusion") as report:
+            # ie a worker or subset export while the run goes on
+            self.env.export_coordinates([], filename=self.filename)
+            report.assert_not_called()
+
+            self.env.finish_run()
+
+        report.assert_called_once_with(self.filename)
+        self.assertTrue(os.path.exists(self.filename))
+        self.assertFalse(self.env.active)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import random
+import unittest
+
+import numpy as np
+import pymunk
+
+from grana_model.collisionhandler import CollisionHandler
+from grana_model.objectdata import ObjectData
+
+# the class the OverlapAgent checks its objects against
+from grana_model.overlapagent import OverlapAgent, PSIIStructure
+from grana_model.periodicbox import PeriodicBox
+from grana_model.spatialindex import get_positions
+
+STRUCTURE_DICT = {
+    "d": 1.8e-9,
+    "d_rot": 2e3,
+    "simulation_limit": 1000,
+    "distance_scalar": "well",
+    "diffusion_scalar": 1.22e3,
+    "distance_threshold": 50.0,
+    "mass": 1.0e3,
+    "mass_scalar": 1.0,
+    "rotation_scalar": 1.785e-3,
+    "time_per_step": 2,
+    "average_step_over": 250,
+    "calibrate_rot_d": False,
+    "calibrate_diff_d": False,
+}
+
+OBJECT_DATA = ObjectData(pos_csv_filename="082620_SEM_final_coordinates.csv")
+
+
+def create_structures(space: pymunk.Space, positions: list) -> list:
+    return [
+        PSIIStructure(
+            space,
+            OBJECT_DATA.type_dict["LHCII"],
+            None,
+            "simple",
+            pos=pos,
+            angle=random.uniform(0, 6.28),
+            structure_dict=STRUCTURE_DICT,
+            use_sprites=False,
+        )
+        for pos in positions
+    ]
+
+
+class TestOverlapBatch(unittest.TestCase):
+    def setUp(self):
+        random.seed(5)
+        self.space = pymunk.Space()
+        self.collision_handler = CollisionHandler(self.space)
+
+    def create_agent(
+        self, object_list: list, batch_size: int, periodic_box: PeriodicBox = None
+    ) -> OverlapAgent:
+        return OverlapAgent(
+            self.space,
+            object_list,
+            self.collision_handler,
+            batch_size=batch_size,
+            periodic_box=periodic_box,
+        )
+
+    def create_periodic_box(self, object_list: list) -> PeriodicBox:
+        periodic_box = PeriodicBox(
+            self.space,
+            section=(100, 100, 60, 60),
+            collision_handler=self.collision_handler,
+        )
+        periodic_box.start(object_list)
+
+        return periodic_box
+
+    def test_body_overlap(self):
+        pair = create_structures(self.space, [(100, 100), (102, 100)])
+        far = create_structures(self.space, [(300, 300)])
+        self.collision_handler.track_bodies = True
+
+        self.collision_handler.reset_collision_count()
+        self.space.step(0.1)
+        body_overlap = self.collision_handler.body_overlap
+
+        self.assertGreater(self.collision_handler.overlap_distance, 0)
+        self.assertAlmostEqual(
+            body_overlap[pair[0].body], self.collision_handler.overlap_distance
+        )
+        self.assertAlmostEqual(
+            body_overlap[pair[1].body], self.collision_handler.overlap_distance
+        )
+        self.assertNotIn(far[0].body, body_overlap)
+
+        self.collision_handler.reset_collision_count()
+        self.assertEqual(self.collision_handler.body_overlap, {})
+
+    def test_batch_objects_cant_touch(self):
+        positions = [(x, y) for x in range(100, 200, 6) for y in range(100, 200, 6)]
+        object_list = create_structures(self.space, positions)
+        agent = self.create_agent(object_list, batch_size=20)
+        batch = agent.select_batch(object_list)
+
+        self.assertTrue(self.collision_handler.track_bodies)
+        self.assertEqual(len(batch), 20)
+        self.assertGreater(agent.batch_distance, 2.0)
+
+        positions = get_positions(batch)
+        distance = np.linalg.norm(positions[:, None] - positions[None, :], axis=2)
+        np.fill_diagonal(distance, np.inf)
+        self.assertGreaterEqual(distance.min(), agent.batch_distance)
+
+    def test_batches_reduce_overlap(self):
+        positions = [
+            (150 + random.uniform(-20, 20), 150 + random.uniform(-20, 20))
+            for _ in range(40)
+        ]
+        object_list = create_structures(self.space, positions)
+        agent = self.create_agent(object_list, batch_size=8)
+        start = agent.get_current_overlap_distance()
+        agent.overlap_distance = start
+
+        overlap = agent.take_actions(30, object_list)
+
+        self.assertLess(overlap, start)
+        self.assertAlmostEqual(overlap, self.collision_handler.overlap_distance)
+
+    def test_periodic_batch_objects_cant_touch_across_edges(self):
+        positions = [(x, y) for x in range(101, 160, 6) for y in range(101, 160, 6)]
+        object_list = create_structures(self.space, positions)
+        periodic_box = self.create_periodic_box(object_list)
+        agent = self.create_agent(object_list, batch_size=20, periodic_box=periodic_box)
+
+        for _ in range(10):
+            batch = agent.select_batch(object_list)
+            positions = get_positions(batch)
+            d = np.abs(positions[:, None] - positions[None, :])
+            d = np.minimum(d, 60 - d)
+            distance = np.linalg.norm(d, axis=2)
+            np.fill_diagonal(distance, np.inf)
+
+            self.assertGreaterEqual(distance.min(), agent.batch_distance)
+
+    def test_periodic_batches_reduce_overlap(self):
+        # a jammed band across the x edge of the box
+        positions = [
+            (100 + random.uniform(-8, 8) % 60, 130 + random.uniform(-20, 20))
+            for _ in range(30)
+        ]
+        object_list = create_structures(self.space, positions)
+        periodic_box = self.create_periodic_box(object_list)
+        agent = self.create_agent(object_list, batch_size=6, periodic_box=periodic_box)
+        start = agent.get_current_overlap_distance()
+        agent.overlap_distance = start
+
+        # every overlapping structure is charged its overlap, ghost contacts included
+        body_overlap = self.collision_handler.body_overlap
+        self.assertAlmostEqual(sum(body_overlap.values()), 2 * start, places=5)
+
+        overlap = agent.take_actions(30, object_list)
+
+        self.assertLess(overlap, start)
+        self.assertAlmostEqual(overlap, self.collision_handler.overlap_distance)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import pymunk
+
+from grana_model.collisionhandler import CollisionHandler
+from grana_model.lodmanager import LODManager
+from grana_model.objectdata import ObjectData
+
+# the class the OverlapAgent checks its objects against
+from grana_model.overlapagent import (
+    ExpandingCircle,
+    OverlapAgent,
+    OverlapPipeline,
+    PSIIStructure,
+)
+
+STRUCTURE_DICT = {
+    "d": 1.8e-9,
+    "d_rot": 2e3,
+    "simulation_limit": 1000,
+    "distance_scalar": "well",
+    "diffusion_scalar": 1.22e3,
+    "distance_threshold": 50.0,
+    "mass": 1.0e3,
+    "mass_scalar": 1.0,
+    "rotation_scalar": 1.785e-3,
+    "time_per_step": 2,
+    "average_step_over": 250,
+    "calibrate_rot_d": False,
+    "calibrate_diff_d": False,
+}
+
+OBJECT_DATA = ObjectData(pos_csv_filename="082620_SEM_final_coordinates.csv")
+
+STAGES = [
+    {"shape_type": "simple", "time_limit": 40},
+    {"shape_type": "complex", "time_limit": 20},
+]
+
+
+class TestOverlapPipeline(unittest.TestCase):
+    def setUp(self):
+        random.seed(6)
+        self.space = pymunk.Space()
+        self.collision_handler = CollisionHandler(self.space)
+        self.object_list = [
+            PSIIStructure(
+                self.space,
+                OBJECT_DATA.type_dict["LHCII"],
+                None,
+                "simple",
+                pos=(150 + random.uniform(-15, 15), 150 + random.uniform(-15, 15)),
+                angle=random.uniform(0, 6.28),
+                structure_dict=STRUCTURE_DICT,
+                use_sprites=False,
+            )
+            for _ in range(16)
+        ]
+
+    def create_pipeline(self, **kwargs) -> OverlapPipeline:
+        return OverlapPipeline(
+            self.space,
+            self.object_list,
+            self.collision_handler,
+            stages=STAGES,
+            area_strategy=ExpandingCircle(
+                self.object_list, origin_point=(150, 150), zone_distances=[15, 30]
+            ),
+            **kwargs,
+        )
+
+    def measure(self) -> float:
+        self.collision_handler.reset_collision_count()
+        self.space.step(0.1)
+        return self.collision_handler.overlap_distance
+
+    def test_stages_swap_shapes_and_reduce_overlap(self):
+        pipeline = self.create_pipeline()
+        stage_shapes = []  # shape types each stage's agent ran on
+        stage_start = []  # overlap at the start of each stage
+        run = OverlapAgent.run
+
+        def recording_run(agent, *args, **kwargs):
+            stage_shapes.append({o.shape_type for o in self.object_list})
+            stage_start.append(self.measure())
+            return run(agent, *args, **kwargs)
+
+        for o in self.object_list:
+            o.set_shapes("complex")
+
+        start = self.measure()
+
+        with mock.patch.object(OverlapAgent, "run", recording_run):
+            overlap = pipeline.run(export=False)
+
+        self.assertEqual(stage_shapes, [{"simple"}, {"complex"}])
+        self.assertEqual({s for s, _, _, _ in pipeline.report}, {0, 1})
+        self.assertLess(overlap, start)
+
+        for stage, start in enumerate(stage_start):
+            values = [v for s, _, _, v in pipeline.report if s == stage]
+            self.assertLess(values[-1], start)
+
+    def test_stage_agents_get_the_options(self):
+        lod_manager = LODManager(self.object_list)
+        periodic_box = mock.Mock()
+        sleep_policy = mock.Mock()
+        pipeline = self.create_pipeline(
+            lod_manager=lod_manager,
+            sleep_policy=sleep_policy,
+            periodic_box=periodic_box,
+            temperature=0.5,
+        )
+        agents = []
+
+        def recording_run(agent, *args, **kwargs):
+            agents.append(agent)
+            agent.time_values = []
+            return []
+
+        with mock.patch.object(OverlapAgent, "run", recording_run):
+            pipeline.run(export=False)
+
+        self.assertEqual(len(agents), 2)
+
+        for agent in agents:
+            self.assertIs(agent.lod_manager, lod_manager)
+            self.assertIs(agent.sleep_policy, sleep_policy)
+            self.assertIs(agent.periodic_box, periodic_box)
+            self.assertEqual(agent.temperature, 0.5)
+
+        # the manager is back to its own low detail shapes
+        self.assertEqual(lod_manager.low_detail, "simple")
+
+    def test_report_goes_to_the_export_dir(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            export_dir = os.path.join(tmp_dir, "lhcii_export_coords")
+            pipeline = self.create_pipeline(export_dir=export_dir)
+            pipeline.report = [(0, "simple", 0.1, 2.0)]
+            filename = pipeline.get_report_filename()
+
+            pipeline.export_report(filename)
+
+            self.assertEqual(os.path.dirname(filename), export_dir)
+            with open(filename) as f:
+                self.assertEqual(f.readline().strip(), "stage,shape_type,seconds,overlap")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import csv
+import os
+import random
+import tempfile
+import unittest
+
+import pymunk
+
+from grana_model.collisionhandler import CollisionHandler
+from grana_model.objectdata import ObjectData
+
+# the class the OverlapAgent checks its objects against
+from grana_model.overlapagent import OverlapAgent, PSIIStructure
+from grana_model.paralleltempering import ParallelTempering
+
+STRUCTURE_DICT = {
+    "d": 1.8e-9,
+    "d_rot": 2e3,
+    "simulation_limit": 1000,
+    "distance_scalar": "well",
+    "diffusion_scalar": 1.22e3,
+    "distance_threshold": 50.0,
+    "mass": 1.0e3,
+    "mass_scalar": 1.0,
+    "rotation_scalar": 1.785e-3,
+    "time_per_step": 2,
+    "average_step_over": 250,
+    "calibrate_rot_d": False,
+    "calibrate_diff_d": False,
+}
+
+OBJECT_DATA = ObjectData(pos_csv_filename="082620_SEM_final_coordinates.csv")
+
+
+class Replica:
+    """stand in for SimulationEnvironment, a jammed cluster of LHCII"""
+
+    def __init__(self, num_lhcii: int = 12):
+        self.space = pymunk.Space()
+        self.overlap_handler = CollisionHandler(self.space)
+        self.periodic_box = None
+        self.exported = 0
+        self.obstacle_list = [
+            PSIIStructure(
+                self.space,
+                OBJECT_DATA.type_dict["LHCII"],
+                None,
+                "simple",
+                pos=(200 + random.uniform(-15, 15), 200 + random.uniform(-15, 15)),
+                angle=random.uniform(0, 6.28),
+                structure_dict=STRUCTURE_DICT,
+                use_sprites=False,
+            )
+            for _ in range(num_lhcii)
+        ]
+
+    def get_export_filename(self):
+        return "replica.csv"
+
+    def export_coordinates(self, object_list, filename):
+        self.exported += 1
+
+
+def build_replica():
+    return Replica()
+
+
+def build_broken_replica():
+    raise ValueError("no structures to spawn")
+
+
+class TestParallelTempering(unittest.TestCase):
+    def test_swap_probability(self):
+        swap_probability = ParallelTempering.swap_probability
+
+        # the colder replica gets the lower overlap for free
+        self.assertEqual(swap_probability(1.0, 2.0, 10.0, 5.0), 1.0)
+        self.assertAlmostEqual(swap_probability(1.0, 2.0, 5.0, 10.0), 0.0820849986)
+        self.assertEqual(swap_probability(0.0, 2.0, 5.0, 10.0), 0.0)
+        self.assertEqual(swap_probability(0.0, 2.0, 10.0, 5.0), 1.0)
+        self.assertEqual(swap_probability(3.0, 3.0, 5.0, 10.0), 1.0)
+
+    def test_accept_increase(self):
+        agent = OverlapAgent.__new__(OverlapAgent)
+        agent.temperature = 0.0
+        self.assertFalse(agent.accept_increase(1e-9))
+
+        agent.temperature = 1e9
+        self.assertTrue(agent.accept_increase(1.0))
+
+    def test_needs_two_temperatures(self):
+        with self.assertRaises(ValueError):
+            ParallelTempering(build_replica, [0.0])
+
+    def test_serial_run(self):
+        tempering = ParallelTempering(
+            build_replica,
+            [5.0, 0.0, 1.0],
+            exchange_every=20,
+            rounds=4,
+            seed=2,
+            processes=False,
+        )
+        history = tempering.run()
+        workers = tempering.workers
+
+        self.assertEqual(tempering.temperatures, [0.0, 1.0, 5.0])
+        self.assertEqual(len(history), 4)
+        self.assertEqual(tempering.attempted.tolist(), [2, 2])
+        self.assertLessEqual(tempering.coldest_overlap, tempering.start_energies[0])
+        self.assertEqual(workers[0].replica.env.exported, 1)
+        self.assertEqual(workers[1].replica.env.exported, 0)
+
+        # the coldest replica holds the state it reports
+        self.assertAlmostEqual(
+            workers[0].replica.measure(), tempering.coldest_overlap, places=6
+        )
+
+    def test_processes_match_serial(self):
+        args = dict(exchange_every=10, rounds=3, seed=4)
+        serial = ParallelTempering(build_replica, [0.0, 2.0], processes=False, **args)
+        processes = ParallelTempering(build_replica, [0.0, 2.0], processes=True, **args)
+
+        serial.run(export=False)
+        processes.run(export=False)
+
+        self.assertEqual(
+            [row["overlap_t_0.0"] for row in serial.history],
+            [row["overlap_t_0.0"] for row in processes.history],
+        )
+        self.assertIsNone(processes.memory)
+
+    def test_build_errors_name_the_replica(self):
+        for processes in (False, True):
+            tempering = ParallelTempering(
+                build_broken_replica, [0.0, 2.0], processes=processes
+            )
+
+            with self.assertRaises(RuntimeError) as context:
+                tempering.run(export=False)
+
+            self.assertIn(
+                "replica 0 (temperature 0.0) failed to build", str(context.exception)
+            )
+            self.assertEqual(tempering.workers, [])
+
+        # the worker's traceback comes along
+        self.assertIn("no structures to spawn", str(context.exception))
+
+    def test_export_history_creates_the_directory(self):
+        tempering = ParallelTempering(
+            build_replica, [0.0, 2.0], exchange_every=5, rounds=2, processes=False
+        )
+        tempering.run(export=False)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, "lhcii_export_coords", "history.csv")
+            tempering.export_history(filename)
+
+            with open(filename, newline="") as f:
+                self.assertEqual(len(list(csv.DictReader(f))), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
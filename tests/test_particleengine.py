@@ -0,0 +1,113 @@
+import csv
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pymunk
+
+from grana_model.particleengine import OccupancyMask, ParticleEngine
+
+
+def add_box(space, center, size):
+    body = pymunk.Body(body_type=pymunk.Body.STATIC)
+    body.position = center
+    shape = pymunk.Poly.create_box(body, (size, size))
+    shape.collision_type = 1
+    space.add(body, shape)
+    return shape
+
+
+class TestOccupancyMask(unittest.TestCase):
+    def test_rasterize(self):
+        space = pymunk.Space()
+        add_box(space, (5, 5), 4)
+        circle = pymunk.Circle(space.static_body, 1.0, (15, 15))
+        circle.collision_type = 1
+        space.add(circle)
+
+        mask = OccupancyMask(section=(0, 0, 20, 20), resolution=0.5)
+        mask.rasterize(space)
+
+        self.assertEqual(mask.occupied.sum(), 8 * 8 + 12)
+        self.assertTrue(mask.is_occupied(np.array([[5.0, 5.0], [15.0, 15.0]])).all())
+        self.assertFalse(mask.is_occupied(np.array([[10.0, 10.0]]))[0])
+
+    def test_dilation(self):
+        space = pymunk.Space()
+        add_box(space, (5, 5), 4)
+        mask = OccupancyMask(section=(0, 0, 10, 10), resolution=0.5)
+
+        mask.rasterize(space, dilation=1.0)
+        self.assertTrue(mask.is_occupied(np.array([[7.7, 5.0]]))[0])
+        self.assertFalse(mask.is_occupied(np.array([[8.3, 5.0]]))[0])
+
+    def test_rotated_shapes_match_point_queries(self):
+        space = pymunk.Space()
+        shape = add_box(space, (5, 5), 4)
+        shape.body.angle = 0.6
+        space.reindex_static()
+
+        mask = OccupancyMask(section=(0, 0, 10, 10), resolution=0.5)
+        mask.rasterize(space)
+
+        for iy, y in enumerate(mask.ys):
+            for ix, x in enumerate(mask.xs):
+                inside = shape.point_query((x, y)).distance <= 0
+                self.assertEqual(mask.occupied[iy, ix], inside)
+
+
+class TestParticleEngine(unittest.TestCase):
+    def create_engine(self, space, **kwargs):
+        engine = ParticleEngine(
+            num_particles=2000, section=(0, 0, 20, 20), particle_radius=0.0, seed=1, **kwargs
+        )
+        engine.refresh(space)
+        return engine
+
+    def test_particles_stay_out_of_obstacles(self):
+        space = pymunk.Space()
+        add_box(space, (10, 10), 8)
+        engine = self.create_engine(space, periodic=False)
+
+        self.assertFalse(engine.mask.is_occupied(engine.positions).any())
+        engine.run(50)
+        self.assertFalse(engine.mask.is_occupied(engine.positions).any())
+        self.assertTrue(engine.in_section(engine.positions).all())
+
+    def test_free_diffusion(self):
+        # without obstacles MSD = 4 D t, with D = step_nm^2 / 4 per step
+        engine = self.create_engine(pymunk.Space(), step_nm=0.5)
+        engine.run(200)
+
+        self.assertAlmostEqual(engine.get_diffusion_coefficient(), 0.0625, delta=0.01)
+        self.assertEqual(engine.msd_history[-1][2], 1.0)
+
+    def test_obstacles_slow_diffusion(self):
+        space = pymunk.Space()
+
+        for x in range(2, 20, 4):
+            for y in range(2, 20, 4):
+                add_box(space, (x, y), 2.5)
+
+        engine = self.create_engine(space, step_nm=0.5)
+        engine.run(200)
+
+        self.assertLess(engine.get_diffusion_coefficient(), 0.0625 * 0.9)
+
+    def test_export_msd_creates_the_directory(self):
+        engine = self.create_engine(pymunk.Space())
+        engine.run(5)
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "lhcii_export_coords", "particle_msd.csv")
+            engine.export_msd(filename)
+
+            with open(filename) as f:
+                rows = list(csv.DictReader(f))
+
+        self.assertEqual(len(rows), len(engine.msd_history))
+
+
+if __name__ == "__main__":
+    unittest.main()
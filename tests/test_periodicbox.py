@@ -0,0 +1,115 @@
+import itertools
+import unittest
+
+import numpy as np
+import pymunk
+
+from grana_model.collisionhandler import CollisionHandler
+from grana_model.periodicbox import PeriodicBox, GHOST_COLLISION_TYPE
+
+
+class Structure:
+    def __init__(self, space, position):
+        self.body = pymunk.Body(mass=1.0, moment=1.0)
+        self.body.position = position
+        shape = pymunk.Circle(self.body, radius=1.0)
+        shape.collision_type = 1
+        space.add(self.body, shape)
+
+
+class OverlapLog:
+    def __init__(self):
+        self.overlap_distance = 0.0
+
+    def log_collision(self, overlap_distance):
+        if overlap_distance < 0:
+            self.overlap_distance += -1 * overlap_distance
+
+
+class TestPeriodicBox(unittest.TestCase):
+    def setUp(self) -> None:
+        self.space = pymunk.Space()
+        self.log = OverlapLog()
+        self.box = PeriodicBox(
+            self.space, section=(0, 0, 10, 10), collision_handler=self.log
+        )
+
+    def ghosts(self):
+        return [
+            b
+            for b in self.space.bodies
+            if any(s.collision_type == GHOST_COLLISION_TYPE for s in b.shapes)
+        ]
+
+    def test_wrap(self):
+        structure = Structure(self.space, (12, -3))
+        self.box.start([structure])
+        self.assertEqual(tuple(structure.body.position), (2, 7))
+
+    def test_ghosts(self):
+        center = Structure(self.space, (5, 5))
+        corner = Structure(self.space, (0.5, 0.5))
+        self.box.margin = 2.0
+        self.box.start([center, corner])
+
+        positions = sorted(tuple(b.position) for b in self.ghosts())
+        self.assertEqual(positions, [(0.5, 10.5), (10.5, 0.5), (10.5, 10.5)])
+
+        # the ghosts leave the space once the structure moves away from the edges
+        corner.body.position = (5, 2.5)
+        self.box.update()
+        self.assertEqual(self.ghosts(), [])
+
+    def test_overlap_across_edge(self):
+        # 0.5 apart across the x edge, so the circles overlap by 1.5
+        left = Structure(self.space, (0.25, 5))
+        right = Structure(self.space, (9.75, 5))
+        self.box.start([left, right])
+
+        self.box.update()
+        self.space.step(0.01)
+
+        # seen once from each side, each logging half of the overlap
+        self.assertAlmostEqual(self.log.overlap_distance, 1.5, places=5)
+        # pushed apart across the edge, ie into the box
+        self.box.update()
+        self.space.step(0.01)
+        self.assertGreater(left.body.position.x, 0.25)
+        self.assertLess(right.body.position.x, 9.75)
+
+    def test_body_overlap_across_edge(self):
+        collision_handler = CollisionHandler(self.space, track_bodies=True)
+        self.box.collision_handler = collision_handler
+        left = Structure(self.space, (0.25, 5))
+        right = Structure(self.space, (9.75, 5))
+        self.box.start([left, right])
+
+        collision_handler.reset_collision_count()
+        self.space.step(0.01)
+
+        # credited to the structures, not their ghosts, as inside the box
+        self.assertEqual(
+            set(collision_handler.body_overlap), {left.body, right.body}
+        )
+        self.assertAlmostEqual(collision_handler.body_overlap[left.body], 1.5, places=5)
+        self.assertAlmostEqual(collision_handler.body_overlap[right.body], 1.5, places=5)
+
+    def test_minimum_image_pairs(self):
+        rng = np.random.default_rng(3)
+        positions = rng.uniform(0, 10, (60, 2))
+
+        pairs = self.box.find_pairs_within(positions, 1.5)
+
+        expected = set()
+        for i, j in itertools.combinations(range(len(positions)), 2):
+            d = np.abs(positions[i] - positions[j])
+            d = np.minimum(d, 10 - d)
+            if np.hypot(*d) < 1.5:
+                expected.add((i, j))
+
+        self.assertEqual(set(map(tuple, pairs.tolist())), expected)
+        self.assertTrue(any(abs(positions[i, 0] - positions[j, 0]) > 5 for i, j in expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
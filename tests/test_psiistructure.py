@@ -0,0 +1,116 @@
+import unittest
+
+import numpy as np
+import pymunk
+
+from grana_model.objectdata import ObjectData
+from grana_model.psiistructure import (
+    DISTANCE_MAGNITUDES,
+    InverseSquaredMagnitude,
+    LinearScaledMagnitude,
+    PSIIStructure,
+    TabulatedMagnitude,
+    WellMagnitude,
+    get_distance_magnitude,
+    register_distance_magnitude,
+)
+
+STRUCTURE_DICT = {
+    "d": 1.8e-9,
+    "d_rot": 2e3,
+    "simulation_limit": 1000,
+    "distance_scalar": "well",
+    "diffusion_scalar": 1.22e3,
+    "distance_threshold": 50.0,
+    "mass": 1.0e3,
+    "mass_scalar": 1.0,
+    "rotation_scalar": 1.785e-3,
+    "time_per_step": 2,
+    "average_step_over": 250,
+    "calibrate_rot_d": False,
+    "calibrate_diff_d": False,
+}
+
+
+class TestPSIIStructure(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.object_data = ObjectData(pos_csv_filename="082620_SEM_final_coordinates.csv")
+
+    def create_structure(self, obj_type="C2S2M2", space=None) -> PSIIStructure:
+        return PSIIStructure(
+            pymunk.Space() if space is None else space,
+            self.object_data.type_dict[obj_type],
+            None,
+            "simple",
+            pos=(250, 250),
+            angle=0.0,
+            structure_dict=STRUCTURE_DICT,
+            use_sprites=False,
+        )
+
+    def test_freeze_kinematic(self):
+        structure = self.create_structure()
+        self.assertTrue(structure.freeze())
+        self.assertTrue(structure.frozen)
+        self.assertTrue(structure.unfreeze())
+        self.assertEqual(structure.body.body_type, pymunk.Body.KINEMATIC)
+
+    def test_dynamic_not_frozen(self):
+        structure = self.create_structure(obj_type="LHCII")
+        self.assertFalse(structure.freeze())
+        self.assertFalse(structure.unfreeze())
+
+    def test_frozen_shapes_follow_moves(self):
+        space = pymunk.Space()
+        structure = self.create_structure(space=space)
+        structure.freeze()
+        structure.body.position = (400, 400)
+        structure.rotate(degree_range=10.0)
+        hit = space.point_query_nearest((400, 400), 0, pymunk.ShapeFilter())
+        self.assertIsNotNone(hit)
+
+
+
+class TestDistanceMagnitude(unittest.TestCase):
+    def test_kernels(self):
+        distance = np.array([0.0, 0.5, 2.0, 10.0, 12.0])
+
+        np.testing.assert_allclose(
+            WellMagnitude(10.0).kernel(distance), [1, 1, 1, 1, 0]
+        )
+        np.testing.assert_allclose(
+            LinearScaledMagnitude(10.0).kernel(distance), [1, 0.95, 0.8, 0, 0]
+        )
+        np.testing.assert_allclose(
+            InverseSquaredMagnitude(10.0).kernel(distance), [1, 1, 0.25, 0, 0]
+        )
+
+    def test_scalar_points(self):
+        magnitude = LinearScaledMagnitude(10.0)
+        self.assertAlmostEqual(magnitude.get_distance_scalar((0, 0), (3, 4)), 0.5)
+
+    def test_tabulated(self):
+        exact = InverseSquaredMagnitude(10.0)
+        table = TabulatedMagnitude(10.0, function=exact, num_points=4096)
+        distance = np.linspace(0.0, 12.0, 1000)
+
+        np.testing.assert_allclose(table.kernel(distance), exact.kernel(distance), atol=1e-3)
+
+    def test_registry(self):
+        register_distance_magnitude(
+            "gaussian",
+            lambda threshold: TabulatedMagnitude(
+                threshold, function=lambda d: np.exp(-((d / threshold) ** 2))
+            ),
+        )
+        self.addCleanup(DISTANCE_MAGNITUDES.pop, "gaussian")
+
+        magnitude = get_distance_magnitude("gaussian", 50.0)
+        self.assertIs(get_distance_magnitude("gaussian", 50.0), magnitude)
+        self.assertAlmostEqual(float(magnitude.kernel(np.array(0.0))), 1.0)
+        self.assertIsInstance(get_distance_magnitude("unknown", 50.0), WellMagnitude)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import pyglet
+
+# no window, and no shadow window either
+pyglet.options["shadow_window"] = False
+
+import pymunk
+
+from grana_model.shaperenderer import (
+    ShapeGroup,
+    ShapeRenderer,
+    transform_vertices,
+    triangulate_shape,
+)
+
+
+def triangle_area(triangles: np.ndarray) -> float:
+    a, b, c = triangles[0::3], triangles[1::3], triangles[2::3]
+    cross = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (
+        c[:, 0] - a[:, 0]
+    )
+    return float(np.sum(np.abs(cross)) / 2)
+
+
+def create_structure(space, position, angle, obj_type="LHCII"):
+    body = pymunk.Body(1, 1)
+    body.position = position
+    body.angle = angle
+    shapes = [
+        pymunk.Poly(body, [(0, 0), (4, 0), (5, 3), (2, 5), (-1, 3)]),
+        pymunk.Circle(body, 1.5, offset=(3, -2)),
+    ]
+
+    for shape in shapes:
+        shape.color = (10, 20, 30, 255)
+
+    space.add(body, *shapes)
+
+    return SimpleNamespace(type=obj_type, body=body, shape_list=shapes)
+
+
+class TestTriangulation(unittest.TestCase):
+    def setUp(self):
+        self.space = pymunk.Space()
+        self.structure = create_structure(self.space, (120.0, 80.0), 0.7)
+        self.poly, self.circle = self.structure.shape_list
+
+    def test_poly_triangles_cover_the_shape(self):
+        triangles = triangulate_shape(self.poly)
+        vertices = [tuple(v) for v in self.poly.get_vertices()]
+
+        self.assertEqual(triangles.shape, (3 * (len(vertices) - 2), 2))
+        self.assertAlmostEqual(triangle_area(triangles), self.poly.area)
+
+        for v in triangles:
+            self.assertIn(tuple(v), vertices)
+
+    def test_circle_triangles_are_on_the_circle(self):
+        triangles = triangulate_shape(self.circle)
+        distance = np.linalg.norm(triangles - np.array(self.circle.offset), axis=1)
+
+        np.testing.assert_allclose(distance, self.circle.radius)
+
+    def test_transform_matches_pymunk_world_vertices(self):
+        local = np.array([tuple(v) for v in self.poly.get_vertices()])
+        bodies = [self.structure.body, create_structure(self.space, (5, -3), -2.1).body]
+        positions = np.array([tuple(b.position) for b in bodies])
+        angles = np.array([b.angle for b in bodies])
+
+        world = transform_vertices(local, positions, angles)
+
+        for body, vertices in zip(bodies, world):
+            expected = [tuple(body.local_to_world(tuple(v))) for v in local]
+            np.testing.assert_allclose(vertices, expected)
+
+    def test_transform_matches_pymunk_circle_center(self):
+        self.space.step(0.01)
+        world = transform_vertices(
+            triangulate_shape(self.circle),
+            np.array([tuple(self.structure.body.position)]),
+            np.array([self.structure.body.angle]),
+        )[0]
+        center = np.array(tuple(self.circle.bb.center()))
+        distance = np.linalg.norm(world - center, axis=1)
+
+        np.testing.assert_allclose(distance, self.circle.radius)
+
+
+class TestShapeRenderer(unittest.TestCase):
+    def setUp(self):
+        self.space = pymunk.Space()
+        self.structures = [
+            create_structure(self.space, (100 + 20 * i, 100), 0.3 * i) for i in range(3)
+        ]
+
+        particle_body = pymunk.Body(1, 1)
+        particle_body.position = (50, 60)
+        self.particle = SimpleNamespace(
+            body=particle_body, shape=pymunk.Circle(particle_body, 1.5)
+        )
+        self.particle.shape.color = (255, 0, 0, 255)
+
+        self.boundary = pymunk.Poly.create_box(self.space.static_body, (10, 4))
+        self.boundary.color = (0, 0, 0, 0)
+        self.drawn = self.structures + [self.particle, self.boundary]
+        self.renderer = ShapeRenderer()
+
+    def test_draws_structures_particles_and_boundaries(self):
+        self.renderer.update(self.drawn)
+        vertex_count = sum(
+            len(g.local_vertices) * len(g.object_list) for g in self.renderer.shape_groups
+        )
+        expected = sum(
+            len(triangulate_shape(s)) for o in self.structures for s in o.shape_list
+        ) + len(triangulate_shape(self.particle.shape)) + len(
+            triangulate_shape(self.boundary)
+        )
+
+        # the three structures share one template
+        self.assertEqual(len(self.renderer.shape_groups), 3)
+        self.assertEqual(vertex_count, expected)
+
+        group = self.renderer.shape_groups[0]
+        vertices = np.ctypeslib.as_array(group.vertex_list.vertices).reshape(
+            len(group.object_list), -1, 2
+        )
+        body = self.structures[1].body
+        np.testing.assert_allclose(
+            vertices[1],
+            [tuple(body.local_to_world(tuple(v))) for v in group.local_vertices],
+            rtol=1e-5,
+        )
+
+    def test_colors_upload_only_on_a_new_version(self):
+        with mock.patch.object(
+            ShapeGroup,
+            "update_colors",
+            autospec=True,
+            side_effect=ShapeGroup.update_colors,
+        ) as update_colors:
+            self.renderer.update(self.drawn, color_version=0)
+            self.assertEqual(update_colors.call_count, 3)
+
+            self.renderer.update(self.drawn, color_version=0)
+            self.assertEqual(update_colors.call_count, 3)
+
+            self.structures[0].shape_list[0].color = (1, 2, 3, 255)
+            self.renderer.update(self.drawn, color_version=1)
+            self.assertEqual(update_colors.call_count, 6)
+
+        group = self.renderer.shape_groups[0]
+        colors = np.ctypeslib.as_array(group.vertex_list.colors).reshape(-1, 4)
+        self.assertEqual(tuple(colors[0]), (1, 2, 3, 255))
+
+    def test_new_shape_list_rebuilds(self):
+        self.renderer.update(self.drawn, color_version=0)
+        self.structures[0].shape_list = list(self.structures[0].shape_list)
+
+        self.assertTrue(self.renderer.needs_rebuild(self.drawn))
+
+
+if __name__ == "__main__":
+    unittest.main()
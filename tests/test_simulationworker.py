@@ -0,0 +1,135 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+import pymunk
+
+from grana_model.simulationworker import SimulationWorker, SnapshotBuffer
+
+
+class Env:
+    """stand in for SimulationEnvironment, bodies falling in a space"""
+
+    def __init__(self, num_bodies: int = 5):
+        self.space = pymunk.Space()
+        self.space.gravity = (0, -10)
+        self.obstacle_list = []
+
+        for i in range(num_bodies):
+            body = pymunk.Body(1, 1)
+            body.position = (10 * i, 100)
+            body.angle = 0.1 * i
+            self.space.add(body, pymunk.Circle(body, 1))
+            self.obstacle_list.append(SimpleNamespace(body=body))
+
+        self.particle_list = []
+        self.boundaries = []
+        self.steps = 0
+        self.active = True
+        self.attraction_point_coords = []
+        self.exports = []
+
+    def step(self):
+        self.space.step(0.01)
+        self.steps += 1
+        self.attraction_point_coords = [tuple(o.body.position) for o in self.obstacle_list]
+
+    def get_drawn_objects(self):
+        return self.obstacle_list + self.particle_list + self.boundaries
+
+    def get_export_filename(self):
+        return "coords.csv"
+
+    def export_coordinates(self, ob_list, filename):
+        self.exports.append((threading.current_thread(), filename, self.steps))
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    end = time.perf_counter() + timeout
+
+    while time.perf_counter() < end:
+        if condition():
+            return True
+
+        time.sleep(0.005)
+
+    return False
+
+
+class TestSnapshotBuffer(unittest.TestCase):
+    def test_publish_and_read(self):
+        env = Env(3)
+        snapshot = SnapshotBuffer(3)
+        snapshot.publish(env.obstacle_list, 7, points=[(1, 2), (3, 4)])
+
+        positions, angles, step = snapshot.read()
+        np.testing.assert_allclose(positions, [(0, 100), (10, 100), (20, 100)])
+        np.testing.assert_allclose(angles, [0.0, 0.1, 0.2])
+        self.assertEqual(step, 7)
+        np.testing.assert_allclose(snapshot.read_points(), [(1, 2), (3, 4)])
+
+        # the reader has its own copy
+        positions[:] = 0
+        self.assertEqual(snapshot.read()[0][0, 1], 100)
+
+    def test_size_follows_the_object_list(self):
+        env = Env(4)
+        snapshot = SnapshotBuffer(2)
+        snapshot.publish(env.obstacle_list, 1)
+        snapshot.publish(env.obstacle_list, 2)
+
+        self.assertEqual(len(snapshot.read()[0]), 4)
+        self.assertEqual(snapshot.read_points().shape, (0, 2))
+
+
+class TestSimulationWorker(unittest.TestCase):
+    def setUp(self):
+        self.env = Env()
+        self.worker = SimulationWorker(self.env)
+
+    def tearDown(self):
+        self.worker.stop()
+
+    def test_snapshots_follow_the_steps(self):
+        self.worker.start()
+        self.assertTrue(wait_for(lambda: self.worker.snapshot.read()[2] >= 10))
+
+        # pause, and wait for a command, so the space stands still to compare it
+        self.worker.toggle_pause()
+        done = threading.Event()
+        self.worker.submit(done.set)
+        self.assertTrue(done.wait(5.0))
+
+        positions, angles, step = self.worker.snapshot.read()
+        self.assertEqual(step, self.env.steps)
+        np.testing.assert_allclose(
+            positions, [tuple(o.body.position) for o in self.env.obstacle_list]
+        )
+        np.testing.assert_allclose(self.worker.snapshot.read_points(), positions)
+        self.assertLess(positions[0, 1], 100)
+
+    def test_commands_run_on_the_worker(self):
+        self.worker.start()
+        self.worker.request_export()
+
+        self.assertTrue(wait_for(lambda: len(self.env.exports) == 1))
+        thread, filename, _ = self.env.exports[0]
+        self.assertIs(thread, self.worker)
+        self.assertEqual(filename, "coords.csv")
+
+    def test_stop_joins(self):
+        self.worker.start()
+        self.assertTrue(wait_for(lambda: self.env.steps > 0))
+
+        self.worker.stop()
+
+        self.assertFalse(self.worker.is_alive())
+        steps = self.env.steps
+        time.sleep(0.05)
+        self.assertEqual(self.env.steps, steps)
+
+
+if __name__ == "__main__":
+    unittest.main()
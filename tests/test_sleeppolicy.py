@@ -0,0 +1,44 @@
+import unittest
+
+import pymunk
+
+from grana_model.sleeppolicy import SleepPolicy
+
+
+class Structure:
+    def __init__(self, space, position, velocity=(0, 0)):
+        self.body = pymunk.Body(mass=1.0, moment=1.0)
+        self.body.position = position
+        self.body.velocity = velocity
+        space.add(self.body, pymunk.Circle(self.body, radius=1.0))
+
+
+class TestSleepPolicy(unittest.TestCase):
+    def setUp(self) -> None:
+        self.space = pymunk.Space()
+        self.still = Structure(self.space, (0, 0))
+        self.moving = Structure(self.space, (50, 0), velocity=(10, 0))
+        self.policy = SleepPolicy(self.space, idle_steps=5)
+        self.policy.start([self.still, self.moving])
+
+    def step(self, n):
+        for _ in range(n):
+            self.space.step(0.01)
+            self.policy.update()
+
+    def test_idle_structures_sleep(self):
+        self.step(6)
+        self.assertTrue(self.still.body.is_sleeping)
+        self.assertFalse(self.moving.body.is_sleeping)
+        self.assertEqual(self.policy.sleeping_fraction, 0.5)
+
+    def test_wake(self):
+        self.step(6)
+        self.policy.wake(self.still)
+        self.assertFalse(self.still.body.is_sleeping)
+        self.step(1)
+        self.assertFalse(self.still.body.is_sleeping)
+
+
+if __name__ == "__main__":
+    unittest.main()
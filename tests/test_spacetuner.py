@@ -0,0 +1,81 @@
+import csv
+import os
+import random
+import tempfile
+import unittest
+
+import pymunk
+
+from grana_model.spacetuner import SpaceTuner, configure_space, get_shape_sizes
+
+
+class OverlapCounter:
+    def __init__(self):
+        self.overlap_distance = 0.0
+
+    def reset_collision_count(self):
+        self.overlap_distance = 0.0
+
+
+def build(space):
+    for _ in range(50):
+        body = pymunk.Body(mass=1.0, moment=1.0)
+        body.position = (random.uniform(0, 50), random.uniform(0, 50))
+        circle = pymunk.Circle(body, radius=2.0)
+        circle.collision_type = 1
+        space.add(body, circle)
+
+    return OverlapCounter()
+
+
+class TestSpaceTuner(unittest.TestCase):
+    def test_configure_space(self):
+        space = configure_space(iterations=5, collision_slop=0.2, spatial_hash_dim=4.0)
+        self.assertEqual(space.iterations, 5)
+        self.assertAlmostEqual(space.collision_slop, 0.2)
+
+    def test_hash_dim_from_shape_sizes(self):
+        space = configure_space()
+        build(space)
+        tuner = SpaceTuner(build)
+        dims = {
+            c.get("spatial_hash_dim")
+            for c in tuner.get_candidates(get_shape_sizes(space))
+        }
+        self.assertEqual(dims, {None, 4.0, 8.0, 16.0})
+
+    def test_chooses_a_candidate(self):
+        tuner = SpaceTuner(build, steps=2)
+        best = tuner.run()
+        self.assertIn(best, [tuner.get_config(r) for r in tuner.results])
+        self.assertEqual(len(tuner.results), 24)
+
+    def test_builds_one_model_per_candidate(self):
+        builds = []
+
+        def counting_build(space):
+            builds.append(space)
+            return build(space)
+
+        tuner = SpaceTuner(counting_build, steps=2)
+        tuner.run()
+
+        self.assertEqual(len(builds), len(tuner.results))
+
+    def test_export_creates_the_directory(self):
+        tuner = SpaceTuner(build, steps=2)
+        tuner.run()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, "lhcii_export_coords", "space_tuning.csv")
+            tuner.export_results(filename)
+
+            with open(filename, newline="") as f:
+                rows = list(csv.DictReader(f))
+
+        self.assertEqual(len(rows), 24)
+        self.assertEqual(sum(r["chosen"] == "True" for r in rows), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import numpy as np
+
+from grana_model.spatialindex import SpatialIndex
+
+
+class TestSpatialIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        rng = np.random.default_rng(1)
+        cls.positions = rng.uniform(200, 300, size=(500, 2))
+        cls.index = SpatialIndex(cls.positions, cell_size=7.5)
+
+    def test_radius_matches_brute_force(self):
+        d = np.linalg.norm(self.positions - (250, 240), axis=1)
+        expected = np.flatnonzero(d <= 20)
+        np.testing.assert_array_equal(self.index.query_radius((250, 240), 20), expected)
+
+    def test_rectangle_matches_brute_force(self):
+        p = self.positions
+        expected = np.flatnonzero(
+            (210 < p[:, 0]) & (p[:, 0] < 240) & (220 < p[:, 1]) & (p[:, 1] < 270)
+        )
+        np.testing.assert_array_equal(
+            self.index.query_rectangle(210, 220, 30, 50), expected
+        )
+
+    def test_polygon_square_equals_rectangle(self):
+        square = [(210, 220), (240, 220), (240, 270), (210, 270)]
+        np.testing.assert_array_equal(
+            self.index.query_polygon(square),
+            self.index.query_rectangle(210, 220, 30, 50),
+        )
+
+    def test_nearest(self):
+        d = np.linalg.norm(self.positions - (233, 277), axis=1)
+        self.assertEqual(self.index.nearest((233, 277)), int(np.argmin(d)))
+
+    def test_pairs_within(self):
+        pairs = self.index.pairs_within(5.0)
+        diff = self.positions[:, None, :] - self.positions[None, :, :]
+        close = np.triu(np.sum(diff**2, axis=2) < 25.0, k=1)
+        self.assertEqual(len(pairs), int(close.sum()))
+        self.assertTrue(np.all(close[pairs[:, 0], pairs[:, 1]]))
+
+    def test_empty_index(self):
+        index = SpatialIndex(np.zeros((0, 2)))
+        self.assertEqual(len(index.query_radius((0, 0), 10)), 0)
+        self.assertIsNone(index.nearest((0, 0)))
+
+
+if __name__ == "__main__":
+    unittest.main()